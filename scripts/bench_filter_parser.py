@@ -0,0 +1,93 @@
+""" Compare the filter parser against the regex it replaced.
+
+    Usage: python scripts/bench_filter_parser.py
+"""
+
+import re
+import timeit
+
+from api.helpers.filter_parser import parse
+
+LEGACY_PATTERN = re.compile(
+    r"""
+        (?P<conjunctive>[:|]?)
+        (?P<field_name>[:|]?\w+[^:|'\"])?
+        (?P<sep>[:|])
+        (?P<inverter>~)?
+        (?P<operator>eq|gte|gt|lte|lt|in|between|regex|like|is})
+        (?=:(?P<value>
+        (?P<quoted>['\"][^'\"\\]*(?:\\.[^'\\]*)*['\"])
+        |
+        (?:(?P<unquoted>[^:|\s]*[^'\":|\s]))
+        ))
+        """,
+    re.VERBOSE,
+)
+
+# filter strings from tests/api/helpers/test_filtering.py ("regex" terms excluded,
+# since the operator was never supported by translation)
+STRINGS = [
+    'field:gte:7|other_field:~in:a,b,c:another_field:between:"2020-01-01T17:22:20.937752,2020-01-31T17:22:20.937752":yet_another_field:eq:2020',  # noqa
+    "field:eq:7",
+    'field:eq:"help"',
+    "field:~eq:7",
+    'field:~eq:"help"',
+    "field:gt:7",
+    "field:gte:7",
+    "field:gt:7|lt:14",
+    "field:gte:7:lte:14",
+    "field:gt:7:other_field:lt:10",
+    "field:gte:7|other_field:lte:10",
+    "field:gt:7|lt:14:other_field:gt:50:another_field:eq:100",
+    "field:in:a,b,c",
+    "field:in:a,b,c:in:1,2,3",
+    "field:in:a,b,c|in:1,2,3",
+    "field:in:a,b,c:other_field:in:a,b,c",
+    "field:in:a,b,c|other_field:in:1,2,3",
+    "field:~in:a,b,c",
+    "field:~in:a,b,c:~in:1,2,3",
+    "field:~in:a,b,c|~in:1,2,3",
+    "field:~in:a,b,c:other_field:~in:a,b,c",
+    "field:~in:a,b,c|other_field:~in:1,2,3",
+    "field:between:2020-01-01,2020-01-31",
+    'field:between:"2020-01-01T17:22:20.937752,2020-01-31T17:22:20.937752"',
+    "field:between:1,10",
+    "field:between:1,10:other_field:between:100,200",
+    'field:like:"*bueno"',
+    'field:like:"mui:bueno"',
+    'field:like:"*bueno"|like:"*bueno"',
+    'field:like:"*bueno":other_field:like:"*bueno"',
+    'field:like:"*bueno"|other_field:like:"*bueno"',
+    'field:like:"*mui:bueno":other_field:like:"*bueno"',
+    'field:like:"*mui|bueno"|other_field:like:"*bueno"',
+]
+
+# a long bare value, which the legacy pattern rescans from every offset
+PATHOLOGICAL = "field:eq:" + "a" * 2000
+
+
+def legacy(s: str):
+    return [dict(zip(LEGACY_PATTERN.groupindex, m)) for m in LEGACY_PATTERN.findall(s)]
+
+
+def parser(s: str):
+    try:
+        return parse(s)
+    except ValueError:
+        return None
+
+
+def bench(name: str, func, strings, number: int):
+    elapsed = timeit.timeit(lambda: [func(s) for s in strings], number=number)
+    per_call = elapsed / (number * len(strings)) * 1e6
+    print(f"{name:<10} {per_call:>10.2f} us/filter")
+
+
+if __name__ == "__main__":
+    print(f"test strings ({len(STRINGS)})")
+    bench("regex", legacy, STRINGS, number=2000)
+    bench("parser", parser, STRINGS, number=2000)
+
+    print(f"pathological input ({len(PATHOLOGICAL)} chars)")
+    bench("regex", legacy, [PATHOLOGICAL], number=5)
+    bench("parser", parser, [PATHOLOGICAL], number=5)
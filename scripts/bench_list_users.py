@@ -0,0 +1,82 @@
+""" Compare serializing a page of users through the endpoint's response_model with
+    encoding the selected columns directly (api.helpers.fastpath).
+
+    Usage: python scripts/bench_list_users.py
+"""
+
+import asyncio
+import random
+import string
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from api.helpers.fastpath import encode_rows
+from schemas.user import UserOut
+
+PAGE_SIZE = 1000
+NUMBER = 20
+
+FIELDS = tuple(UserOut.__fields__)
+
+
+class Row:
+    """ Stand-in for an ORM instance """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def rand_str(n: int = 10) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=n))
+
+
+def make_record(id: int) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": id,
+        "username": rand_str(),
+        "email": f"{rand_str()}@example.com",
+        "is_active": True,
+        "is_superuser": False,
+        "first_name": rand_str(),
+        "last_name": rand_str(),
+        "phone_number": None,
+        "country_code": "US",
+        "hashed_password": rand_str(60),
+        "created_at": now - timedelta(days=id),
+        "updated_at": now,
+    }
+
+
+records = [make_record(i) for i in range(PAGE_SIZE)]
+instances = [Row(**r) for r in records]
+rows = [tuple(r[name] for name in FIELDS) for r in records]
+
+field = create_response_field(name="response", type_=List[UserOut])
+
+
+def response_model_path() -> bytes:
+    content = asyncio.run(
+        serialize_response(field=field, response_content=instances, is_coroutine=True)
+    )
+    return ORJSONResponse(content).body
+
+
+def fast_path() -> bytes:
+    return encode_rows(rows, FIELDS)
+
+
+if __name__ == "__main__":
+    import orjson
+
+    assert orjson.loads(response_model_path()) == orjson.loads(fast_path())
+
+    paths = [("response_model", response_model_path), ("fast path", fast_path)]
+    for name, func in paths:
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER
+        print(f"{name:>15}: {seconds * 1000:.2f} ms per {PAGE_SIZE} rows")
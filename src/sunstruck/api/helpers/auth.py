@@ -1,7 +1,9 @@
-from typing import Optional
+import hashlib
+import time
+from typing import Optional, Tuple
 
 from fastapi import Depends, Form, HTTPException, Request, status
-from fastapi.security import oauth2
+from fastapi.security import SecurityScopes, oauth2
 from jose import jwt
 from pydantic import ValidationError
 
@@ -10,6 +12,13 @@ import util.security as security
 from config import API_V1
 from db.models import User
 from schemas import TokenPayload
+from util.cache import LRUCache
+from util.revocation import revocations
+
+# sha256 of a verified access token -> (expiration, claims)
+token_cache: LRUCache[Tuple[float, TokenPayload]] = LRUCache(
+    maxsize=conf.AUTH_TOKEN_CACHE_SIZE, name="token"
+)
 
 
 class OAuth2PasswordClientCredentials(oauth2.OAuth2):
@@ -96,18 +105,110 @@ class OAuth2RequestForm:
         self.client_secret = client_secret
 
 
-async def get_current_user(token: str = Depends(oauth2_authorizer)) -> User:
+def verify_access_token(token: str) -> TokenPayload:
+    """ Verify an access token's signature and expiration, returning its claims.
+        Verified tokens are cached (by their hash, not the token itself) until
+        they expire, so a token is only decoded once per process. Revocations are
+        checked on every call, cached or not.
+
+    Raises:
+        HTTPException: 403 if the token is invalid or expired
+        HTTPException: 401 if the token was revoked
+
+    Returns:
+        TokenPayload -- the token's claims
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(key)
+    if cached is not None:
+        if cached[0] > time.time():
+            return check_revoked(cached[1])
+        token_cache.pop(key)
+
     try:
-        payload = jwt.decode(
-            token, str(conf.SECRET_KEY), algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
+        payload = security.decode_token(token)
+        token_data: Optional[TokenPayload] = TokenPayload(**payload)
     except (jwt.JWTError, ValidationError):
+        token_data = None
+
+    if token_data is None or token_data.sub is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = await User.get(token_data.sub)
+
+    if token_data.exp is not None:
+        token_cache.set(key, (token_data.exp, token_data))
+    return check_revoked(token_data)
+
+
+def check_revoked(token_data: TokenPayload) -> TokenPayload:
+    if revocations.is_revoked(token_data.jti, token_data.sub, token_data.iat):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token_data
+
+
+def get_current_claims(
+    security_scopes: SecurityScopes, token: str = Depends(oauth2_authorizer)
+) -> TokenPayload:
+    """ Authorize a request from the claims of its access token alone, without
+        reading the user. Use it instead of get_current_user when an endpoint only
+        needs the user's id, privileges or scopes. Scopes required with
+        fastapi.Security(get_current_claims, scopes=[...]) must all be granted. """
+    token_data = verify_access_token(token)
+    missing = set(security_scopes.scopes) - set(token_data.scopes)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+            headers={"WWW-Authenticate": f'Bearer scope="{security_scopes.scope_str}"'},
+        )
+    return token_data
+
+
+async def get_active_claims(
+    claims: TokenPayload = Depends(get_current_claims),
+) -> TokenPayload:
+    """ Claims-only equivalent of get_current_active_user. Deactivating a user
+        revokes their tokens, so the active claim can be trusted until then.
+        Tokens issued without the active and is_superuser claims take them from
+        the user instead. """
+    if claims.active is None or claims.is_superuser is None:
+        user = await User.get_cached(claims.sub)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            )
+        claims = claims.copy(
+            update={"active": user.is_active, "is_superuser": user.is_superuser}
+        )
+    if not claims.active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
+        )
+    return claims
+
+
+def get_superuser_claims(
+    claims: TokenPayload = Depends(get_active_claims),
+) -> TokenPayload:
+    """ Claims-only equivalent of get_current_active_superuser """
+    if not claims.is_superuser:
+        raise HTTPException(
+            status_code=400, detail="The user doesn't have enough privileges"
+        )
+    return claims
+
+
+async def get_current_user(token: str = Depends(oauth2_authorizer)) -> User:
+    """ Get the user an access token was issued to. Revoked tokens are rejected
+        before the user is read (see util.revocation). """
+    token_data = verify_access_token(token)
+    user = await User.get_cached(token_data.sub)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
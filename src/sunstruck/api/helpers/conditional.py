@@ -0,0 +1,113 @@
+""" Conditional requests: ETag/If-None-Match and Last-Modified/If-Modified-Since.
+
+    Validators are computed from data read along with the resource (e.g. a row's
+    updated_at, or max(updated_at) and count(*) for a page of results, read by the
+    page's query or its count). The resource is still fetched, but an unchanged one
+    is answered with 304 Not Modified, skipping its serialization and transfer.
+
+    ### References:
+    - https://tools.ietf.org/html/rfc7232
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["make_etag", "is_not_modified", "not_modified", "set_validators"]
+
+
+def make_etag(*parts: Any) -> str:
+    """ Build a weak entity tag from the given parts. Weak, since equal tags mean
+        equivalent content rather than byte-for-byte identical responses.
+
+    Example:
+    >>> make_etag("users", 42, datetime(2020, 1, 1))
+    >>> 'W/"0a4c4f5d4b3b2a9c8f1e6d7c5b4a3f2e"'
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def http_date(dt: datetime) -> str:
+    """ Format a datetime as an HTTP date (e.g. Wed, 01 Jan 2020 00:00:00 GMT) """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """ Weak comparison of an etag against an If-None-Match header """
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    """ Determine whether the client's cached copy of a resource is still current.
+        If-None-Match takes precedence over If-Modified-Since, as required by
+        RFC 7232.
+
+    Arguments:
+        request {Request} -- the incoming request
+        etag {str} -- current entity tag of the resource
+
+    Keyword Arguments:
+        last_modified {Optional[datetime]} -- time the resource last changed
+            (default: {None})
+
+    Returns:
+        bool -- True if the request can be answered with 304 Not Modified
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have a resolution of one second
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def set_validators(
+    response: Response, etag: str, last_modified: Optional[datetime] = None
+) -> Response:
+    """ Add ETag and Last-Modified headers to a response """
+    response.headers["etag"] = etag
+    if last_modified is not None:
+        response.headers["last-modified"] = http_date(last_modified)
+    return response
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """ Create an empty 304 Not Modified response carrying the current validators """
+    return set_validators(
+        Response(status_code=status.HTTP_304_NOT_MODIFIED), etag, last_modified
+    )
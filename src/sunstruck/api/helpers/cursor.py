@@ -0,0 +1,175 @@
+""" Opaque, signed cursors for keyset pagination.
+
+    A cursor records the sort key of the last row on a page, along with the names of
+    the sort columns and their sort directions, so the next page can be selected with a
+    row comparison (e.g. WHERE (created_at, id) < (:a, :b)) instead of an OFFSET.
+
+    The payload is compact JSON, signed with an HMAC of the application's secret key
+    and base64url encoded. Clients can't forge or alter a cursor, but they also
+    shouldn't rely on its contents.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Mapping, Optional, Sequence, Tuple, Union
+
+import config as conf
+from exc import InvalidCursorError
+
+__all__ = ["Cursor", "encode_cursor", "decode_cursor"]
+
+DIGEST_SIZE = 16
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    raise TypeError(f"{type(v).__name__} is not cursor serializable")
+
+
+def _sign(payload: bytes, secret: Optional[str] = None) -> bytes:
+    key = str(secret or conf.SECRET_KEY).encode()
+    return hmac.new(key, payload, hashlib.sha256).digest()[:DIGEST_SIZE]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def directions(desc: Union[bool, Sequence[bool]], n: int) -> Tuple[bool, ...]:
+    """ Expand a single sort direction to one for each of n sort columns """
+    if isinstance(desc, bool):
+        return (desc,) * n
+    return tuple(bool(d) for d in desc)
+
+
+class Cursor:
+    """ Decoded pagination cursor.
+
+    Attributes:
+        keys {Tuple[str, ...]} -- names of the sort columns, primary key last
+        values {Tuple[Any, ...]} -- sort key of the last row of the previous page
+        desc {Tuple[bool, ...]} -- whether rows are sorted in descending order, for
+            each sort column
+    """
+
+    __slots__ = ("keys", "values", "desc")
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        values: Sequence[Any],
+        desc: Union[bool, Sequence[bool]],
+    ):
+        self.keys = tuple(keys)
+        self.values = tuple(values)
+        self.desc = directions(desc, len(self.keys))
+
+    def __repr__(self):
+        return f"Cursor(keys={self.keys}, values={self.values}, desc={self.desc})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Cursor):
+            return NotImplemented
+        return (self.keys, self.values, self.desc) == (
+            other.keys,
+            other.values,
+            other.desc,
+        )
+
+    def coerce(self, coercers: Mapping[str, Callable[[Any], Any]]) -> Tuple:
+        """ Convert the cursor's values back to the python types of their columns.
+
+        Raises:
+            InvalidCursorError: a value can't be converted to its column's type
+        """
+        try:
+            return tuple(
+                None if v is None else coercers[k](v)
+                for k, v in zip(self.keys, self.values)
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidCursorError(f"invalid cursor value: {e}")
+
+
+def encode_cursor(
+    keys: Sequence[str],
+    values: Sequence[Any],
+    desc: Union[bool, Sequence[bool]],
+    secret: str = None,
+) -> str:
+    """ Encode and sign a cursor.
+
+    Example:
+    >>> encode_cursor(("created_at", "id"), (datetime(2020, 1, 1), 42), desc=True)
+    >>> 'eyJrIjpbImNyZWF0ZWRfYXQiLCJpZCJdLC...'
+
+    Arguments:
+        keys {Sequence[str]} -- names of the sort columns
+        values {Sequence[Any]} -- sort key of the last row on the page
+        desc {Union[bool, Sequence[bool]]} -- rows are sorted in descending order,
+            either by every column or for each column
+
+    Keyword Arguments:
+        secret {str} -- signing key (default: conf.SECRET_KEY)
+
+    Returns:
+        str -- url safe cursor
+    """
+    payload = json.dumps(
+        {
+            "k": list(keys),
+            "v": list(values),
+            "d": [int(d) for d in directions(desc, len(keys))],
+        },
+        separators=(",", ":"),
+        default=_json_default,
+    ).encode()
+    return _b64encode(payload + _sign(payload, secret))
+
+
+def decode_cursor(token: str, secret: str = None) -> Cursor:
+    """ Verify and decode a cursor created by encode_cursor.
+
+    Arguments:
+        token {str} -- url safe cursor
+
+    Keyword Arguments:
+        secret {str} -- signing key (default: conf.SECRET_KEY)
+
+    Raises:
+        InvalidCursorError: the cursor is malformed or its signature doesn't match
+
+    Returns:
+        Cursor
+    """
+    try:
+        raw = _b64decode(token)
+    except (binascii.Error, ValueError):
+        raise InvalidCursorError("malformed cursor")
+
+    payload, signature = raw[:-DIGEST_SIZE], raw[-DIGEST_SIZE:]
+    if len(raw) <= DIGEST_SIZE or not hmac.compare_digest(
+        signature, _sign(payload, secret)
+    ):
+        raise InvalidCursorError("invalid cursor signature")
+
+    try:
+        data = json.loads(payload)
+        desc = data["d"]
+        if not isinstance(desc, list) or len(desc) != len(data["k"]):
+            raise ValueError("sort directions don't match the sort keys")
+        return Cursor(keys=data["k"], values=data["v"], desc=[bool(d) for d in desc])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorError("malformed cursor")
@@ -0,0 +1,108 @@
+""" Sparse fieldsets: let clients request a subset of a resource's fields.
+
+    The fields query parameter takes a comma separated list of field names (e.g.
+    fields=id,username). Requested names are validated against both the response
+    schema and the data model, so only columns that are part of the public schema can
+    be selected. Only those columns are read from the database, and the response is
+    serialized with a schema derived from the original, limited to the same fields.
+"""
+
+import functools
+import logging
+from typing import Any, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel as PydanticModel
+from pydantic import create_model
+
+from db.models import Model
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["fields_param", "parse_fields", "partial_schema", "sparse_response"]
+
+
+def fields_param(
+    fields: Optional[str] = Query(
+        default=None,
+        description="Comma separated list of fields to include in the response.",
+        example="fields=id,username",
+    )
+) -> Optional[str]:
+    """ Dependency exposing the fields query parameter """
+    return fields
+
+
+def parse_fields(
+    fields: Optional[str], schema: Type[PydanticModel], model: Model
+) -> Optional[Tuple[str, ...]]:
+    """ Validate a comma separated list of field names against a response schema and
+        the data model backing it.
+
+    Arguments:
+        fields {Optional[str]} -- comma separated field names (e.g. "id,username")
+        schema {Type[PydanticModel]} -- response schema
+        model {Model} -- data model backing the schema
+
+    Raises:
+        HTTPException: 422 if a field isn't both in the schema and a model column
+
+    Returns:
+        Optional[Tuple[str, ...]] -- unique field names, in schema order, or None
+            if no fields were requested
+    """
+    if not fields:
+        return None
+
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    allowed = [name for name in schema.__fields__ if name in model.meta.columns]
+    invalid = requested.difference(allowed)
+
+    if invalid or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid fields: {sorted(invalid)}. Options: {allowed}",
+        )
+
+    return tuple(name for name in allowed if name in requested)
+
+
+@functools.lru_cache(maxsize=256)
+def partial_schema(
+    schema: Type[PydanticModel], fields: Tuple[str, ...]
+) -> Type[PydanticModel]:
+    """ Derive a schema containing only the given fields of another schema. Field
+        types, validators and configuration are carried over. Derived schemas are
+        cached, so each fieldset is only built once.
+
+    Arguments:
+        schema {Type[PydanticModel]} -- the full schema
+        fields {Tuple[str, ...]} -- names of the fields to keep
+
+    Returns:
+        Type[PydanticModel] -- schema named like the original (e.g. UserOutPartial)
+    """
+    # subclass the schema so its validators and configuration still apply, then
+    # drop the fields that weren't requested
+    partial = create_model(f"{schema.__name__}Partial", __base__=schema)
+    for name in set(partial.__fields__).difference(fields):
+        del partial.__fields__[name]
+    return partial
+
+
+def sparse_response(content: Any, **kwargs) -> ORJSONResponse:
+    """ Render partial schema instances directly, bypassing the endpoint's
+        response_model (which would require the fields that were left out).
+
+    Arguments:
+        content {Any} -- a schema instance or list of schema instances
+
+    Returns:
+        ORJSONResponse
+    """
+    if isinstance(content, list):
+        data: Any = [x.dict() for x in content]
+    else:
+        data = content.dict()
+    return ORJSONResponse(content=data, **kwargs)
@@ -0,0 +1,283 @@
+""" Single pass parser for the filter query parameter grammar.
+
+    A filter is a sequence of terms, each comparing a field to a value:
+
+        filter   := term (SEP term)*
+        term     := [field SEP] ["~"] operator ":" value
+        field    := WORD
+        operator := one of const.FilterOperator
+        value    := QUOTED | BARE
+        SEP      := ":" | "|"
+
+    The first term must name a field. Later terms that omit the field are chained
+    onto the most recently named field (e.g. "id:gt:7|lt:14"). A word following a
+    separator is read as an operator if it names one, otherwise as a field name.
+
+    Quoted values may contain separators and escape quotes with a backslash. Bare
+    values run until the next separator. Values for list operators (in, between) are
+    split on commas; between takes exactly two.
+
+    Every character is visited once, so parsing time is linear in the input length.
+    Runs of characters are consumed with single character class scanners, none of
+    which can backtrack.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import config as conf
+from const import FilterOperator
+from exc import FilterSyntaxError
+
+__all__ = ["FilterTerm", "FilterParser", "parse"]
+
+SEPARATORS = frozenset(":|")
+QUOTES = frozenset("'\"")
+INVERTER = "~"
+OPERATORS: Dict[str, FilterOperator] = {op.value: op for op in FilterOperator}
+LIST_OPERATORS = frozenset({FilterOperator.IN, FilterOperator.BETWEEN})
+
+# Character class scanners used to consume runs of characters in a single call.
+# Each pattern is unambiguous, so none of them can backtrack.
+WORD = re.compile(r"\w*")
+BARE_VALUE = re.compile(r"[^:|'\"]*")
+QUOTED_VALUE = {
+    '"': re.compile(r'[^"\\]*(?:\\.[^"\\]*)*'),
+    "'": re.compile(r"[^'\\]*(?:\\.[^'\\]*)*"),
+}
+ESCAPE = re.compile(r"\\(.)")
+
+
+class FilterTerm:
+    """ A single comparison parsed from a filter expression.
+
+    Attributes:
+        conjunctive {Optional[str]} -- separator preceding a term that names a field,
+            or None for the first term and chained terms
+        field {Optional[str]} -- field name, or None if chained to the previous field
+        sep {str} -- separator between the field and operator, or preceding the
+            operator of a chained term
+        inverted {bool} -- the operator was prefixed with "~"
+        operator {FilterOperator} -- comparison operator
+        value {str} -- the value, with enclosing quotes removed
+        values {Tuple[str, ...]} -- comma separated items of value for list
+            operators, otherwise a single item tuple of value
+        quoted {bool} -- the value was enclosed in quotes
+        position {int} -- offset of the start of the term in the filter string
+    """
+
+    __slots__ = (
+        "conjunctive",
+        "field",
+        "sep",
+        "inverted",
+        "operator",
+        "value",
+        "values",
+        "quoted",
+        "position",
+    )
+
+    def __init__(
+        self,
+        conjunctive: Optional[str],
+        field: Optional[str],
+        sep: str,
+        inverted: bool,
+        operator: FilterOperator,
+        value: str,
+        quoted: bool = False,
+        position: int = 0,
+    ):
+        self.conjunctive = conjunctive
+        self.field = field
+        self.sep = sep
+        self.inverted = inverted
+        self.operator = operator
+        self.value = value
+        self.quoted = quoted
+        self.position = position
+        if operator in LIST_OPERATORS:
+            self.values: Tuple[str, ...] = tuple(value.split(","))
+        else:
+            self.values = (value,)
+
+    def __repr__(self):
+        return (
+            f"FilterTerm(field={self.field!r}, op={self.op!r}, "
+            f"value={self.value!r}, position={self.position})"
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FilterTerm):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    @property
+    def op(self) -> str:
+        """ Operator name, prefixed with "~" if inverted (e.g. "~in") """
+        return f"{INVERTER if self.inverted else ''}{self.operator.value}"
+
+
+class FilterParser:
+    """ Recursive descent parser producing a list of FilterTerms from a filter
+        string.
+
+    Example:
+    >>> FilterParser("id:gt:7|lt:14").parse()
+    >>> [FilterTerm(field='id', op='gt', value='7', position=0),
+         FilterTerm(field=None, op='lt', value='14', position=8)]
+    """
+
+    def __init__(self, text: str, max_length: int = None, max_terms: int = None):
+        self.text = text
+        self.pos = 0
+        self.max_length = conf.FILTER_MAX_LENGTH if max_length is None else max_length
+        self.max_terms = conf.FILTER_MAX_TERMS if max_terms is None else max_terms
+
+    def error(self, message: str, position: int = None) -> FilterSyntaxError:
+        return FilterSyntaxError(message, self.pos if position is None else position)
+
+    def peek(self) -> str:
+        return self.peek_at(self.pos)
+
+    def peek_at(self, pos: int) -> str:
+        return self.text[pos] if pos < len(self.text) else ""
+
+    def parse(self) -> List[FilterTerm]:
+        if len(self.text) > self.max_length:
+            raise self.error(
+                f"filter exceeds maximum length of {self.max_length} characters",
+                self.max_length,
+            )
+
+        terms: List[FilterTerm] = [self.parse_term(None)]
+
+        while self.pos < len(self.text):
+            separator = self.parse_separator()
+            if len(terms) >= self.max_terms:
+                raise self.error(
+                    f"filter exceeds maximum of {self.max_terms} terms", self.pos
+                )
+            terms.append(self.parse_term(separator))
+
+        return terms
+
+    def parse_term(self, separator: Optional[str]) -> FilterTerm:
+        """ Parse a single term. separator is the character preceding the term,
+            or None if this is the first term. """
+        start = self.pos
+        inverted = self.parse_inverter()
+        word_start = self.pos
+        word = self.parse_word()
+
+        # only terms after the first can be chained onto a previous field
+        chained = separator is not None and (inverted or word in OPERATORS)
+
+        if not chained:
+            if inverted:
+                raise self.error("'~' must precede an operator", start)
+
+            # word names a field: the operator follows the next separator
+            field: Optional[str] = word
+            sep = self.parse_separator()
+            conjunctive = separator
+            inverted = self.parse_inverter()
+            operator_start = self.pos
+            operator = self.parse_operator(self.parse_word(), operator_start)
+        else:
+            # chained term: the word is the operator
+            field = None
+            sep = separator or ":"
+            conjunctive = None
+            operator = self.parse_operator(word, word_start)
+
+        if self.peek() != ":":
+            raise self.error(f"expected ':' after operator '{operator.value}'")
+        self.pos += 1
+
+        value, quoted = self.parse_value()
+        if operator == FilterOperator.BETWEEN and value.count(",") != 1:
+            found = value.count(",") + 1
+            raise self.error(f"'between' takes two values, found {found}", start)
+        return FilterTerm(
+            conjunctive=conjunctive,
+            field=field,
+            sep=sep,
+            inverted=inverted,
+            operator=operator,
+            value=value,
+            quoted=quoted,
+            position=start,
+        )
+
+    def parse_separator(self) -> str:
+        char = self.peek()
+        if char not in SEPARATORS:
+            raise self.error(f"expected ':' or '|', found {char or 'end of filter'!r}")
+        self.pos += 1
+        return char
+
+    def parse_inverter(self) -> bool:
+        if self.peek() == INVERTER:
+            self.pos += 1
+            return True
+        return False
+
+    def parse_word(self) -> str:
+        start = self.pos
+        pos = WORD.match(self.text, start).end()  # type: ignore
+        if pos == start:
+            found = self.peek() or "end of filter"
+            raise self.error(f"expected a field name or operator, found {found!r}")
+        self.pos = pos
+        return self.text[start:pos]
+
+    def parse_operator(self, word: str, position: int) -> FilterOperator:
+        try:
+            return OPERATORS[word]
+        except KeyError:
+            raise self.error(f"unknown operator '{word}'", position)
+
+    def parse_value(self) -> Tuple[str, bool]:
+        char = self.peek()
+        if char in QUOTES:
+            return self.parse_quoted(char), True
+
+        start = self.pos
+        pos = BARE_VALUE.match(self.text, start).end()  # type: ignore
+        if self.peek_at(pos) in QUOTES:
+            raise self.error("unexpected quote in unquoted value", pos)
+        if pos == start:
+            raise self.error("expected a value")
+        self.pos = pos
+        return self.text[start:pos], False
+
+    def parse_quoted(self, quote: str) -> str:
+        start = self.pos
+        pos = QUOTED_VALUE[quote].match(self.text, start + 1).end()  # type: ignore
+        if self.peek_at(pos) != quote:
+            raise self.error("unterminated quoted value", start)
+        self.pos = pos + 1
+        return ESCAPE.sub(r"\1", self.text[start + 1 : pos])
+
+
+def parse(text: str, max_length: int = None, max_terms: int = None) -> List[FilterTerm]:
+    """ Parse a filter string into a list of terms.
+
+    Arguments:
+        text {str} -- filter expression (e.g. 'id:gte:7|lt:14')
+
+    Keyword Arguments:
+        max_length {int} -- maximum accepted length of text
+            (default: conf.FILTER_MAX_LENGTH)
+        max_terms {int} -- maximum accepted number of terms
+            (default: conf.FILTER_MAX_TERMS)
+
+    Raises:
+        FilterSyntaxError: the filter is malformed or exceeds the configured limits
+
+    Returns:
+        List[FilterTerm]
+    """
+    return FilterParser(text, max_length=max_length, max_terms=max_terms).parse()
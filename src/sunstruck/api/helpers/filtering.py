@@ -1,32 +1,32 @@
 import logging
-import re
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-from pydantic import parse_obj_as
-from sqlalchemy import and_
-from sqlalchemy.sql.elements import BinaryExpression, ClauseList
+from sqlalchemy import all_, and_, any_, bindparam, or_
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, ClauseList
 from sqlalchemy.sql.schema import Column
 
+import config as conf
+from api.helpers.filter_parser import LIST_OPERATORS, FilterTerm, parse
+from const import FilterOperator
 from db.models import Model
-from schemas.query_filter import FilterParam, FilterParams
+from db.search import matches, similar
+from exc import FilterSyntaxError
+from util.cache import LRUCache
+from util.telemetry import Telemetry, UsageKey
 
 logger = logging.getLogger(__name__)
 
-regex = r"""
-        # (?:\?filter=)?
-        (?P<conjunctive>[:|]?)
-        (?P<field_name>[:|]?\w+[^:|'\"])?
-        (?P<sep>[:|])
-        (?P<inverter>~)?
-        (?P<operator>eq|gte|gt|lte|lt|in|between|regex|like|is})
-        (?=:(?P<value>
-        (?P<quoted>['\"][^'\"\\]*(?:\\.[^'\\]*)*['\"])
-        |
-        (?:(?P<unquoted>[^:|\s]*[^'\":|\s]))
-        ))
-        """
+CONJUNCTIVES: Dict[str, Callable[..., ClauseList]] = {":": and_, "|": or_}
+
+
+def search(column: Column, value: Any) -> BinaryExpression:
+    """ Match a search term against a column: a full text match for tsvector
+        columns, otherwise a trigram similarity match (see db.search). """
+    if isinstance(column.type, TSVECTOR):
+        return matches(column, value)
+    return similar(column, value)
 
-PATTERN = re.compile(regex, re.VERBOSE)
 
 OPERATIONS: Dict[str, Callable[[Column, Any], BinaryExpression]] = {
     "is": lambda column, value: column.is_(value),
@@ -36,37 +36,99 @@ OPERATIONS: Dict[str, Callable[[Column, Any], BinaryExpression]] = {
     "lt": lambda column, value: column < value,
     "lte": lambda column, value: column <= value,
     "like": lambda column, value: column.like(value),
+    "ilike": lambda column, value: column.ilike(value),
+    "search": search,
     "in": lambda column, value: column.in_(value),
     "between": lambda column, value: column.between(*value),
-    "~is": lambda column, value: column.isnot_(value),
+    "~is": lambda column, value: column.isnot(value),
     "~eq": lambda column, value: column != value,
     "~like": lambda column, value: column.notlike(value),
+    "~ilike": lambda column, value: column.notilike(value),
+    "~search": lambda column, value: ~search(column, value),
     "~in": lambda column, value: column.notin_(value),
 }
 
+# membership tests against a single array parameter, used for large "in" lists so
+# the statement text doesn't depend on the number of values
+ARRAY_OPERATIONS: Dict[str, Callable[[Column, BindParameter], BinaryExpression]] = {
+    "in": lambda column, array: column == any_(array),
+    "~in": lambda column, array: column != all_(array),
+}
+
+NULLS = frozenset({"null", "none"})
+
+
+# usage of filtered and sorted fields, per (table, field, operator)
+telemetry = Telemetry(
+    directory=conf.TELEMETRY_DIR,
+    flush_interval=conf.TELEMETRY_FLUSH_INTERVAL,
+    enabled=conf.TELEMETRY_ENABLED,
+)
+
+
+class Translation(NamedTuple):
+    """ A translated filter and the (table, field, operator) keys it uses """
+
+    predicate: ClauseList
+    usage: Tuple[UsageKey, ...]
+
+
+# translated predicates, keyed by (model, filter string)
+filter_cache: LRUCache[Translation] = LRUCache(
+    maxsize=conf.FILTER_CACHE_SIZE, name="filter"
+)
+
 
 class Filter:
     # Dependency for injection
 
+    cache: LRUCache[Translation] = filter_cache
+
     def __init__(self, model: Model):
         self.model = model
         self.column_map = self.model.c.dict()
+        self.coercers = self.model.c.coercers
+        self.usage: Tuple[UsageKey, ...] = ()
 
     def __call__(self, filter: str) -> ClauseList:
-        return self.translate(self.parse(filter))
+        """ Translate a filter string to a sqlalchemy predicate. Translated predicates
+            are cached per model, so repeated filters skip parsing and translation.
+            Literal values in the predicate are held as bound parameters, so reusing
+            the predicate also lets sqlalchemy reuse the compiled statement.
+        """
+        key = (self.model, filter)
+        cached = self.cache.get(key)
+        if cached is None:
+            predicate = self.translate(self.parse(filter))
+            self.cache.set(key, Translation(predicate, self.usage))
+            return predicate
+
+        # translate counts the fields it uses, so count them for cache hits too
+        self.usage = cached.usage
+        telemetry.count(self.usage)
+        return cached.predicate
+
+    @classmethod
+    def cache_info(cls) -> Dict[str, Any]:
+        """ Get hit/miss counters for the translated filter cache """
+        return cls.cache.info()
 
     @staticmethod
-    def parse(s: str) -> List[FilterParam]:
-        records = [dict(zip(PATTERN.groupindex, m)) for m in PATTERN.findall(s)]
-        return FilterParams(params=records).params
+    def parse(s: str) -> List[FilterTerm]:
+        """ Parse a filter string into a list of terms. Raises FilterSyntaxError,
+            reporting the offending position, if the filter is malformed. """
+        return parse(s)
 
-    def translate(self, filters: List[FilterParam]) -> ClauseList:
-        """ Translate the given list of filters to a sqlalchemy predicate.
+    def translate(self, filters: List[FilterTerm]) -> ClauseList:
+        """ Translate the given list of filters to a sqlalchemy predicate. Each
+            distinct (field, operator) used by the filters is counted in the filter
+            telemetry and kept in usage, so the caller can record the latency of
+            queries using the predicate.
 
         Parameters
         ----------
-        filters : List[FilterParam]
-            list of filter parameter objects
+        filters : List[FilterTerm]
+            list of parsed filter terms
 
         Returns
         -------
@@ -78,13 +140,17 @@ class Filter:
 
         group_conjunctive = and_
         expressions = []
+        usage: Dict[UsageKey, None] = {}  # ordered set
         field_name: Optional[str] = None
         expression_group: List[BinaryExpression] = []
         for filt in filters:
-            if filt.field_name is not None:
+            conjunctive = CONJUNCTIVES.get(filt.conjunctive)  # type: ignore
+            filt_sep = CONJUNCTIVES[filt.sep]
+
+            if filt.field is not None:
 
                 # start of new filter
-                if filt.field_name != field_name:
+                if filt.field != field_name:
 
                     # progressed to another field's filter
                     if len(expression_group) > 0:
@@ -93,24 +159,24 @@ class Filter:
                     expression_group = []
 
                 # field_name changed. update it's ref
-                field_name = filt.field_name
+                field_name = filt.field
 
             else:  # field_name is None
                 # filter is a chained filter on the same field, so
                 # carry the previous field name forward
                 pass
 
-            if filt.conjunctive is not None:
-                if filt.conjunctive != group_conjunctive:
+            if conjunctive is not None:
+                if conjunctive != group_conjunctive:
                     if len(expression_group) > 0:
                         expressions.append(group_conjunctive(*expression_group))
                     expression_group = []
 
-                group_conjunctive = filt.conjunctive
+                group_conjunctive = conjunctive
                 logger.debug(f"group={group_conjunctive.__name__}")
 
-            sep = filt.conjunctive or filt.sep
-            if filt.sep is not None:
+            sep = conjunctive or filt_sep
+            if filt_sep is not None:
                 # if sep != conjunctive:
                 #     if len(expression_group) > 0:
                 #         expressions.append(conjunctive(*expression_group))
@@ -120,22 +186,16 @@ class Filter:
                 group_conjunctive = sep
                 logger.debug(f"{group_conjunctive.__name__}")
 
-            column = self.column_map[field_name]
-
-            if filt.operator in ["in", "like", "between"]:
-                # parse as list of items
-                value = [
-                    parse_obj_as(column.type.python_type, v)
-                    for v in filt.value.strip('"').split(",")
-                ]
-            else:
-                # parse as scalar item
-                value = parse_obj_as(column.type.python_type, filt.value)
+            try:
+                column = self.column_map[field_name]  # type: ignore
+            except KeyError:
+                raise FilterSyntaxError(f"unknown field '{field_name}'", filt.position)
 
-            op = f"{filt.inverter or ''}{filt.operator}"
-            expression: BinaryExpression = OPERATIONS[op](column, value)
-            expression_group.append(filt.sep(expression))
-            logger.debug([str(x) for x in expression_group])
+            expression: BinaryExpression = self.compare(column, filt)
+            usage[UsageKey(self.model.__table__.name, column.name, filt.op)] = None
+            expression_group.append(filt_sep(expression))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug([str(x) for x in expression_group])
 
         # capture remainder
         if len(expression_group) > 0:
@@ -145,9 +205,43 @@ class Filter:
         # sqlalchemy (e.g. .filter(predicate)) or
         # gino (e.g. .where(predicate))
         predicate = and_(*expressions)
-        logger.debug(f"translated filter to sql predicate: {predicate.compile()}")
+        self.usage = tuple(usage)
+        telemetry.count(self.usage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"translated filter to sql predicate: {predicate.compile()}")
         return predicate
 
+    def compare(self, column: Column, filt: FilterTerm) -> BinaryExpression:
+        """ Build the comparison expressed by a single filter term, converting its
+            value(s) with the column's precompiled coercer. """
+        coerce = self.coercers[column.name]
+        op = filt.op
+
+        try:
+            if filt.operator in LIST_OPERATORS:
+                # parse as list of items
+                value: Any = [coerce(v) for v in filt.values]
+            elif filt.operator == FilterOperator.IS and filt.value.lower() in NULLS:
+                value = None
+            else:
+                # parse as scalar item
+                value = coerce(filt.value)
+        except ValueError as e:
+            raise FilterSyntaxError(
+                f"invalid value for '{column.name}': {filt.value}", filt.position
+            ) from e
+
+        if op in ARRAY_OPERATIONS and len(value) >= conf.FILTER_ARRAY_THRESHOLD:
+            array = bindparam(None, value, type_=ARRAY(column.type))
+            return ARRAY_OPERATIONS[op](column, array)
+
+        try:
+            operation = OPERATIONS[op]
+        except KeyError:
+            raise FilterSyntaxError(f"unsupported operator '{op}'", filt.position)
+
+        return operation(column, value)
+
 
 if __name__ == "__main__":
     s = 'id:lte:5:gte:4|lt:6|is_superuser:~in:false,false|is:true:updated_at:between:"1929-01-01T17:22:20.937752,2020-01-31T17:22:20.937752"'  # noqa
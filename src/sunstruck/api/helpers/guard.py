@@ -0,0 +1,157 @@
+""" Cost guard for client filters.
+
+    Some filters are cheap to write and expensive to run: an infix like:%x% or a long
+    in list can force a scan of an entire table, and a client repeating them can
+    saturate the database. Before a filtered query runs, the guard asks the planner
+    for its estimated cost and number of matching rows (EXPLAIN, without executing
+    the query), and rejects queries exceeding the model's budget with a 422 that
+    explains which limit was exceeded. Queries within budget, but above its throttle
+    cost, run with limited concurrency.
+
+    Plans are cached per filter shape: the filtered query's SQL, which holds every
+    value as a bound parameter, along with a coarse description of each value (e.g.
+    whether a pattern starts with a wildcard, or the magnitude of a list's length).
+    Filters differing only by values of the same shape share an estimate, so
+    repeated filters are only planned once per FILTER_PLAN_CACHE_TTL.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Hashable, NamedTuple, Optional, Tuple
+
+import sqlalchemy as sa
+from fastapi import HTTPException, status
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.elements import ClauseElement
+
+import config as conf
+from db.explain import PlanBudget, explain
+from db.models import Model
+from util.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "PlanEstimate",
+    "default_budget",
+    "get_budget",
+    "estimate_plan",
+    "check_budget",
+    "throttle",
+]
+
+default_budget = PlanBudget(
+    cost=conf.FILTER_MAX_PLAN_COST or None,
+    rows=conf.FILTER_MAX_PLAN_ROWS or None,
+    throttle_cost=conf.FILTER_THROTTLE_PLAN_COST or None,
+)
+
+# limits the number of throttled queries running at the same time
+throttle = asyncio.Semaphore(conf.FILTER_THROTTLE_CONCURRENCY)
+
+
+class PlanEstimate(NamedTuple):
+    """ The planner's estimates for a filtered query """
+
+    cost: float
+    rows: int
+
+
+# (model, filter shape) -> (expiration, estimate)
+plan_cache: LRUCache[Tuple[float, PlanEstimate]] = LRUCache(
+    maxsize=conf.FILTER_PLAN_CACHE_SIZE, name="plan"
+)
+
+
+def value_shape(value: Any) -> Hashable:
+    """ Describe a bound value by the properties that change how it's planned """
+    if isinstance(value, str):
+        # a leading wildcard prevents btree index scans for like patterns
+        return "wildcard" if value[:1] in ("%", "_") else "str"
+    if isinstance(value, (list, tuple)):
+        return ("list", len(value).bit_length())
+    return type(value).__name__
+
+
+def filter_shape(statement: ClauseElement) -> Hashable:
+    """ Normalize a statement to its SQL and the shape of its bound values """
+    compiled = statement.compile(dialect=postgresql.dialect())
+    return str(compiled), tuple(value_shape(v) for v in compiled.params.values())
+
+
+def get_budget(model: Model, budget: Optional[PlanBudget] = None) -> PlanBudget:
+    """ Get the budget for queries of a model: the given budget, or the one the
+        model declares with __plan_budget__, or the configured default """
+    return budget or getattr(model, "__plan_budget__", None) or default_budget
+
+
+async def estimate_plan(model: Model, predicate: ClauseElement) -> PlanEstimate:
+    """ Get the planner's estimate of the cost to find every row of the model
+        matching the predicate, regardless of paging. That's what counting the
+        matches costs, along with any sort that can't be read from an index.
+
+    Arguments:
+        model {Model} -- data model being filtered
+        predicate {ClauseElement} -- translated filter
+
+    Returns:
+        PlanEstimate
+    """
+    statement = sa.select(*model.meta.pk.columns).where(predicate)
+    key = (model, filter_shape(statement))
+
+    now = time.monotonic()
+    cached = plan_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    plan = await explain(statement)
+    estimate = PlanEstimate(cost=float(plan["Total Cost"]), rows=int(plan["Plan Rows"]))
+    plan_cache.set(key, (now + conf.FILTER_PLAN_CACHE_TTL, estimate))
+    return estimate
+
+
+async def check_budget(
+    model: Model, predicate: Optional[ClauseElement], budget: PlanBudget
+) -> Optional[PlanEstimate]:
+    """ Reject a filter whose estimated cost or matching rows exceed the budget.
+
+    Arguments:
+        model {Model} -- data model being filtered
+        predicate {Optional[ClauseElement]} -- translated filter
+        budget {PlanBudget} -- limits to enforce
+
+    Raises:
+        HTTPException: 422 if the filter exceeds the budget
+
+    Returns:
+        Optional[PlanEstimate] -- the filter's estimate, or None if there's no
+            filter or budget to check
+    """
+    if predicate is None or not budget.enabled:
+        return None
+
+    estimate = await estimate_plan(model, predicate)
+
+    reason = None
+    if budget.cost is not None and estimate.cost > budget.cost:
+        reason = (
+            f"its estimated cost ({estimate.cost:.0f}) exceeds the limit of "
+            f"{budget.cost:.0f}"
+        )
+    elif budget.rows is not None and estimate.rows > budget.rows:
+        reason = (
+            f"it would match an estimated {estimate.rows} rows, more than the limit "
+            f"of {budget.rows}"
+        )
+
+    if reason is not None:
+        logger.info(f"rejected {model.__name__} filter: {reason}")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Filter is too expensive: {reason}. Narrow the filter, e.g. "
+            "by filtering on indexed fields or avoiding leading wildcards.",
+        )
+
+    return estimate
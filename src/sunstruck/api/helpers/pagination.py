@@ -1,19 +1,50 @@
+import asyncio
+import contextlib
 import logging
-from typing import Dict, List, Optional, Tuple, Union
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-from fastapi import Query
+import sqlalchemy as sa
+from fastapi import HTTPException, Query, params, status
 from pydantic import BaseModel as PydanticModel
-from sqlalchemy.sql.elements import TextClause
+from sqlalchemy import Column
+from sqlalchemy.sql.elements import ClauseElement
+from sqlalchemy.sql.selectable import Select
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
+import config as conf
+from api.helpers.conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from api.helpers.cursor import decode_cursor, encode_cursor
+from api.helpers.fastpath import encode_rows, fast_path_fields
+from api.helpers.fields import parse_fields, partial_schema, sparse_response
+from api.helpers.filtering import Filter, telemetry
+from api.helpers.guard import check_budget, get_budget, throttle
+from api.helpers.streaming import MEDIA_TYPES, encode_chunks, negotiate_format
+from const import CountMode, CountStrategy, ResponseFormat
 from db import db
+from db.explain import PlanBudget
 from db.models import Model
+from exc import FilterSyntaxError, InvalidCursorError
+from util.telemetry import UsageKey
 
 logger = logging.getLogger(__name__)
 
 LINK_TEMPLATE = '<{url}>; rel="{rel}"'
 
+COUNT_HEADERS = ("x-total-count", "x-estimated-count")
+
+UNCHECKED = object()
+
+# model -> (expiration, estimated rowcount)
+row_estimates: Dict[type, Tuple[float, int]] = {}
+
 
 class PaginationMeta(type):
     """ Pagination dependency metaclass to enable easy extension of default
@@ -49,6 +80,7 @@ class PaginationMeta(type):
             offset: int = Query(
                 default=cls.default_offset,
                 ge=0,
+                le=cls.max_offset,
                 description="Offset the results returned by this number.",
                 example="offset=45",
             ),
@@ -61,21 +93,62 @@ class PaginationMeta(type):
             ),
             filter: str = Query(
                 default=cls.default_filter,
-                description="Provide a SQL-type predicate to filter the results",
-                example="field_name<=10",
+                description="Filter expression to apply to the results",
+                example="filter=id:gte:10|lt:5:is_active:eq:true",
             ),
             sort: str = Query(
                 default=cls.default_sort,
-                description="Field to sort the results by.",
-                example="sort=id",
+                description="Comma separated fields to sort the results by. Prefix "
+                "a field with - to sort it in descending order.",
+                example="sort=-updated_at,id",
             ),
             desc: bool = Query(
                 default=cls.default_desc,
                 description="Results should be sorted in descending order.",
                 example="desc=false",
             ),
+            cursor: str = Query(
+                default=None,
+                description="Return the page following this cursor, taken from the "
+                "previous page's next link. Offset is ignored when paging by cursor.",
+                example="cursor=eyJrIjpbImlkIl0sInYiOlsxMF0sImQiOjF9...",
+            ),
+            fields: str = Query(
+                default=None,
+                description="Comma separated list of fields to include in the results.",
+                example="fields=id,username",
+            ),
+            format: ResponseFormat = Query(
+                default=None,
+                description="Stream the results in this format instead of returning "
+                "a JSON array. Can also be requested with the Accept header "
+                "(application/x-ndjson or text/csv).",
+                example="format=ndjson",
+            ),
+            count: CountMode = Query(
+                default=cls.default_count,
+                description="How to count the total number of results: exact, "
+                "estimate (from the query planner), or none to skip counting.",
+                example="count=none",
+            ),
         ):
-            init_ref(self, request, offset, limit, filter, sort, desc)
+            # when called directly rather than by FastAPI, unspecified arguments are
+            # still Query instances, so fall back to the Query defaults
+            args = [
+                x.default if isinstance(x, params.Query) else x
+                for x in (
+                    offset,
+                    limit,
+                    filter,
+                    sort,
+                    desc,
+                    cursor,
+                    fields,
+                    format,
+                    count,
+                )
+            ]
+            init_ref(self, request, *args)
 
         cls.__init__ = __init__
         return cls
@@ -87,9 +160,29 @@ class Pagination(metaclass=PaginationMeta):
     default_offset = 0
     default_limit = 25
     max_limit: int = 1000
+    max_offset: Optional[int] = None
+    # offset at which pages are selected with a deferred join. If None, never.
+    deferred_join_offset: Optional[int] = conf.PAGINATION_DEFERRED_JOIN_OFFSET
     default_filter: Optional[str] = None
     default_sort: str = ""
     default_desc: bool = True
+    default_count: CountMode = CountMode.EXACT
+    # names of the fields clients may sort by. If None, the fields the model declares
+    # with __sortable__ are allowed, or any column if it doesn't declare any.
+    sortable: Optional[List[str]] = None
+    # page by cursor (keyset) rather than offset, even if no cursor is requested
+    keyset: bool = False
+    # how to count matching rows (see get_count_strategy). If None, chosen per query.
+    count_strategy: Optional[CountStrategy] = None
+    # size of table above which sorts that aren't index backed are rejected (see
+    # check_sort). If None, any allowed sort is accepted.
+    sort_max_rows: Optional[int] = conf.PAGINATION_SORT_MAX_ROWS
+    # limits on the planner's estimates for filtered queries (see check_cost). If
+    # None, the model's __plan_budget__ or the configured default budget applies.
+    plan_budget: Optional[PlanBudget] = None
+    # column holding each row's modification time, used to build the validators
+    # of a page (see validators). If None or not a column, pages aren't validated.
+    last_modified_column: Optional[str] = "updated_at"
 
     def __init__(
         self,
@@ -99,6 +192,10 @@ class Pagination(metaclass=PaginationMeta):
         filter: str = "",
         sort: str = "",
         desc: bool = True,
+        cursor: str = None,
+        fields: str = None,
+        format: ResponseFormat = None,
+        count: CountMode = CountMode.EXACT,
     ):
 
         self.request = request
@@ -108,17 +205,72 @@ class Pagination(metaclass=PaginationMeta):
         self.sort = sort
         self.desc = desc
         self.sort_direction = "desc" if desc else "asc"
+        self.directions: Dict[str, bool] = {}
+        self.cursor = cursor
+        self.fields = fields
+        self.selected: Optional[Tuple[str, ...]] = None
+        self.format = format
+        self.count_mode = CountMode(count)
+        self.next_cursor: Optional[str] = None
+        self.has_next: bool = False
+        # latest modification time of the matching rows, read while counting them
+        self.last_modified: Optional[datetime] = None
+        self.throttled: bool = False
+        # predicate last checked by check_cost, so it's only planned once
+        self.checked: Any = UNCHECKED
+        # (table, field, operator) keys of the filter and sort, for telemetry
+        self.usage: Tuple[UsageKey, ...] = ()
+        self.sort_usage: Tuple[UsageKey, ...] = ()
         self.model: Model = None
 
-    def get_next_url(self, count: int) -> Optional[str]:
+    @property
+    def is_keyset(self) -> bool:
+        """ True if paging by cursor instead of offset """
+        return self.keyset or self.cursor is not None
+
+    @property
+    def response_format(self) -> ResponseFormat:
+        """ Format requested by the format parameter or the Accept header """
+        return negotiate_format(self.request, self.format)
+
+    @property
+    def is_streaming(self) -> bool:
+        """ True if the results should be streamed (see stream) """
+        return self.response_format != ResponseFormat.JSON
+
+    @property
+    def lookahead(self) -> bool:
+        """ True if an extra row is fetched to determine whether another page
+            follows, rather than relying on an exact count """
+        return self.is_keyset or self.count_mode != CountMode.EXACT
+
+    def get_next_url(self, count: Optional[int]) -> Optional[str]:
         """ Generate a URI to the next page of the queried resource, if it exists.
 
         Returns:
             Optional[str] -- string URL or None (e.g. http://example.com/?limit=10&offset=30)
         """
 
-        if self.offset + self.limit >= count or self.limit <= 0:
-            #  Currently on last page of results, or no limit is in effect.
+        if self.is_keyset:
+            if self.next_cursor is None:
+                return None
+            return str(
+                self.request.url.remove_query_params(
+                    keys=["offset"]
+                ).include_query_params(limit=self.limit, cursor=self.next_cursor)
+            )
+
+        if self.limit <= 0:
+            #  No limit is in effect
+            return None
+
+        if self.lookahead:
+            has_next = self.has_next
+        else:
+            has_next = count is not None and self.offset + self.limit < count
+
+        if not has_next:
+            #  Currently on last page of results
             return None
 
         #  ADD the current offset to limit to build the url for the next page
@@ -135,6 +287,10 @@ class Pagination(metaclass=PaginationMeta):
             Optional[str] -- string URL or None (e.g. http://example.com/?limit=10&offset=10)
         """
 
+        if self.is_keyset:
+            #  Cursors only page forward
+            return None
+
         if self.offset <= 0:
             #  No offset is in effect
             return None
@@ -150,26 +306,493 @@ class Pagination(metaclass=PaginationMeta):
             )
         )
 
+    def predicate(
+        self, filter: Optional[Union[str, ClauseElement]]
+    ) -> Optional[ClauseElement]:
+        """ Translate a filter expression to a sqlalchemy predicate using the
+            structured filter grammar (see api.helpers.filtering.Filter). Literal
+            values become bound parameters, so queries differing only by value share
+            the same statement.
+
+        Raises:
+            HTTPException: 422 if the filter is malformed or references unknown fields
+
+        Returns:
+            Optional[ClauseElement] -- predicate, or None if no filter is given
+        """
+        if filter is None or isinstance(filter, ClauseElement):
+            return filter
+
+        if not filter:
+            return None
+
+        translator = Filter(self.model)
+        try:
+            predicate = translator(filter)
+        except FilterSyntaxError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid filter: {e}",
+            )
+        self.usage = translator.usage
+        return predicate
+
+    def parse_sort(self) -> List[Tuple[str, bool]]:
+        """ Parse the sort parameter: a comma separated list of field names, each
+            optionally prefixed with - to sort in descending order (e.g.
+            sort=-updated_at,id). If no field has a prefix, every field is sorted in
+            the direction given by the desc parameter (e.g. sort=id&desc=false).
+
+        Raises:
+            HTTPException: 422 if a field is given more than once
+
+        Returns:
+            List[Tuple[str, bool]] -- field names and whether each is descending
+        """
+        names = [name.strip() for name in (self.sort or "").split(",")]
+        names = [name for name in names if name]
+        explicit = any(name.startswith("-") for name in names)
+
+        keys: List[Tuple[str, bool]] = []
+        for name in names:
+            if name.startswith("-"):
+                keys.append((name[1:], True))
+            else:
+                keys.append((name, self.desc and not explicit))
+
+        fields = [name for name, _ in keys]
+        if len(set(fields)) != len(fields):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid sort '{self.sort}': fields can only be sorted once",
+            )
+        return keys
+
+    def sort_columns(self) -> List[Column]:
+        """ Get the columns to order the results by (see parse_sort), recording the
+            direction of each in directions, and counting each sort field in the
+            telemetry (see api.helpers.filtering). Sort fields must be columns of the
+            model and one of the allowed fields: sortable, if defined, otherwise the
+            fields the model declares as sortable (see db.registry), otherwise any
+            column. The primary key is always appended as a tie-breaker, sorted in
+            the direction of the first field, so that every row has a unique
+            position and offset pages can't skip or repeat rows.
+
+        Raises:
+            HTTPException: 422 if a sort field isn't allowed
+
+        Returns:
+            List[Column] -- columns in sort order
+        """
+        allowed = self.sortable
+        if allowed is None:
+            allowed = self.model.meta.sortable or self.model.meta.columns.names
+
+        mapping = self.model.meta.columns.mapping
+        columns: List[Column] = []
+        self.directions = {}
+
+        for name, desc in self.parse_sort():
+            if name not in mapping or name not in allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Invalid sort field '{name}'. Options: {list(allowed)}",
+                )
+            columns.append(mapping[name])
+            self.directions[name] = desc
+
+        table = self.model.__table__.name
+        self.sort_usage = tuple(UsageKey(table, c.name, "sort") for c in columns)
+        telemetry.count(self.sort_usage)
+
+        leading = self.directions[columns[0].name] if columns else self.desc
+        for column in self.model.meta.pk.columns:
+            if column not in columns:
+                columns.append(column)
+                self.directions[column.name] = leading
+
+        return columns
+
+    def is_descending(self, column: Column) -> bool:
+        return self.directions.get(column.name, self.desc)
+
+    def order_by(self, columns: List[Column]) -> List[ClauseElement]:
+        return [c.desc() if self.is_descending(c) else c.asc() for c in columns]
+
+    async def check_sort(self, columns: List[Column]):
+        """ Reject sorts that can't be read from an index once the model's table is
+            large enough that sorting every matching row would be expensive. A sort
+            is index backed if its first column leads an index (see db.registry),
+            in which case the database reads rows in order and stops at the limit.
+            Otherwise, every matching row is sorted before the first is returned.
+
+        Raises:
+            HTTPException: 422 if the sort isn't index backed and the table has more
+                than sort_max_rows rows
+        """
+        if not columns or self.sort_max_rows is None:
+            return
+
+        indexed = self.model.meta.indexed
+        if columns[0].name in indexed:
+            return
+
+        if await self.estimated_rows() > self.sort_max_rows:
+            allowed = self.sortable or self.model.meta.sortable or sorted(indexed)
+            options = [name for name in allowed if name in indexed]
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Sorting by '{columns[0].name}' isn't supported for "
+                f"{self.model.__name__} because it isn't indexed. "
+                f"Options: {options}",
+            )
+
+    def seek(self, columns: List[Column]) -> Optional[ClauseElement]:
+        """ Build the keyset predicate selecting the rows after the requested
+            cursor's position, e.g. (created_at, id) < (:a, :b) when sorting in
+            descending order. With an index on the sort columns, the database seeks
+            straight to the cursor's position, so every page costs the same. If the
+            columns are sorted in different directions, the comparison is expanded,
+            e.g. updated_at < :a OR (updated_at = :a AND id > :b).
+
+            Rows with a NULL sort key can't be compared, so cursors should only be
+            used to sort by non-nullable columns.
+
+        Raises:
+            HTTPException: 422 if the cursor is invalid or was created for a
+                different sort order
+
+        Returns:
+            Optional[ClauseElement] -- predicate, or None if no cursor is given
+        """
+        if not self.cursor:
+            return None
+
+        directions = tuple(self.is_descending(c) for c in columns)
+        try:
+            cursor = decode_cursor(self.cursor)
+            keys = tuple(c.name for c in columns)
+            if cursor.keys != keys or cursor.desc != directions:
+                raise InvalidCursorError("cursor doesn't match the requested sort")
+            values = cursor.coerce(self.model.c.coercers)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid cursor: {e}",
+            )
+
+        position = [
+            sa.bindparam(None, v, type_=c.type) for c, v in zip(columns, values)
+        ]
+
+        if len(set(directions)) == 1:
+            key, position = sa.tuple_(*columns), sa.tuple_(*position)
+            return key < position if directions[0] else key > position
+
+        clauses = []
+        for i, (column, value, desc) in enumerate(zip(columns, position, directions)):
+            ties = [c == v for c, v in zip(columns[:i], position[:i])]
+            clauses.append(sa.and_(*ties, column < value if desc else column > value))
+        return sa.or_(*clauses)
+
+    async def check_cost(self, predicate: Optional[ClauseElement] = None):
+        """ Reject the filter if the planner estimates it's too expensive to run,
+            and note whether it should be throttled (see api.helpers.guard). A
+            predicate already checked by this instance, e.g. by respond before it
+            paginates, isn't checked again.
+
+        Raises:
+            HTTPException: 422 if the filter exceeds the model's plan budget
+        """
+        if predicate is self.checked:
+            return
+
+        budget = get_budget(self.model, self.plan_budget)
+        estimate = await check_budget(self.model, predicate, budget)
+        self.throttled = (
+            estimate is not None
+            and budget.throttle_cost is not None
+            and estimate.cost > budget.throttle_cost
+        )
+        self.checked = predicate
+
+    @contextlib.asynccontextmanager
+    async def throttling(self):
+        """ Limit the concurrency of throttled queries """
+        if not self.throttled:
+            yield
+            return
+        async with throttle:
+            yield
+
+    @property
+    def is_deferred(self) -> bool:
+        """ True if the page should be selected with a deferred join """
+        return (
+            not self.is_keyset
+            and self.limit > 0
+            and self.deferred_join_offset is not None
+            and self.offset >= self.deferred_join_offset
+        )
+
+    def select(self, columns: List[Column]) -> Select:
+        """ Select the model, or only the requested fields (plus any sort columns)
+            if a sparse fieldset was requested. """
+        if not self.selected:
+            return self.model.select()
+
+        mapping = self.model.meta.columns.mapping
+        selected = [mapping[name] for name in self.selected]
+        return self.model.select(*selected, *[c for c in columns if c not in selected])
+
+    def statement(
+        self,
+        columns: List[Column],
+        predicate: Optional[ClauseElement] = None,
+        windowed: bool = False,
+    ) -> Select:
+        """ Build the paged sql query. When paging by cursor or without an exact
+            count, one extra row is selected to determine whether another page
+            follows. If windowed, count(*) OVER () is added to the select list as
+            total_count, along with the latest modification time of the matching
+            rows as last_modified if the page is validated (see modified_column).
+
+            For offsets of at least deferred_join_offset, the query is rewritten as a
+            deferred join: only the primary keys are sorted, offset and limited (an
+            index-only scan, given a suitable index), then joined back to the table
+            to fetch the full rows on the page. The database then discards narrow
+            keys rather than entire rows for every offset row. Both queries agree on
+            the order of ties, since the sort always ends with the primary key.
+        """
+        deferred = self.is_deferred
+        pk = list(self.model.meta.pk.columns)
+        order_by = self.order_by(columns)
+        modified = self.modified_column() if windowed else None
+
+        stmt = sa.select(*pk) if deferred else self.select(columns)
+
+        if predicate is not None:
+            stmt = stmt.where(predicate)
+        if self.is_keyset:
+            seek = self.seek(columns)
+            if seek is not None:
+                stmt = stmt.where(seek)
+        else:
+            stmt = stmt.offset(self.offset)
+        if order_by:
+            stmt = stmt.order_by(*order_by)
+        if self.limit > 0:
+            stmt = stmt.limit(self.limit + 1 if self.lookahead else self.limit)
+        if windowed:
+            stmt = stmt.add_columns(sa.func.count().over().label("total_count"))
+        if modified is not None:
+            stmt = stmt.add_columns(sa.func.max(modified).over().label("last_modified"))
+
+        if not deferred:
+            return stmt
+
+        page = stmt.subquery("page")
+        joined = (
+            self.select(columns)
+            .join(page, sa.and_(*[c == page.c[c.name] for c in pk]))
+            .order_by(*order_by)
+        )
+        if windowed:
+            joined = joined.add_columns(page.c.total_count)
+        if modified is not None:
+            joined = joined.add_columns(page.c.last_modified)
+        return joined
+
+    def trim(self, columns: List[Column], result: list) -> list:
+        """ Drop the extra row selected by a lookahead, setting has_next if another
+            page follows. When paging by cursor, next_cursor is set to the position
+            of the page's last row.
+        """
+        if not self.lookahead or not 0 < self.limit < len(result):
+            return result
+
+        result = result[: self.limit]
+        self.has_next = True
+
+        if self.is_keyset:
+            last = result[-1]
+            self.next_cursor = encode_cursor(
+                keys=[c.name for c in columns],
+                values=[getattr(last, c.name) for c in columns],
+                desc=[self.is_descending(c) for c in columns],
+            )
+        return result
+
+    async def fetch(self, predicate: Optional[ClauseElement] = None) -> list:
+        """ Execute the paged sql query, returning the model instances on the
+            requested page. The query runs on its own session (and connection), so
+            it can run alongside a count. Its latency is recorded in the telemetry
+            of each field the query filters or sorts by.
+        """
+        columns = self.sort_columns()
+        await self.check_sort(columns)
+
+        with telemetry.timed(self.usage + self.sort_usage):
+            async with db.session_factory() as session:
+                result = await session.execute(self.statement(columns, predicate))
+                result = result.all() if self.selected else result.scalars().all()
+
+        return self.trim(columns, result)
+
+    async def fetch_windowed(
+        self, predicate: Optional[ClauseElement] = None
+    ) -> Tuple[list, int]:
+        """ Fetch the requested page and the total number of matching rows in a
+            single query, adding count(*) OVER () to the page's select list. The
+            window is computed over every matching row before the limit is applied,
+            so this is best suited to small tables. The latest modification time of
+            the matching rows is read by the same window (see validators).
+
+        Returns:
+            Tuple[list, int] -- model instances on the page and total count
+        """
+        columns = self.sort_columns()
+        await self.check_sort(columns)
+        stmt = self.statement(columns, predicate, windowed=True)
+
+        with telemetry.timed(self.usage + self.sort_usage):
+            async with db.session_factory() as session:
+                rows = (await session.execute(stmt)).all()
+
+        if rows:
+            count = rows[0].total_count
+            if self.modified_column() is not None:
+                self.last_modified = rows[0].last_modified
+        elif self.offset > 0:
+            # the page is past the last row, so the window had nothing to count
+            count = await self.count(predicate)
+        else:
+            count = 0
+
+        if not self.selected:
+            rows = [row[0] for row in rows]
+
+        return self.trim(columns, rows), count
+
+    async def count(self, predicate: Optional[ClauseElement] = None) -> int:
+        """ Count the matching rows. If the page is validated, their latest
+            modification time is read by the same aggregate query. """
+        column = self.modified_column()
+        if column is None:
+            return await self.model.agg.count(predicate)
+
+        result = await self.model.agg.agg(
+            [db.func.max(column), db.func.count(self.model.agg.default_column)],
+            filter=predicate,
+        )
+        self.last_modified = result["max"]
+        return result["count"]
+
+    async def estimated_rows(self) -> int:
+        """ Get the estimated rowcount of the model's table, refreshed at most once
+            every PAGINATION_ESTIMATE_TTL seconds per model.
+        """
+        now = time.monotonic()
+        cached = row_estimates.get(self.model)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        estimate = await self.model.agg.estimate()
+        row_estimates[self.model] = (now + conf.PAGINATION_ESTIMATE_TTL, estimate)
+        return estimate
+
+    async def get_count_strategy(self) -> CountStrategy:
+        """ Decide how to count the matching rows alongside the page. If not set on
+            the class, the strategy is chosen from the limit and the estimated size
+            of the model's table:
+
+            - window: the page and count come from a single query. Used when every
+                row is fetched anyway (no limit) or the table is small enough that
+                counting it with the page is cheaper than another round trip.
+            - concurrent: the count and page queries run at the same time on
+                separate connections. Used for large tables, where the window would
+                keep the database from stopping at the limit, and whenever paging by
+                cursor (the window would only count the rows after the cursor).
+        """
+        if self.count_strategy is not None:
+            return CountStrategy(self.count_strategy)
+        if self.is_keyset and self.cursor:
+            return CountStrategy.CONCURRENT
+        if self.limit <= 0:
+            return CountStrategy.WINDOW
+
+        estimate = await self.estimated_rows()
+        if estimate <= conf.PAGINATION_WINDOW_MAX_ROWS:
+            return CountStrategy.WINDOW
+        return CountStrategy.CONCURRENT
+
+    async def fetch_and_count(
+        self, predicate: Optional[ClauseElement] = None
+    ) -> Tuple[list, Optional[int]]:
+        """ Fetch the requested page along with the number of matching rows,
+            according to the requested count mode:
+
+            - exact: counted using the strategy chosen by get_count_strategy
+            - estimate: the query planner's estimate of the filtered row count, which
+                is never less than the number of rows known to exist
+            - none: the rows aren't counted
+
+        Returns:
+            Tuple[list, Optional[int]] -- model instances on the page and count
+        """
+        if self.count_mode == CountMode.NONE:
+            return await self.fetch(predicate), None
+
+        if self.count_mode == CountMode.ESTIMATE:
+            estimate, result = await asyncio.gather(
+                self.model.agg.estimate(predicate), self.fetch(predicate)
+            )
+            known = len(result) + (0 if self.is_keyset else self.offset)
+            return result, max(estimate, known + int(self.has_next))
+
+        strategy = await self.get_count_strategy()
+        logger.debug(f"counting {self.model.__name__} by {strategy.value}")
+
+        if strategy == CountStrategy.WINDOW and not (self.is_keyset and self.cursor):
+            return await self.fetch_windowed(predicate)
+
+        count, result = await asyncio.gather(
+            self.count(predicate), self.fetch(predicate)
+        )
+        return result, count
+
     async def get(
         self,
-        filter: Optional[Union[str, TextClause]] = None,
+        filter: Optional[Union[str, ClauseElement]] = None,
         serializer: Optional[PydanticModel] = None,
     ) -> list:
         """ Build and execute the paged sql query, returning the results as a list of Pydantic
             model instances (if serializer is specified) or dicts (if serializer is NOT specified)
         """
-        q = self.model.query
+        predicate = self.predicate(filter)
+        await self.check_cost(predicate)
 
-        if filter is not None:
-            if not isinstance(filter, TextClause):
-                filter = db.text(filter)
-            q = q.where(filter)
-        if self.limit > 0:
-            q = q.limit(self.limit)
-        if self.sort:
-            q = q.order_by(db.text(f"{self.sort} {self.sort_direction}"))
-        result = await q.offset(self.offset).gino.all()
+        async with self.throttling():
+            result = await self.fetch(predicate)
+        return self.serialize(result, serializer)
+
+    def select_fields(self, serializer: Optional[PydanticModel] = None):
+        """ Validate the requested fields against the serializer and the model """
+        if not self.fields:
+            return
+
+        if serializer is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="fields can't be selected from this resource",
+            )
+        self.selected = parse_fields(self.fields, serializer, self.model)
 
+    def serialize(
+        self, result: list, serializer: Optional[PydanticModel] = None
+    ) -> list:
+        if serializer and self.selected:
+            serializer = partial_schema(serializer, self.selected)
         if serializer:
             return [serializer.from_orm(x) for x in result]
         else:
@@ -179,11 +802,12 @@ class Pagination(metaclass=PaginationMeta):
         self,
         model: Model,
         serializer: Optional[PydanticModel] = None,
-        filter: Optional[str] = None,
+        filter: Optional[Union[str, ClauseElement]] = None,
     ) -> dict:
         """ Create a paginated response body with prev/next links and total count
             added to body's root.  The records fulfilling the paginated query are
-            placed under the "data" key.
+            placed under the "data" key. The count is an estimate if requested with
+            count=estimate, or null with count=none.
 
             Example:
             {
@@ -199,30 +823,38 @@ class Pagination(metaclass=PaginationMeta):
 
         Keyword Arguments:
             serializer {Optional[PydanticModel]} -- Pydantic model to use when
-                serializing the resulting records. (default: None)
-            filter {Optional[str]} -- filter to apply to the SQL query
-                (e.g. id<15 and created_at=2020-01-01).  (default: {None})
+                serializing the resulting records. Required to select a subset of
+                fields with the fields parameter. (default: None)
+            filter {Optional[str]} -- filter expression to apply to the query
+                (e.g. id:lt:15:is_active:eq:true). Defaults to the request's
+                filter parameter. (default: {None})
 
         Returns:
             dict -- response body with embedded pagination parameters
         """
         self.model = model
-        filter = filter if filter is not None else self.filter
+        predicate = self.predicate(filter if filter is not None else self.filter)
+
+        if self.selected is None:
+            self.select_fields(serializer)
 
-        count = await self.model.agg.count(filter)
+        await self.check_cost(predicate)
+        async with self.throttling():
+            result, count = await self.fetch_and_count(predicate)
+        data = self.serialize(result, serializer)
 
         return {
             "count": count,
             "next": self.get_next_url(count),
             "prev": self.get_previous_url(),
-            "data": await self.get(filter, serializer=serializer),
+            "data": data,
         }
 
     async def paginate_links(
         self,
         model: Model,
         serializer: Optional[PydanticModel] = None,
-        filter: Optional[str] = None,
+        filter: Optional[Union[str, ClauseElement]] = None,
     ) -> Tuple[List[Union[Dict, PydanticModel]], Dict[str, Union[int, List]]]:
         """ Paginate using link headers
 
@@ -248,20 +880,23 @@ class Pagination(metaclass=PaginationMeta):
 
         Keyword Arguments:
             serializer {Optional[PydanticModel]} -- [description] (default: {None})
-            filter {Optional[str]} -- textual filter expression
-                (e.g. "timestamp > 2020-01-01 and timestamp <= 2020-12-31") (default: {None})
+            filter {Optional[str]} -- filter expression
+                (e.g. 'created_at:between:2020-01-01,2020-12-31') (default: {None})
 
         Returns:
             Tuple[List[Union[Dict, PydanticModel]], Dict[str, Union[int, List]]] --
-                Tuple of data and headers
+                Tuple of data and headers. The count is returned as x-total-count,
+                x-estimated-count (count=estimate), or omitted (count=none).
 
 
         """
         p = await self.paginate(model=model, serializer=serializer, filter=filter)
-        headers = {
-            "x-total-count": p["count"],
-            "link": [],
-        }
+        headers: Dict = {"link": []}
+
+        if self.count_mode == CountMode.EXACT:
+            headers["x-total-count"] = p["count"]
+        elif self.count_mode == CountMode.ESTIMATE:
+            headers["x-estimated-count"] = p["count"]
 
         if p["prev"] is not None:
             #  Add previous URL to link header
@@ -273,9 +908,190 @@ class Pagination(metaclass=PaginationMeta):
 
         return p["data"], headers
 
+    def modified_column(self) -> Optional[Column]:
+        """ Get the column holding each row's modification time, if the requested
+            page is validated. Pages are only validated when counted exactly, since
+            the latest modification time is read by the query counting them.
+            Counting just to build an ETag would undo count=estimate or count=none.
+        """
+        if self.count_mode != CountMode.EXACT or not self.last_modified_column:
+            return None
+        return self.model.meta.columns.mapping.get(self.last_modified_column)
+
+    def validators(self, count: int) -> Optional[Tuple[str, Optional[datetime]]]:
+        """ Build the validators of the fetched page: a weak ETag derived from the
+            latest modification time and number of the matching rows, along with
+            the query parameters, and the latest modification time as Last-Modified.
+            Both are read along with the page's count (see fetch_and_count), so
+            validating a page costs no extra round trip.
+
+        Arguments:
+            count {int} -- number of matching rows
+
+        Returns:
+            Optional[Tuple[str, Optional[datetime]]] -- etag and last modified time,
+                or None if the page can't be validated
+        """
+        if self.modified_column() is None:
+            return None
+
+        etag = make_etag(
+            self.model.__table__.fullname,
+            self.last_modified,
+            count,
+            sorted(self.request.query_params.multi_items()),
+        )
+        return etag, self.last_modified
+
+    async def respond(
+        self,
+        model: Model,
+        serializer: PydanticModel,
+        filter: Optional[str] = None,
+    ) -> Response:
+        """ Build the complete response for a list endpoint: a streamed response if
+            one was requested (see stream), otherwise the requested page with link
+            and count headers (see paginate_links).
+
+            Pages carry ETag and Last-Modified headers (see validators). If the
+            request's If-None-Match or If-Modified-Since header shows the client's
+            copy is current, 304 Not Modified is returned instead of the page. The
+            validators are read by the query counting the page, so the page is
+            fetched either way, but not serialized or sent.
+
+            Filters the planner estimates are too expensive to run are rejected
+            before any query runs (see check_cost).
+
+            If the serializer's fields map directly onto the model's columns (see
+            api.helpers.fastpath), only those columns are selected and the rows are
+            encoded straight to JSON, without building a pydantic model per row.
+            Otherwise, each row is serialized with the serializer.
+
+        Arguments:
+            model {Model} -- SQLAlchemy data model or equivalent
+            serializer {PydanticModel} -- Pydantic model describing each record
+
+        Keyword Arguments:
+            filter {Optional[str]} -- filter expression to apply to the query.
+                Defaults to the request's filter parameter. (default: {None})
+
+        Returns:
+            Response
+        """
+        if self.is_streaming:
+            return await self.stream(model, serializer, filter=filter)
+
+        self.model = model
+        predicate = self.predicate(filter if filter is not None else self.filter)
+
+        await self.check_cost(predicate)
+
+        fields = fast_path_fields(serializer, model)
+        if fields is None:
+            data, headers = await self.paginate_links(
+                model, serializer=serializer, filter=predicate
+            )
+        else:
+            self.select_fields(serializer)
+            self.selected = self.selected or fields
+            data, headers = await self.paginate_links(model, filter=predicate)
+
+        validators = self.validators(headers.get("x-total-count"))
+        if validators is not None and is_not_modified(self.request, *validators):
+            return not_modified(*validators)
+
+        if fields is None:
+            response = sparse_response(data)
+        else:
+            response = Response(
+                encode_rows(data, self.selected), media_type="application/json"
+            )
+
+        if validators is not None:
+            set_validators(response, *validators)
+        return self.set_headers(response, headers)
+
     def set_headers(self, response: Response, headers: Dict):
-        response.headers["x-total-count"] = str(headers["x-total-count"])
+        for name in COUNT_HEADERS:
+            if name in headers:
+                response.headers[name] = str(headers[name])
         response.headers["link"] = ",".join(
             [x for x in headers["link"] if x is not None]
         )
         return response
+
+    async def iter_chunks(
+        self, stmt: Select, serializer: PydanticModel
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """ Read the results of stmt from a server-side cursor, yielding chunks of
+            up to PAGINATION_STREAM_CHUNK_SIZE serialized rows. The next chunk isn't
+            read until the previous one has been consumed, so a slow client holds
+            back the query instead of buffering rows in memory.
+        """
+        remaining = self.limit if self.limit > 0 else None
+
+        async with self.throttling(), db.session_factory() as session:
+            result = await session.stream(stmt)
+            if not self.selected:
+                result = result.scalars()
+
+            async for partition in result.partitions(conf.PAGINATION_STREAM_CHUNK_SIZE):
+                if remaining is not None:
+                    partition = partition[:remaining]
+                    remaining -= len(partition)
+
+                yield [serializer.from_orm(row).dict() for row in partition]
+
+                if remaining == 0:
+                    break
+
+    async def stream(
+        self,
+        model: Model,
+        serializer: PydanticModel,
+        filter: Optional[str] = None,
+    ) -> StreamingResponse:
+        """ Stream every result of the query (or only the requested page, if a limit
+            is given) as NDJSON or CSV, according to response_format. Rows are read
+            from a server-side cursor and written in chunks, so memory use stays
+            bounded no matter how many rows are returned.
+
+        Arguments:
+            model {Model} -- SQLAlchemy data model or equivalent
+            serializer {PydanticModel} -- Pydantic model used to serialize each
+                record. Its fields (or the requested fields) become CSV columns.
+
+        Keyword Arguments:
+            filter {Optional[str]} -- filter expression to apply to the query.
+                Defaults to the request's filter parameter. (default: {None})
+
+        Returns:
+            StreamingResponse
+        """
+        self.model = model
+        predicate = self.predicate(filter if filter is not None else self.filter)
+        self.select_fields(serializer)
+        await self.check_cost(predicate)
+
+        if self.selected:
+            serializer = partial_schema(serializer, self.selected)
+
+        columns = self.sort_columns()
+        await self.check_sort(columns)
+
+        stmt = self.statement(columns, predicate).execution_options(
+            yield_per=conf.PAGINATION_STREAM_CHUNK_SIZE
+        )
+        format = self.response_format
+        content = encode_chunks(
+            self.iter_chunks(stmt, serializer), format, list(serializer.__fields__)
+        )
+
+        headers = {}
+        if format == ResponseFormat.CSV:
+            filename = f"{model.__table__.name}.csv"
+            headers["content-disposition"] = f'attachment; filename="{filename}"'
+
+        return StreamingResponse(
+            content, media_type=MEDIA_TYPES[format], headers=headers
+        )
@@ -0,0 +1,166 @@
+""" Per-client rate limiting of requests (see util.ratelimit).
+
+    Limits are checked before a request reaches a route, so a rejected request
+    costs a few dictionary lookups. In particular, a burst of login attempts
+    (e.g. credential stuffing) is turned away before any password is hashed,
+    instead of queueing on the password hashing workers (see util.security) and
+    starving legitimate logins.
+
+    Clients are identified by:
+    - ip: the client's address, or the last address in X-Forwarded-For when
+      RATE_LIMIT_TRUST_FORWARDED is set
+    - user: the subject of the request's access token
+    - username, client_id: the credentials a login is attempting, read from the
+      form body of routes with rules keyed by them
+
+    Rejected requests get a 429 with a Retry-After header.
+"""
+
+import logging
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qsl
+
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import config as conf
+from config import API_V1
+from util.ratelimit import RateLimiter, load_backend, parse_rules, retry_after
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["RateLimitMiddleware", "default_limiter"]
+
+# larger form bodies aren't read for credentials; the route rejects them anyway
+MAX_FORM_SIZE = 64 * 1024
+
+
+def default_limiter() -> RateLimiter:
+    """ Create a rate limiter from the configured backend and rules """
+    return RateLimiter(
+        load_backend(conf.RATE_LIMIT_BACKEND),
+        default=parse_rules(conf.RATE_LIMIT_DEFAULT),
+        routes={
+            f"POST {API_V1}/login/access-token": parse_rules(conf.RATE_LIMIT_LOGIN),
+            f"POST {API_V1}/signup": parse_rules(conf.RATE_LIMIT_SIGNUP),
+        },
+    )
+
+
+def client_ip(scope: Scope, trust_forwarded: bool = False) -> Optional[str]:
+    if trust_forwarded:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                # the last address was added by the trusted proxy; earlier ones
+                # are whatever the client sent
+                return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def token_subject(scope: Scope) -> Optional[str]:
+    """ Get the subject of a request's bearer token, if it's valid """
+    from api.helpers.auth import verify_access_token
+
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            kind, _, token = value.decode("latin-1").partition(" ")
+            if kind.lower() != "bearer" or not token:
+                return None
+            try:
+                return str(verify_access_token(token).sub)
+            except HTTPException:
+                return None
+    return None
+
+
+async def read_body(receive: Receive, limit: int) -> list:
+    """ Read a request's body messages, stopping once more than limit bytes
+        have been read. Returns the messages read, to be replayed to the app. """
+    messages = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return messages
+        size += len(message.get("body", b""))
+        if size > limit or not message.get("more_body", False):
+            return messages
+
+
+def form_fields(scope: Scope, messages: list, size_limit: int) -> Dict[str, str]:
+    """ Parse an urlencoded form from a request's body messages """
+    content_type = b""
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            content_type = value.split(b";", 1)[0].strip().lower()
+    if content_type != b"application/x-www-form-urlencoded":
+        return {}
+
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+    if len(body) > size_limit:
+        return {}
+    return dict(parse_qsl(body.decode("latin-1"), keep_blank_values=False))
+
+
+def replay(messages: list, receive: Receive) -> Receive:
+    """ Replay body messages already read, then continue receiving """
+    pending = list(messages)
+
+    async def receive_replayed() -> Message:
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return receive_replayed
+
+
+class RateLimitMiddleware:
+    """ ASGI middleware rejecting requests exceeding a client's rate limits """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: Optional[RateLimiter] = None,
+        trust_forwarded: bool = conf.RATE_LIMIT_TRUST_FORWARDED,
+    ):
+        self.app = app
+        self.limiter = limiter or default_limiter()
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        needed: Set[str] = self.limiter.identities(method, path)
+        identities: Dict[str, Optional[str]] = {}
+
+        if "ip" in needed:
+            identities["ip"] = client_ip(scope, self.trust_forwarded)
+        if "user" in needed:
+            identities["user"] = token_subject(scope)
+        if "username" in needed or "client_id" in needed:
+            messages = await read_body(receive, MAX_FORM_SIZE)
+            fields = form_fields(scope, messages, MAX_FORM_SIZE)
+            # usernames are case insensitive to the limit, so changing their case
+            # doesn't get around it
+            identities["username"] = (fields.get("username") or "").lower() or None
+            identities["client_id"] = fields.get("client_id") or None
+            receive = replay(messages, receive)
+
+        wait = await self.limiter.check(method, path, identities)
+        if wait > 0:
+            response = ORJSONResponse(
+                {"detail": "Too many requests. Try again later."},
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"retry-after": retry_after(wait)},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
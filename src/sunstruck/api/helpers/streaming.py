@@ -0,0 +1,126 @@
+""" Streaming response formats for list endpoints.
+
+    Rows are encoded in chunks as they're read from a server-side cursor, so memory
+    use is bounded by the chunk size rather than the size of the result, and the
+    first bytes reach the client as soon as the first chunk has been read.
+"""
+
+import csv
+import io
+import logging
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+import orjson
+from starlette.requests import Request
+
+from const import ResponseFormat
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "MEDIA_TYPES",
+    "negotiate_format",
+    "encode_ndjson",
+    "CSVEncoder",
+    "encode_chunks",
+]
+
+MEDIA_TYPES: Dict[ResponseFormat, str] = {
+    ResponseFormat.JSON: "application/json",
+    ResponseFormat.NDJSON: "application/x-ndjson",
+    ResponseFormat.CSV: "text/csv",
+}
+
+# media types accepted for each format, including common aliases
+ACCEPTED_MEDIA_TYPES: Dict[str, ResponseFormat] = {
+    "application/x-ndjson": ResponseFormat.NDJSON,
+    "application/ndjson": ResponseFormat.NDJSON,
+    "application/jsonl": ResponseFormat.NDJSON,
+    "text/csv": ResponseFormat.CSV,
+    "application/json": ResponseFormat.JSON,
+}
+
+
+def negotiate_format(
+    request: Optional[Request], format: Optional[ResponseFormat] = None
+) -> ResponseFormat:
+    """ Choose a response format from an explicit format parameter, falling back
+        to the first supported media type in the request's Accept header.
+
+    Arguments:
+        request {Optional[Request]} -- the incoming request
+
+    Keyword Arguments:
+        format {Optional[ResponseFormat]} -- explicitly requested format
+            (default: {None})
+
+    Returns:
+        ResponseFormat -- the requested format, or JSON if none is supported
+    """
+    if format:
+        return ResponseFormat(format)
+
+    accept = request.headers.get("accept", "") if request is not None else ""
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in ACCEPTED_MEDIA_TYPES:
+            return ACCEPTED_MEDIA_TYPES[media_type]
+
+    return ResponseFormat.JSON
+
+
+def encode_ndjson(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """ Encode rows as newline delimited JSON, one object per line """
+    return b"".join(
+        orjson.dumps(row, option=orjson.OPT_NAIVE_UTC) + b"\n" for row in rows
+    )
+
+
+def to_csv_value(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+class CSVEncoder:
+    """ Encode rows as CSV, writing the header before the first chunk.
+
+    Example:
+    >>> encoder = CSVEncoder(["id", "username"])
+    >>> encoder.encode([{"id": 1, "username": "bob"}])
+    >>> b'id,username\\r\\n1,bob\\r\\n'
+    """
+
+    def __init__(self, fieldnames: Sequence[str]):
+        self.fieldnames: List[str] = list(fieldnames)
+        self.header_written = False
+
+    def encode(self, rows: Iterable[Dict[str, Any]]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        if not self.header_written:
+            writer.writerow(self.fieldnames)
+            self.header_written = True
+
+        writer.writerows(
+            [to_csv_value(row.get(name)) for name in self.fieldnames] for row in rows
+        )
+        return buffer.getvalue().encode()
+
+
+async def encode_chunks(
+    chunks: AsyncIterator[List[Dict[str, Any]]],
+    format: ResponseFormat,
+    fieldnames: Sequence[str],
+) -> AsyncIterator[bytes]:
+    """ Encode each chunk of rows in the given streaming format """
+    if format == ResponseFormat.CSV:
+        encoder = CSVEncoder(fieldnames)
+        yield encoder.encode([])  # header, even if there are no rows
+        async for chunk in chunks:
+            yield encoder.encode(chunk)
+    else:
+        async for chunk in chunks:
+            yield encode_ndjson(chunk)
@@ -7,13 +7,14 @@ from pydantic.networks import EmailStr
 
 import config as conf
 import util.security as security
-from api.helpers.auth import OAuth2RequestForm, get_current_active_user
-from db.models import OAuth2Client, User
+from api.helpers.auth import OAuth2RequestForm, get_active_claims, get_current_claims
+from db.models import OAuth2Client, Revocation, User
 from schemas import (
     ClientCredentialsCreateIn,
     ClientCredentialsOut,
     Message,
     Token,
+    TokenPayload,
     UserCreateIn,
     UserOut,
 )
@@ -53,25 +54,39 @@ async def login_access_token(form_data: OAuth2RequestForm = Depends()):
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user"
         )
     access_token_expires = timedelta(minutes=conf.ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = {
+        "scope": " ".join(form_data.scopes),
+        "is_superuser": bool(user.is_superuser),
+        "active": bool(user.is_active),
+    }
     return {
         "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires
+            user.id, expires_delta=access_token_expires, claims=claims
         ),
         "token_type": "bearer",
     }
 
 
+@router.post("/logout", response_model=Message)
+async def logout(claims: TokenPayload = Depends(get_current_claims)):
+    """ Revoke the access token used to make the request """
+
+    if claims.jti and claims.exp:
+        await Revocation.revoke_token(claims.jti, claims.sub, claims.exp)
+    else:  # issued without an id, so it can only be revoked with the subject's others
+        await Revocation.revoke_subject(claims.sub)
+    return {"message": "Logged out"}
+
+
 @router.get(
     "/credentials",
     response_model=List[ClientCredentialsOut],
     response_model_exclude_none=True,
 )
-async def list_client_credentials(
-    current_user: User = Depends(get_current_active_user),
-):
+async def list_client_credentials(claims: TokenPayload = Depends(get_active_claims)):
     """ Create a new set of client credentials """
 
-    return await OAuth2Client.get_by_owner(current_user.id)
+    return await OAuth2Client.get_by_owner(claims.sub)
 
 
 @router.post(
@@ -80,13 +95,13 @@ async def list_client_credentials(
     response_model_exclude_none=True,
 )
 async def create_client_credentials(
-    current_user: User = Depends(get_current_active_user),
+    claims: TokenPayload = Depends(get_active_claims),
 ):
     """ Create a new set of client credentials """
 
     credentials = ClientCredentialsCreateIn()
     new = (
-        await OAuth2Client.create(**credentials.dict(), owner_id=current_user.id)
+        await OAuth2Client.create(**credentials.dict(), owner_id=claims.sub)
     ).to_dict()
     new["client_secret"] = credentials.client_secret
     return new
@@ -94,7 +109,7 @@ async def create_client_credentials(
 
 @router.delete("/credentials", response_model=Message)
 async def delete_client_credentials(
-    client_id: str, current_user: User = Depends(get_current_active_user),
+    client_id: str, claims: TokenPayload = Depends(get_active_claims),
 ):
     """ Create a new set of client credentials """
 
@@ -122,13 +137,6 @@ async def user_signup(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Signup is disabled",
         )
-    user = await User.get_by_email(email)
-
-    if user:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Username taken",
-        )
-
     user_data = UserCreateIn(
         username=username,
         password=password,
@@ -136,7 +144,12 @@ async def user_signup(
         first_name=first_name,
         last_name=last_name,
     )
-    user = await User.create(**user_data.dict(exclude_unset=True))
+    user = await User.create_unique(**user_data.dict(exclude_unset=True))
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Username taken",
+        )
     return user
 
 
@@ -201,8 +214,7 @@ async def reset_password(token: str = Body(...), new_password: str = Body(...)):
     )
 
     if token_content:
-        hashed_password = security.get_password_hash(new_password)
-        await user.update(hashed_password=hashed_password).apply()
+        await user.update(password=new_password)
         logger.info("Password reset succeeded", extra=log_extras)
         return {"message": "Password update successful"}
     else:
@@ -2,9 +2,11 @@ from typing import Dict
 
 from fastapi import APIRouter
 
+from util.security import hash_executor
+
 router = APIRouter()
 
 
 @router.get("/health", response_model=Dict)
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "password_hashing": hash_executor.info()}
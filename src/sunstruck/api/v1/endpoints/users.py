@@ -1,13 +1,24 @@
 import logging
 from typing import Dict, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import ORJSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
 from api.helpers import Pagination
 from api.helpers.auth import get_current_active_user
+from api.helpers.conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from api.helpers.fields import (
+    fields_param,
+    parse_fields,
+    partial_schema,
+    sparse_response,
+)
 from db.models import User as User
-from schemas.user import UserCreateIn, UserOut, UserUpdateIn
+from schemas.user import UserCreateIn, UserOut, UserSearchOut, UserUpdateIn
 
 logger = logging.getLogger(__name__)
 
@@ -30,52 +41,85 @@ async def create_user(user: UserCreateIn):
 
 
 @router.get("/", response_model=List[UserOut])
-async def list_users(response: ORJSONResponse, pagination: Pagination = Depends()):
+async def list_users(pagination: Pagination = Depends()):
     """ Get a list of users. """
 
-    data, headers = await pagination.paginate_links(User, serializer=None)
+    return await pagination.respond(User, serializer=UserOut)
 
-    response = pagination.set_headers(response, headers)
 
-    return data
+@router.get("/search", response_model=List[UserSearchOut])
+async def search_users(
+    q: str = Query(
+        ...,
+        min_length=1,
+        max_length=256,
+        description="Search term, matched against usernames, names and emails.",
+        example="q=john smith",
+    ),
+    limit: int = Query(default=25, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+):
+    """ Search for users, best matches first. """
+    return await User.search(
+        q, limit=limit, offset=offset, fields=UserSearchOut.__fields__
+    )
 
 
 @router.get("/{id}", response_model=UserOut)
-async def retrieve_user(id: int):
-    """ Get a single user. """
-    user: UserOut = await User.get(id)
+async def retrieve_user(
+    request: Request,
+    response: Response,
+    id: int,
+    fields: str = Depends(fields_param),
+):
+    """ Get a single user. Responds with 304 Not Modified if the user hasn't
+        changed since the version identified by If-None-Match or If-Modified-Since.
+    """
+    selected = parse_fields(fields, UserOut, User)
+    columns = selected
+    if selected and "updated_at" not in selected:
+        columns = selected + ("updated_at",)
+
+    user = await User.get(id=id, fields=columns)
     if not user:
         raise HTTPException(**ERROR_404)
 
+    etag = make_etag(User.__table__.fullname, id, user.updated_at, selected)
+    if is_not_modified(request, etag, user.updated_at):
+        return not_modified(etag, user.updated_at)
+
+    if selected:
+        content = partial_schema(UserOut, selected).from_orm(user)
+        return set_validators(sparse_response(content), etag, user.updated_at)
+
+    set_validators(response, etag, user.updated_at)
     return user
 
 
 @router.put("/{id}", response_model=UserOut)
 async def update_user_full(id: int, body: UserUpdateIn):
     """ Overwrite a user record. """
-    user: User = await User.get(id)
+    user: User = await User.get(id=id)
     if not user:
         raise HTTPException(**ERROR_404)
 
-    await user.update(**body.dict()).apply()
-    return user
+    return await user.update(**body.dict())
 
 
 @router.patch("/{id}", response_model=UserOut)
 async def update_user_partial(id: int, body: UserUpdateIn):
     """ Update specific attributes of a user. """
-    user: User = await User.get(id)
+    user: User = await User.get(id=id)
     if not user:
         raise HTTPException(**ERROR_404)
 
-    await user.update(**body.dict(exclude_unset=True)).apply()
-    return user
+    return await user.update(**body.dict(exclude_unset=True))
 
 
 @router.delete("/{id}", response_model=UserOut)
 async def delete_user(id: int):
     """ Delete a user """
-    user: User = await User.get(id)
+    user: User = await User.get(id=id)
     if not user:
         raise HTTPException(**ERROR_404)
 
@@ -0,0 +1,53 @@
+""" Well-known discovery documents, served from the root of the api's origin.
+
+    ### References:
+    - https://tools.ietf.org/html/rfc8615
+    - https://tools.ietf.org/html/rfc7517#section-5
+"""
+
+from typing import Dict, Tuple
+
+import orjson
+from fastapi import APIRouter
+from starlette.requests import Request
+from starlette.responses import Response
+
+import config as conf
+from api.helpers.conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from util.cache import LRUCache
+from util.keys import keyring
+
+__all__ = ["router"]
+
+router = APIRouter()
+
+# kids of the published keys -> (etag, serialized key set)
+jwks_cache: LRUCache[Tuple[str, bytes]] = LRUCache(maxsize=4, name="jwks")
+
+
+@router.get("/.well-known/jwks.json", response_model=Dict)
+def jwks(request: Request):
+    """ Public keys that access tokens are signed with, as a JSON Web Key Set.
+        Services validating tokens locally should cache it, and fetch it again on
+        encountering a token signed with a key (kid) it doesn't contain. """
+
+    keys = keyring.verification_keys()
+    kids = tuple(k.kid for k in keys)
+    cached = jwks_cache.get(kids)
+    if cached is None:
+        body = orjson.dumps({"keys": [k.to_jwk() for k in keys]})
+        cached = make_etag("jwks", *kids), body
+        jwks_cache.set(kids, cached)
+    etag, body = cached
+
+    if is_not_modified(request, etag):
+        response = not_modified(etag)
+    else:
+        response = set_validators(Response(body, media_type="application/json"), etag)
+    response.headers["cache-control"] = f"public, max-age={conf.JWKS_MAX_AGE}"
+    return response
@@ -75,6 +75,41 @@ ALEMBIC_CONFIG: DatabaseURL = DatabaseURL(
 LOG_LEVEL: str = conf("LOG_LEVEL", cast=str, default="20")
 LOG_FORMAT: str = conf("LOG_FORMAT", cast=str, default="json")
 
+# --- api -------------------------------------------------------------------- #
+
+FILTER_CACHE_SIZE: int = conf("FILTER_CACHE_SIZE", cast=int, default=512)
+FILTER_MAX_LENGTH: int = conf("FILTER_MAX_LENGTH", cast=int, default=2048)
+FILTER_MAX_TERMS: int = conf("FILTER_MAX_TERMS", cast=int, default=32)
+FILTER_ARRAY_THRESHOLD: int = conf("FILTER_ARRAY_THRESHOLD", cast=int, default=10)
+PAGINATION_WINDOW_MAX_ROWS: int = conf(
+    "PAGINATION_WINDOW_MAX_ROWS", cast=int, default=10000
+)
+PAGINATION_ESTIMATE_TTL: int = conf("PAGINATION_ESTIMATE_TTL", cast=int, default=300)
+PAGINATION_DEFERRED_JOIN_OFFSET: int = conf(
+    "PAGINATION_DEFERRED_JOIN_OFFSET", cast=int, default=1000
+)
+PAGINATION_STREAM_CHUNK_SIZE: int = conf(
+    "PAGINATION_STREAM_CHUNK_SIZE", cast=int, default=1000
+)
+PAGINATION_SORT_MAX_ROWS: int = conf(
+    "PAGINATION_SORT_MAX_ROWS", cast=int, default=100000
+)
+# filter cost guard budgets, compared to the planner's estimates. 0 disables a limit.
+FILTER_MAX_PLAN_COST: float = conf("FILTER_MAX_PLAN_COST", cast=float, default=0)
+FILTER_MAX_PLAN_ROWS: int = conf("FILTER_MAX_PLAN_ROWS", cast=int, default=0)
+FILTER_THROTTLE_PLAN_COST: float = conf(
+    "FILTER_THROTTLE_PLAN_COST", cast=float, default=0
+)
+FILTER_THROTTLE_CONCURRENCY: int = conf(
+    "FILTER_THROTTLE_CONCURRENCY", cast=int, default=4
+)
+FILTER_PLAN_CACHE_SIZE: int = conf("FILTER_PLAN_CACHE_SIZE", cast=int, default=512)
+FILTER_PLAN_CACHE_TTL: int = conf("FILTER_PLAN_CACHE_TTL", cast=int, default=300)
+# filter and sort usage telemetry, read by sunstruck db advise-indexes
+TELEMETRY_ENABLED: bool = conf("TELEMETRY_ENABLED", cast=bool, default=True)
+TELEMETRY_DIR: str = conf("TELEMETRY_DIR", cast=str, default=".telemetry")
+TELEMETRY_FLUSH_INTERVAL: int = conf("TELEMETRY_FLUSH_INTERVAL", cast=int, default=60)
+
 # --- other ------------------------------------------------------------------ #
 
 # FIRST_SUPERUSER: EmailStr
@@ -89,7 +124,69 @@ EMAILS_ENABLED: bool = False
 SECRET_KEY: Secret = conf("SECRET_KEY", cast=Secret)
 
 ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440 * 7  # 7 days
+# access tokens are signed with rotating private keys, published as a JWKS
+JWT_ALGORITHM: str = conf("JWT_ALGORITHM", cast=str, default="RS256")
+JWT_KEYS_DIR: str = conf("JWT_KEYS_DIR", cast=str, default=".keys")
+JWT_KEY_ROTATION_DAYS: int = conf("JWT_KEY_ROTATION_DAYS", cast=int, default=30)
+# seconds between rescans of JWT_KEYS_DIR for keys rotated by other processes
+JWT_KEY_RELOAD_INTERVAL: int = conf("JWT_KEY_RELOAD_INTERVAL", cast=int, default=60)
+# seconds verifiers may cache the JWKS. New keys are published this long before use.
+JWKS_MAX_AGE: int = conf("JWKS_MAX_AGE", cast=int, default=3600)
+# accept access tokens signed with SECRET_KEY (no kid), as issued before signing
+# keys. Only enable while those tokens are still in use, at most
+# ACCESS_TOKEN_EXPIRE_MINUTES after rollout: anyone holding SECRET_KEY can mint them.
+JWT_ACCEPT_LEGACY_TOKENS: bool = conf(
+    "JWT_ACCEPT_LEGACY_TOKENS", cast=bool, default=False
+)
 EMAIL_RESET_TOKEN_EXPIRE_MINUTES: int = 15
+# verified access tokens, cached until they expire
+AUTH_TOKEN_CACHE_SIZE: int = conf("AUTH_TOKEN_CACHE_SIZE", cast=int, default=4096)
+# authenticated users, cached for up to AUTH_USER_CACHE_TTL seconds. 0 disables.
+AUTH_USER_CACHE_SIZE: int = conf("AUTH_USER_CACHE_SIZE", cast=int, default=1024)
+AUTH_USER_CACHE_TTL: int = conf("AUTH_USER_CACHE_TTL", cast=int, default=30)
+# revoked tokens and subjects are summarized by a Bloom filter sized for this many
+# entries at this false positive rate. It grows if more are revoked.
+REVOCATION_BLOOM_CAPACITY: int = conf(
+    "REVOCATION_BLOOM_CAPACITY", cast=int, default=100_000
+)
+REVOCATION_BLOOM_ERROR_RATE: float = conf(
+    "REVOCATION_BLOOM_ERROR_RATE", cast=float, default=0.001
+)
+# seconds between polls for revocations made by other processes
+REVOCATION_POLL_INTERVAL: int = conf("REVOCATION_POLL_INTERVAL", cast=int, default=5)
+# seconds of revocations read again on each poll, in case a revocation committed
+# after one with a later id
+REVOCATION_POLL_OVERLAP: int = conf("REVOCATION_POLL_OVERLAP", cast=int, default=30)
+# threads hashing and verifying passwords. 0 uses one per cpu.
+PASSWORD_HASH_WORKERS: int = conf("PASSWORD_HASH_WORKERS", cast=int, default=0)
+# hashes waiting for or running on a worker before more are rejected. 0 is unlimited.
+PASSWORD_HASH_MAX_PENDING: int = conf(
+    "PASSWORD_HASH_MAX_PENDING", cast=int, default=256
+)
+# requests are rate limited per client, with rules like "ip:20/minute" (a token
+# bucket) or "username:50/hour:window" (a sliding window). See util.ratelimit.
+RATE_LIMIT_ENABLED: bool = conf("RATE_LIMIT_ENABLED", cast=bool, default=True)
+RATE_LIMIT_BACKEND: str = conf(
+    "RATE_LIMIT_BACKEND", cast=str, default="util.ratelimit.MemoryBackend"
+)
+# limits tracked by the memory backend before the least recently used are dropped
+RATE_LIMIT_MAX_KEYS: int = conf("RATE_LIMIT_MAX_KEYS", cast=int, default=100_000)
+# identify clients by X-Forwarded-For. Only enable behind a proxy that sets it.
+RATE_LIMIT_TRUST_FORWARDED: bool = conf(
+    "RATE_LIMIT_TRUST_FORWARDED", cast=bool, default=False
+)
+# applied to every request
+RATE_LIMIT_DEFAULT: str = conf(
+    "RATE_LIMIT_DEFAULT", cast=str, default="ip:300/minute,user:300/minute"
+)
+# applied to logins in addition to the default, throttling password guessing
+RATE_LIMIT_LOGIN: str = conf(
+    "RATE_LIMIT_LOGIN",
+    cast=str,
+    default="ip:20/minute,username:10/minute,client_id:20/minute,"
+    "ip:200/hour:window,username:50/hour:window",
+)
+RATE_LIMIT_SIGNUP: str = conf("RATE_LIMIT_SIGNUP", cast=str, default="ip:10/hour")
 
 MASTER_USERNAME: str = conf("MASTER_USERNAME", cast=str, default="sunstuck")
 MASTER_PASSWORD: str = conf("MASTER_PASSWORD", cast=str)
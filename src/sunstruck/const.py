@@ -1,5 +1,10 @@
 from util.enums import Enum
 
+# text search configuration used to build and query full text search documents.
+# 'simple' only lowercases words, which suits names, usernames and email addresses
+# better than a language's stemming and stop words.
+TEXT_SEARCH_CONFIG = "simple"
+
 
 class FilterOperator(str, Enum):
 
@@ -10,5 +15,27 @@ class FilterOperator(str, Enum):
     LT = "lt"
     LTE = "lte"
     LIKE = "like"
+    ILIKE = "ilike"
+    SEARCH = "search"
     IN = "in"
     BETWEEN = "between"
+
+
+class CountStrategy(str, Enum):
+
+    WINDOW = "window"
+    CONCURRENT = "concurrent"
+
+
+class CountMode(str, Enum):
+
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    NONE = "none"
+
+
+class ResponseFormat(str, Enum):
+
+    JSON = "json"
+    NDJSON = "ndjson"
+    CSV = "csv"
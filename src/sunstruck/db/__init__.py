@@ -49,6 +49,7 @@ class SQLAlchemyProps:
         self.column = sa.column
         self.Column = sa.Column
         self.ColumnDefault = sa.ColumnDefault
+        self.Computed = sa.Computed
         self.Constraint = sa.Constraint
         self.Date = sa.Date
         self.DateTime = sa.DateTime
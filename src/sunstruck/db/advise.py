@@ -0,0 +1,392 @@
+""" Index advice from filter telemetry and PostgreSQL's statistics views.
+
+    The api records how often each (table, field, operator) is filtered or sorted
+    by, along with the latency of those queries (see util.telemetry). Joining that
+    with pg_stat_user_tables and pg_stat_user_indexes shows which frequently queried
+    fields have no index that could serve them, and which indexes are never used:
+
+    - btree: equality, membership, ranges and sorts
+    - gin (gin_trgm_ops): like, ilike and search on text columns
+    - gin: search on tsvector columns
+    - brin: ranges over timestamps of large, append-mostly tables, where a brin
+        index is a fraction of the size of a btree
+
+    Each proposal comes with an Alembic migration snippet to create (and drop) it.
+    Indexes are only flagged as unused if they don't enforce a constraint.
+
+    ### References:
+    - https://www.postgresql.org/docs/current/monitoring-stats.html
+    - https://www.postgresql.org/docs/current/indexes-types.html
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql.schema import Column
+
+import config as conf
+from db import db
+from db.models import Model
+from util.telemetry import UsageKey, UsageStats, load
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "TableStats",
+    "IndexStats",
+    "IndexProposal",
+    "UnusedIndex",
+    "Advice",
+    "advise",
+    "advise_indexes",
+]
+
+# operators an index of each kind can serve. Negated operators (e.g. ~eq) match most
+# of a table, so are better served by a scan.
+BTREE_OPERATORS = frozenset({"is", "eq", "in", "gt", "gte", "lt", "lte", "between"})
+RANGE_OPERATORS = frozenset({"gt", "gte", "lt", "lte", "between"})
+PATTERN_OPERATORS = frozenset({"like", "ilike", "search"})
+SORT = "sort"
+
+TRIGRAM_OPCLASSES = frozenset({"gin_trgm_ops", "gist_trgm_ops"})
+
+MIN_USES = 100  # uses of a field before an index is proposed for it
+MIN_ROWS = 10000  # rows in a table before it's worth indexing
+BRIN_MIN_ROWS = 1000000  # rows in a table before brin is preferred to btree
+BRIN_MAX_CHURN = 0.05  # updated and deleted rows, as a fraction of inserted rows
+
+TABLE_STATS = sa.text(
+    """
+    SELECT relname AS "table",
+        seq_scan,
+        seq_tup_read,
+        coalesce(idx_scan, 0) AS idx_scan,
+        n_live_tup AS live_rows,
+        n_tup_ins AS inserts,
+        n_tup_upd AS updates,
+        n_tup_del AS deletes
+    FROM pg_stat_user_tables
+    WHERE schemaname = current_schema()
+    """
+)
+
+INDEX_STATS = sa.text(
+    """
+    SELECT s.relname AS "table",
+        s.indexrelname AS name,
+        am.amname AS method,
+        a.attname AS "column",
+        opc.opcname AS opclass,
+        s.idx_scan AS scans,
+        pg_relation_size(s.indexrelid) AS size,
+        i.indisunique AS "unique",
+        i.indisprimary AS "primary",
+        pg_get_indexdef(s.indexrelid) AS definition
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    JOIN pg_class c ON c.oid = s.indexrelid
+    JOIN pg_am am ON am.oid = c.relam
+    LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+    LEFT JOIN pg_opclass opc ON opc.oid = i.indclass[0]
+    WHERE s.schemaname = current_schema()
+    """
+)
+
+
+class TableStats(NamedTuple):
+    """ A table's row from pg_stat_user_tables """
+
+    table: str
+    seq_scan: int = 0
+    seq_tup_read: int = 0
+    idx_scan: int = 0
+    live_rows: int = 0
+    inserts: int = 0
+    updates: int = 0
+    deletes: int = 0
+
+    @property
+    def churn(self) -> float:
+        """ Updated and deleted rows, as a fraction of inserted rows """
+        return (self.updates + self.deletes) / max(self.inserts, 1)
+
+
+class IndexStats(NamedTuple):
+    """ An index's row from pg_stat_user_indexes, with its leading column and
+        operator class. column is None for expression indexes. """
+
+    table: str
+    name: str
+    method: str
+    column: Optional[str]
+    opclass: Optional[str]
+    scans: int = 0
+    size: int = 0
+    unique: bool = False
+    primary: bool = False
+    definition: str = ""
+
+
+class IndexProposal(NamedTuple):
+    """ An index that would serve a frequently used field """
+
+    table: str
+    column: str
+    method: str  # btree, gin or brin
+    opclass: Optional[str]
+    uses: int
+    operators: Tuple[str, ...]
+    p95: float  # seconds
+    reason: str
+
+    @property
+    def name(self) -> str:
+        suffix = {"gin_trgm_ops": "_trgm"}.get(self.opclass or "", "")
+        if self.method == "brin":
+            suffix = "_brin"
+        return f"ix_{self.table}_{self.column}{suffix}"
+
+    def upgrade(self) -> List[str]:
+        lines = [
+            "op.create_index(",
+            f'    "{self.name}",',
+            f'    "{self.table}",',
+            f'    ["{self.column}"],',
+            "    unique=False,",
+        ]
+        if self.method != "btree":
+            lines.append(f'    postgresql_using="{self.method}",')
+        if self.opclass:
+            lines.append(f'    postgresql_ops={{"{self.column}": "{self.opclass}"}},')
+        lines.append(")")
+        return lines
+
+    def downgrade(self) -> List[str]:
+        return [f'op.drop_index("{self.name}", table_name="{self.table}")']
+
+
+class UnusedIndex(NamedTuple):
+    """ An index that hasn't been scanned since statistics were last reset """
+
+    index: IndexStats
+    reason: str
+
+    def upgrade(self) -> List[str]:
+        return [f'op.drop_index("{self.index.name}", table_name="{self.index.table}")']
+
+    def downgrade(self) -> List[str]:
+        return [f"op.execute({json.dumps(self.index.definition)})"]
+
+
+class Advice(NamedTuple):
+    proposals: List[IndexProposal]
+    unused: List[UnusedIndex]
+
+    def __bool__(self) -> bool:
+        return bool(self.proposals or self.unused)
+
+    def migration(self) -> str:
+        """ Render the advice as the body of an Alembic migration """
+        changes = [*self.proposals, *self.unused]
+
+        upgrade: List[str] = []
+        if any(p.opclass in TRIGRAM_OPCLASSES for p in self.proposals):
+            upgrade.append('op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")')
+        for change in changes:
+            upgrade.extend(change.upgrade())
+
+        downgrade: List[str] = []
+        for change in reversed(changes):
+            downgrade.extend(change.downgrade())
+
+        def body(lines: List[str]) -> str:
+            return "\n".join(f"    {line}" for line in lines or ["pass"])
+
+        return (
+            f"def upgrade():\n{body(upgrade)}\n\n\n"
+            f"def downgrade():\n{body(downgrade)}\n"
+        )
+
+
+def get_column(table: str, field: str) -> Optional[Column]:
+    """ Find a column of a model's table by name """
+    model_table = Model.metadata.tables.get(table)
+    if model_table is None:
+        return None
+    return model_table.columns.get(field)
+
+
+def column_type(column: Column) -> sa.types.TypeEngine:
+    """ Get a column's type, or the type it decorates (e.g. EmailType) """
+    return getattr(column.type, "impl", column.type)
+
+
+def is_temporal(column: Column) -> bool:
+    return isinstance(column_type(column), (sa.DateTime, sa.Date))
+
+
+def is_text(column: Column) -> bool:
+    return isinstance(column_type(column), sa.String)
+
+
+def covered(
+    indexes: Iterable[IndexStats], column: str, method: str, opclass: Optional[str]
+) -> bool:
+    """ Determine whether an existing index can serve the same queries as an index
+        of the given method and operator class on a column. Btree indexes serve
+        range queries as well as brin indexes. """
+    for index in indexes:
+        if index.column != column:
+            continue
+        if method == "btree" and index.method == "btree":
+            return True
+        if method == "brin" and index.method in ("btree", "brin"):
+            return True
+        if method == "gin" and index.method in ("gin", "gist"):
+            if opclass is None or index.opclass in TRIGRAM_OPCLASSES:
+                return True
+    return False
+
+
+def describe(
+    uses: int, operators: Iterable[str], p95: float, table: TableStats
+) -> str:
+    return (
+        f"{uses:,} uses ({', '.join(sorted(operators))}), p95 {p95 * 1000:.0f}ms; "
+        f"{table.seq_scan:,} sequential scans of {table.live_rows:,} rows"
+    )
+
+
+def advise(
+    usage: Dict[UsageKey, UsageStats],
+    tables: Iterable[TableStats],
+    indexes: Iterable[IndexStats],
+    min_uses: int = MIN_USES,
+    min_rows: int = MIN_ROWS,
+) -> Advice:
+    """ Propose indexes for the fields clients frequently filter and sort by that no
+        existing index can serve, and flag indexes that are never used.
+
+    Arguments:
+        usage {Dict[UsageKey, UsageStats]} -- filter telemetry (see util.telemetry)
+        tables {Iterable[TableStats]} -- rows of pg_stat_user_tables
+        indexes {Iterable[IndexStats]} -- rows of pg_stat_user_indexes
+
+    Keyword Arguments:
+        min_uses {int} -- uses of a field before an index is proposed for it
+            (default: {MIN_USES})
+        min_rows {int} -- rows in a table before indexes are proposed for it
+            (default: {MIN_ROWS})
+
+    Returns:
+        Advice -- proposed indexes, most time spent first, and unused indexes
+    """
+    table_stats = {t.table: t for t in tables}
+    table_indexes: Dict[str, List[IndexStats]] = {}
+    for index in indexes:
+        table_indexes.setdefault(index.table, []).append(index)
+
+    # (table, field) -> operator -> stats
+    fields: Dict[Tuple[str, str], Dict[str, UsageStats]] = {}
+    for key, stats in usage.items():
+        fields.setdefault((key.table, key.field), {})[key.operator] = stats
+
+    proposals: List[IndexProposal] = []
+    totals: Dict[IndexProposal, float] = {}
+    for (table, field), operators in fields.items():
+        stats = table_stats.get(table)
+        column = get_column(table, field)
+        if stats is None or column is None or stats.live_rows < min_rows:
+            continue
+        existing = table_indexes.get(table, [])
+
+        candidates = []  # (method, opclass, operators)
+        btree = {op for op in operators if op in BTREE_OPERATORS or op == SORT}
+        if btree:
+            brin = (
+                is_temporal(column)
+                and btree <= RANGE_OPERATORS
+                and stats.live_rows >= BRIN_MIN_ROWS
+                and stats.churn <= BRIN_MAX_CHURN
+            )
+            candidates.append(("brin" if brin else "btree", None, btree))
+
+        pattern = {op for op in operators if op in PATTERN_OPERATORS}
+        if pattern and isinstance(column.type, TSVECTOR):
+            candidates.append(("gin", None, pattern))
+        elif pattern and is_text(column):
+            candidates.append(("gin", "gin_trgm_ops", pattern))
+
+        for method, opclass, ops in candidates:
+            uses = sum(operators[op].uses for op in ops)
+            if uses < min_uses or covered(existing, field, method, opclass):
+                continue
+
+            merged = UsageStats()
+            for op in ops:
+                merged.merge(operators[op])
+            p95 = merged.latency.quantile(0.95)
+
+            proposal = IndexProposal(
+                table=table,
+                column=field,
+                method=method,
+                opclass=opclass,
+                uses=uses,
+                operators=tuple(sorted(ops)),
+                p95=p95,
+                reason=describe(uses, ops, p95, stats),
+            )
+            proposals.append(proposal)
+            totals[proposal] = merged.latency.total
+
+    proposals.sort(key=lambda p: (-totals[p], -p.uses, p.name))
+
+    used: Set[Tuple[str, str]] = {(key.table, key.field) for key in usage}
+    unused: List[UnusedIndex] = []
+    for index in sorted(indexes, key=lambda x: (-x.size, x.name)):
+        if index.scans > 0 or index.unique or index.primary:
+            continue
+        reason = f"never scanned, {index.size / 2 ** 20:,.1f} MB"
+        if index.column is not None and (index.table, index.column) not in used:
+            reason += f"; no recorded filters or sorts on {index.column}"
+        unused.append(UnusedIndex(index, reason))
+
+    return Advice(proposals, unused)
+
+
+async def table_stats() -> List[TableStats]:
+    """ Read pg_stat_user_tables for the tables in the current schema """
+    async with db.session_factory() as session:
+        rows = (await session.execute(TABLE_STATS)).mappings().all()
+    return [TableStats(**row) for row in rows]
+
+
+async def index_stats() -> List[IndexStats]:
+    """ Read pg_stat_user_indexes for the tables in the current schema """
+    async with db.session_factory() as session:
+        rows = (await session.execute(INDEX_STATS)).mappings().all()
+    return [IndexStats(**row) for row in rows]
+
+
+async def advise_indexes(
+    directory: Union[str, Path] = conf.TELEMETRY_DIR,
+    min_uses: int = MIN_USES,
+    min_rows: int = MIN_ROWS,
+) -> Advice:
+    """ Advise on indexes using the telemetry snapshots in directory and the
+        database's current statistics (see advise) """
+    usage = load(directory)
+    if not usage:
+        logger.warning(f"no filter telemetry found in {directory}")
+    return advise(
+        usage,
+        await table_stats(),
+        await index_stats(),
+        min_uses=min_uses,
+        min_rows=min_rows,
+    )
@@ -0,0 +1,88 @@
+""" EXPLAIN support for sqlalchemy statements.
+
+    SQLAlchemy has no EXPLAIN construct, so Explain wraps any statement and renders
+    it as EXPLAIN (FORMAT JSON) <statement>. Bound parameters are compiled as usual,
+    so a statement's plan is requested exactly as it would be executed.
+
+    ### References:
+    - https://github.com/sqlalchemy/sqlalchemy/wiki/Query-Plan-SQL-construct
+    - https://www.postgresql.org/docs/current/using-explain.html
+"""
+
+import json
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Explain", "explain", "PlanBudget"]
+
+
+class Explain(Executable, ClauseElement):
+    """ EXPLAIN (FORMAT JSON) of a statement. The statement is planned, not executed.
+
+    Example:
+    >>> await session.execute(Explain(User.select().where(User.id > 5)))
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: ClauseElement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element: Explain, compiler, **kwargs) -> str:
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kwargs)}"
+
+
+async def explain(statement: ClauseElement) -> Dict[str, Any]:
+    """ Get the planner's top level plan node for a statement.
+
+    Example:
+    >>> await explain(User.select().where(User.id > 5))
+    >>> {'Node Type': 'Seq Scan', 'Total Cost': 11.75, 'Plan Rows': 47, ...}
+
+    Arguments:
+        statement {ClauseElement} -- statement to plan
+
+    Returns:
+        Dict[str, Any] -- the plan's root node
+    """
+    async with db.session_factory() as session:
+        result = (await session.execute(Explain(statement))).scalar()
+
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
+
+
+class PlanBudget(NamedTuple):
+    """ Limits on the planner's estimates for a query (see api.helpers.guard).
+
+    Example:
+    >>> class User(BaseTable):
+            __plan_budget__ = PlanBudget(cost=50000, rows=100000)
+
+    Attributes:
+        cost {Optional[float]} -- maximum estimated total cost, in the planner's
+            arbitrary units. None means unlimited.
+        rows {Optional[int]} -- maximum estimated number of matching rows. None
+            means unlimited.
+        throttle_cost {Optional[float]} -- estimated cost above which queries run
+            with limited concurrency. None means never throttled.
+    """
+
+    cost: Optional[float] = None
+    rows: Optional[int] = None
+    throttle_cost: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in self)
@@ -0,0 +1,55 @@
+"""add token revocations
+
+Revision ID: 5d2b7e0c4a91
+Revises: c9ce1b873810
+Create Date: 2026-10-19 18:00:00.000000+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d2b7e0c4a91"
+down_revision = "c9ce1b873810"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "revocations",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("jti", sa.String(length=64), nullable=True),
+        sa.Column("sub", sa.String(length=50), nullable=False),
+        sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_revocations")),
+    )
+    op.create_index(
+        "ix_revocations_created_at", "revocations", ["created_at"], unique=False
+    )
+    op.create_index(
+        "ix_revocations_expires_at", "revocations", ["expires_at"], unique=False
+    )
+    op.create_index(
+        op.f("ix_revocations_updated_at"), "revocations", ["updated_at"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_revocations_updated_at"), table_name="revocations")
+    op.drop_index("ix_revocations_expires_at", table_name="revocations")
+    op.drop_index("ix_revocations_created_at", table_name="revocations")
+    op.drop_table("revocations")
@@ -0,0 +1,65 @@
+"""add user search indexes
+
+Revision ID: c9ce1b873810
+Revises: 26a58067e4fa
+Create Date: 2026-10-19 12:00:00.000000+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "c9ce1b873810"
+down_revision = "26a58067e4fa"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column(
+        "users",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('simple', coalesce(username, '')), 'A') || "
+                "setweight(to_tsvector('simple', "
+                "coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'B') || "
+                "setweight(to_tsvector('simple', coalesce(email, '')), 'C')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_users_search_vector",
+        "users",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_users_username_trgm",
+        "users",
+        ["username"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"username": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_users_email_trgm",
+        "users",
+        ["email"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"email": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_users_email_trgm", table_name="users")
+    op.drop_index("ix_users_username_trgm", table_name="users")
+    op.drop_index("ix_users_search_vector", table_name="users")
+    op.drop_column("users", "search_vector")
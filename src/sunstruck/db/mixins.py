@@ -12,6 +12,7 @@ from typing import (
     Dict,
     List,
     Optional,
+    Sequence,
     Type,
     TypeVar,
     Union,
@@ -56,11 +57,13 @@ class ScopedPredicate:
 
     def __get__(self, obj: M, objtype: Type[M]) -> Callable:
         def select(**kwargs) -> BooleanClauseList:
+            pk = objtype.meta.pk
+
             if obj is not None:
-                # if object instance, dump to dict
-                kwargs = obj.dict()
+                # if object instance, pull the primary key values from it
+                kwargs = {name: getattr(obj, name) for name in pk.names}
 
-            return sa.and_(*[col == kwargs[col.name] for col in objtype.pk])
+            return sa.and_(*[col == kwargs[name] for name, col in pk.mapping.items()])
 
         return select
 
@@ -184,18 +187,26 @@ class CrudMixin:
         return self.row_to_instance(result.one())
 
     @classmethod
-    async def get(cls: M, **kwargs) -> M:
+    async def get(cls: M, fields: Sequence[str] = None, **kwargs) -> Union[M, Row]:
         """ Fetch an instance of the model for matching the given primary key.
 
+        Parameters
+        ----------
+        fields : Sequence[str], optional
+            names of the columns to select. If given, a Row containing only those
+            columns is returned instead of a model instance.
+        kwargs
+            primary key values
+
         Returns
         -------
-        M
-            a model instance
+        Union[M, Row]
+            a model instance, or a Row if fields were specified
 
         Raises
         ------
         ValueError
-            incorrect or incomplete primary key passed
+            incorrect or incomplete primary key passed, or unknown fields
 
         """
 
@@ -204,11 +215,23 @@ class CrudMixin:
         # remedied later in the beta or in the 2.0 release.
         # ref: https://docs.sqlalchemy.org/en/14/orm/session_api.html#sqlalchemy.orm.Session.get
 
-        if {*cls.pk.names} != {*kwargs}:
+        if {*cls.meta.pk.names} != {*kwargs}:
             raise ValueError(
                 f"Provided primary keys do not match. Expected {cls.pk.names}, got {list(kwargs)}."
             )
 
+        if fields:
+            mapping = cls.meta.columns.mapping
+            unknown = [name for name in fields if name not in mapping]
+            if unknown:
+                raise ValueError(f"{cls.__name__} has no columns named {unknown}")
+
+            stmt = cls.select(*[mapping[name] for name in fields])
+            async with db.Session() as session:
+                return (
+                    await session.execute(stmt.where(cls.scoped_predicate(**kwargs)))
+                ).first()
+
         stmt = cls.select().where(cls.scoped_predicate(**kwargs))
         async with db.Session() as session:
             # unsure why this returns a model instance but other sa methods dont
@@ -282,7 +305,7 @@ class BulkIOMixin:
                     await retry_func(second_half, batch_size=second_n // 4)
                 else:
                     record = util.reduce(records)
-                    record = {k: v for k, v in record.items() if k in cls.pk.names}
+                    record = {k: v for k, v in record.items() if k in cls.meta.pk}
 
                     # include primary key names/values in log message
                     # values can be scrubbed later, if needed
@@ -374,9 +397,7 @@ class BulkIOMixin:
 
             elif conflict_action == "update":
                 on_conflict_update_cols = [
-                    c.name
-                    for c in cls.columns
-                    if c not in cls.pk and c.name not in exclude_cols
+                    name for name in cls.meta.updatable if name not in exclude_cols
                 ]
                 stmt = stmt.on_conflict_do_update(
                     constraint=conflict_constraint,
@@ -3,4 +3,5 @@
 # flake8: noqa
 from db.models.bases import Model
 from db.models.clients import OAuth2Client
+from db.models.revocations import Revocation
 from db.models.users import User
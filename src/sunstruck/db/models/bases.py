@@ -18,6 +18,7 @@ import util
 import util.jsontools
 from db.mixins import BulkIOMixin, CrudMixin
 from db.proxies import AggregateProxy, ColumnProxy, PrimaryKeyProxy, QueryProxy
+from db.registry import ModelMetadata, get_metadata, register
 from util.deco import classproperty
 
 
@@ -41,6 +42,16 @@ class Model(CrudMixin, BulkIOMixin):
         for item in self.dict().items():
             yield item
 
+    @classmethod
+    def __declare_last__(cls):
+        # invoked by sqlalchemy once the model's mapper has been configured
+        register(cls)
+
+    @classproperty
+    def meta(cls) -> ModelMetadata:
+        """ Precomputed metadata describing the model's columns """
+        return get_metadata(cls)
+
     @classproperty
     def __model_name__(cls) -> str:
         return f"{cls.__module__}.{cls.__name__}"
@@ -62,7 +73,7 @@ class Model(CrudMixin, BulkIOMixin):
     def dict(self) -> Dict[str, Any]:
         # sqlalchemy 1.4+ returns named tuples instead of mappings by default
         # ref: https://docs.sqlalchemy.org/en/14/changelog/migration_14.html#behavioral-changes-orm
-        return {col: getattr(self, col) for col in self.c.names}
+        return {col: getattr(self, col) for col in self.meta.columns.names}
 
     @classproperty
     def agg(cls) -> AggregateProxy:
@@ -6,7 +6,11 @@ from sqlalchemy.orm import relationship
 
 from db.models.bases import BaseTable, db
 from db.models.users import User
-from util.security import get_password_hash, verify_password
+from util.security import (
+    client_secret_needs_update,
+    hash_client_secret,
+    verify_client_secret,
+)
 
 __all__ = ["OAuth2Client"]
 
@@ -24,31 +28,44 @@ class OAuth2Client(BaseTable):
 
     @classmethod
     async def get_by_client_id(cls, client_id: str) -> Optional[OAuth2Client]:
-        return await cls.query.where(cls.client_id == client_id).gino.first()
+        stmt = cls.select().where(cls.client_id == client_id)
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).scalar()
 
     @classmethod
     async def get_by_owner(cls, owner_id: int) -> List[OAuth2Client]:
-        return await cls.query.where(cls.owner_id == owner_id).gino.all()
+        stmt = cls.select().where(cls.owner_id == owner_id).order_by(cls.id)
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).scalars().all()
 
     @classmethod
     async def authenticate(cls, client_id: str, client_secret: str) -> Optional[User]:
+        """ Get the owner of the client, if the client secret is correct. The client
+            and its owner are read in one query. Secrets hashed with an outdated
+            scheme (e.g. bcrypt) are rehashed with the current one once verified. """
 
-        client = (
-            await OAuth2Client.load(owner=User.on(OAuth2Client.owner_id == User.id))
+        stmt = (
+            db.select(OAuth2Client, User)
+            .join(User, OAuth2Client.owner_id == User.id)
             .where(OAuth2Client.client_id == client_id)
-            .gino.one_or_none()
         )
-        if not client:
+        async with db.session_factory() as session:
+            row = (await session.execute(stmt)).one_or_none()
+        if row is None:
             return None
+        client, owner = row
 
-        if not verify_password(client_secret, client.hashed_client_secret):
+        if not await verify_client_secret(client_secret, client.hashed_client_secret):
             return None
 
-        return client.owner
+        if client_secret_needs_update(client.hashed_client_secret):
+            await client.update(hashed_client_secret=hash_client_secret(client_secret))
+
+        return owner
 
     @classmethod
-    def create(cls, **values):
+    async def create(cls, **values) -> OAuth2Client:
         secret: Optional[str] = values.pop("client_secret", None)
         if secret:
-            values["hashed_client_secret"] = get_password_hash(secret)
-        return super().create(**values)
+            values["hashed_client_secret"] = hash_client_secret(secret)
+        return await super().create(**values)
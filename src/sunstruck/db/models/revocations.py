@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import config as conf
+from db.models.bases import BaseTable, db
+from util.revocation import RevocationList, revocations
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Revocation", "RevocationPoller"]
+
+
+def from_timestamp(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+class Revocation(BaseTable):
+    """ A revoked access token (jti), or every token issued to a subject (sub)
+        before revoked_at when jti is null. Rows are purged once expires_at has
+        passed, since every token they could match has then expired. """
+
+    __tablename__ = "revocations"
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64))
+    sub = db.Column(db.String(50), nullable=False)
+    revoked_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    ix_created_at = db.Index(f"ix_{__tablename__}_created_at", "created_at")
+    ix_expires_at = db.Index(f"ix_{__tablename__}_expires_at", "expires_at")
+
+    @classmethod
+    async def revoke_token(cls, jti: str, sub: str, exp: float) -> Revocation:
+        """ Revoke a single token until it expires. Takes effect in this process
+            immediately, and in others once they poll. """
+        revocation = await cls.create(
+            jti=jti,
+            sub=str(sub),
+            revoked_at=from_timestamp(time.time()),
+            expires_at=from_timestamp(exp),
+        )
+        revocations.revoke_token(jti, exp)
+        return revocation
+
+    @classmethod
+    async def revoke_subject(cls, sub: str, at: Optional[float] = None) -> Revocation:
+        """ Revoke every token issued to a subject before the given time (default:
+            now). Takes effect in this process immediately, and in others once they
+            poll. """
+        at = time.time() if at is None else at
+        revocation = await cls.create(
+            sub=str(sub),
+            revoked_at=from_timestamp(at),
+            expires_at=from_timestamp(at + revocations.max_token_age),
+        )
+        revocations.revoke_subject(sub, at=at)
+        return revocation
+
+    @classmethod
+    async def sync(
+        cls,
+        revocation_list: RevocationList = revocations,
+        overlap: float = conf.REVOCATION_POLL_OVERLAP,
+    ) -> int:
+        """ Apply the unexpired revocations added since the list was last synced.
+            Ids are assigned before rows commit, so a row may commit after one with
+            a later id. Rows created within the overlap are read again to catch
+            them; applying a revocation twice is harmless.
+
+        Returns:
+            int -- number of revocations read
+        """
+        stmt = cls.select(
+            cls.id, cls.jti, cls.sub, cls.revoked_at, cls.expires_at
+        ).where(
+            db.and_(
+                cls.expires_at > db.func.now(),
+                db.or_(
+                    cls.id > revocation_list.cursor,
+                    cls.created_at > db.func.now() - timedelta(seconds=overlap),
+                ),
+            )
+        )
+        async with db.session_factory() as session:
+            rows = (await session.execute(stmt)).all()
+
+        for row in rows:
+            if row.jti is not None:
+                revocation_list.revoke_token(row.jti, row.expires_at.timestamp())
+            else:
+                revocation_list.revoke_subject(row.sub, at=row.revoked_at.timestamp())
+            revocation_list.cursor = max(revocation_list.cursor, row.id)
+        return len(rows)
+
+    @classmethod
+    async def purge(cls) -> int:
+        """ Delete revocations that can no longer match an unexpired token """
+        stmt = db.delete(cls).where(cls.expires_at <= db.func.now())
+        async with db.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(stmt)
+        return result.rowcount
+
+
+class RevocationPoller:
+    """ Periodically applies revocations made by other processes to this one's
+        revocation list, and purges expired revocations from the table. """
+
+    def __init__(
+        self,
+        interval: float = conf.REVOCATION_POLL_INTERVAL,
+        purge_interval: float = 3600,
+    ):
+        self.interval = interval
+        self.purge_interval = purge_interval
+        self.next_purge = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    async def poll(self):
+        try:
+            await Revocation.sync()
+            if time.monotonic() >= self.next_purge:
+                self.next_purge = time.monotonic() + self.purge_interval
+                await Revocation.purge()
+        except Exception as e:
+            # keep polling; revocations apply once the database is reachable
+            logger.error(f"failed syncing token revocations: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.poll()
+
+    async def start(self):
+        """ Load the current revocations, then poll for new ones in the background """
+        await self.poll()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
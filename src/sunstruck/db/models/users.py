@@ -1,17 +1,48 @@
 from __future__ import annotations
 
-from typing import Optional
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
+from sqlalchemy.engine import Row  # type: ignore
+from sqlalchemy.orm import deferred, relationship
 
+import config as conf
+from const import TEXT_SEARCH_CONFIG
 from db.models.bases import BaseTable, db
-from util.security import get_password_hash, verify_password
+from db.models.revocations import Revocation
+from db.search import similar, tsquery
+from util.cache import LRUCache
+from util.security import get_password_hash_async, verify_password_async
 
 __all__ = ["User"]
 
+# weighted document searched by User.search: usernames rank above names, which
+# rank above email addresses
+SEARCH_DOCUMENT = f"""
+setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(username, '')), 'A') ||
+setweight(to_tsvector('{TEXT_SEARCH_CONFIG}',
+    coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'B') ||
+setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(email, '')), 'C')
+"""
+
+
+# columns search results never include, unless requested
+SEARCH_EXCLUDED_FIELDS = {"hashed_password", "search_vector"}
+
+# changing any of these revokes the user's access tokens, since their claims (or
+# the credentials used to obtain them) are no longer current
+REVOKING_FIELDS = {"is_active", "is_superuser", "password", "hashed_password"}
+
+# user id -> (expiration, user), for principals resolved on every request
+user_cache: LRUCache[Tuple[float, User]] = LRUCache(
+    maxsize=conf.AUTH_USER_CACHE_SIZE, name="user"
+)
+
 
 class User(BaseTable):
     __tablename__ = "users"
+    __sortable__ = ("id", "username", "email", "updated_at")
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     username = db.Column(db.String(50), nullable=False)
     email = db.Column(db.EmailType, nullable=False)
@@ -22,35 +53,133 @@ class User(BaseTable):
     phone_number = db.Column(db.Unicode(20))
     country_code = db.Column(db.Unicode(20))
     hashed_password = db.Column(db.String(), nullable=False)
+    # only read by search, so it's deferred rather than loaded with every user
+    search_vector = deferred(
+        db.Column(TSVECTOR, db.Computed(SEARCH_DOCUMENT, persisted=True))
+    )
     uq_username = db.UniqueConstraint("username")
     uq_email = db.UniqueConstraint("email")
     ix_username = db.Index(f"ix_{__tablename__}_username", "username")
     ix_email = db.Index(f"ix_{__tablename__}_email", "email")
+    ix_search_vector = db.Index(
+        f"ix_{__tablename__}_search_vector", "search_vector", postgresql_using="gin"
+    )
+    ix_username_trgm = db.Index(
+        f"ix_{__tablename__}_username_trgm",
+        "username",
+        postgresql_using="gin",
+        postgresql_ops={"username": "gin_trgm_ops"},
+    )
+    ix_email_trgm = db.Index(
+        f"ix_{__tablename__}_email_trgm",
+        "email",
+        postgresql_using="gin",
+        postgresql_ops={"email": "gin_trgm_ops"},
+    )
     oauth2_clients = relationship("OAuth2Client", back_populates="owner_id")
 
     @classmethod
     async def get_by_email(cls, email: str) -> Optional[User]:
-        return await cls.query.where(User.email == email).gino.first()
+        stmt = cls.select().where(cls.email == email)
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).scalar()
 
     @classmethod
     async def get_by_username(cls, username: str) -> Optional[User]:
-        return await cls.query.where(User.username == username).gino.first()
+        stmt = cls.select().where(cls.username == username)
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).scalar()
 
     @classmethod
     async def get_by_email_or_username(
         cls, email_or_username: str, prefer: str = None
     ) -> Optional[User]:
+        """ Find the user whose username or email matches, in one query. If the
+            value is one user's username and another's email, the preferred field's
+            match is returned.
 
-        if prefer == "email":
-            result = await cls.get_by_email(
-                email_or_username
-            ) or await cls.get_by_username(email_or_username)
-        else:
-            result = await cls.get_by_username(
-                email_or_username
-            ) or await cls.get_by_email(email_or_username)
+        Arguments:
+            email_or_username {str} -- username or email address
+
+        Keyword Arguments:
+            prefer {str} -- "email" to prefer a matching email, otherwise a matching
+                username is preferred (default: {None})
 
-        return result
+        Returns:
+            Optional[User]
+        """
+        preferred = cls.email if prefer == "email" else cls.username
+        stmt = (
+            cls.select()
+            .where(
+                db.or_(
+                    cls.username == email_or_username, cls.email == email_or_username
+                )
+            )
+            .order_by(db.case((preferred == email_or_username, 0), else_=1))
+            .limit(1)
+        )
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).scalar()
+
+    @classmethod
+    async def search(
+        cls,
+        q: str,
+        limit: int = 25,
+        offset: int = 0,
+        fields: Optional[Iterable[str]] = None,
+    ) -> List[Row]:
+        """ Find users matching a search term, best matches first. Users match if
+            their username, name or email matches the term as a full text search
+            (web search syntax, e.g. "john smith" or "john or jon"), or if their
+            username or email is similar to the term (trigram similarity, which
+            tolerates typos and partial words). Each condition is answered by a GIN
+            index, so matching doesn't scan the table.
+
+            The rank adds the full text rank, weighted by the field that matched, to
+            the highest trigram similarity of the username or email.
+
+        Arguments:
+            q {str} -- search term
+
+        Keyword Arguments:
+            limit {int} -- maximum number of users to return (default: {25})
+            offset {int} -- number of best matches to skip (default: {0})
+            fields {Optional[Iterable[str]]} -- names of the columns to return, e.g.
+                the fields of the response schema. Defaults to every column but
+                the password hash and search vector. (default: {None})
+
+        Returns:
+            List[Row] -- matching users' columns, plus their rank
+        """
+        mapping = cls.meta.columns.mapping
+        if fields is None:
+            fields = [name for name in mapping if name not in SEARCH_EXCLUDED_FIELDS]
+        columns = [mapping[name] for name in fields if name in mapping]
+
+        query = tsquery(q)
+        similarity = db.func.greatest(
+            db.func.similarity(cls.username, q), db.func.similarity(cls.email, q)
+        )
+        rank = (db.func.ts_rank(cls.search_vector, query) + similarity).label("rank")
+
+        stmt = (
+            cls.select(*columns, rank)
+            .where(
+                db.or_(
+                    cls.search_vector.op("@@")(query),
+                    similar(cls.username, q),
+                    similar(cls.email, q),
+                )
+            )
+            .order_by(rank.desc(), cls.id)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).all()
 
     @classmethod
     async def authenticate(
@@ -59,13 +188,91 @@ class User(BaseTable):
         user = await cls.get_by_email_or_username(email_or_username, prefer=prefer)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        if not await verify_password_async(password, user.hashed_password):
             return None
         return user
 
-    @classmethod
-    def create(cls, **values):
+    @staticmethod
+    async def hash_password(values: Dict[str, Any]) -> Dict[str, Any]:
+        """ Replace a plain text password in values with its hash. Hashing runs on
+            the password hash executor, so it doesn't block the event loop. """
         password: Optional[str] = values.pop("password", None)
         if password:
-            values["hashed_password"] = get_password_hash(password)
-        return super().create(**values)
+            values["hashed_password"] = await get_password_hash_async(password)
+        return values
+
+    @classmethod
+    async def create(cls, **values) -> User:
+        return await super().create(**await cls.hash_password(values))
+
+    @classmethod
+    async def create_unique(cls, **values) -> Optional[User]:
+        """ Create a user, unless their username or email is taken. Checked and
+            inserted in one statement (INSERT ... ON CONFLICT DO NOTHING), so
+            concurrent signups for the same username can't both succeed.
+
+        Returns:
+            Optional[User] -- the new user, or None if the username or email is taken
+        """
+        stmt = (
+            insert(cls)
+            .values(**await cls.hash_password(values))
+            .on_conflict_do_nothing()
+            .returning(*cls.c)
+        )
+        async with db.Session() as session:
+            async with session.begin():
+                row = (await session.execute(stmt)).one_or_none()
+        return cls.row_to_instance(row) if row is not None else None
+
+    def revokes(self, values: Dict[str, Any]) -> bool:
+        """ Check whether an update changes any of the REVOKING_FIELDS. Full
+            updates pass every field, so fields are compared to their current
+            values; an empty password is ignored, as it is by hash_password. """
+        for field in REVOKING_FIELDS.intersection(values):
+            value = values[field]
+            if field == "password":
+                if value:
+                    return True
+            elif value != getattr(self, field):
+                return True
+        return False
+
+    async def update(self, **values) -> User:
+        revoke = self.revokes(values)
+        user = await super().update(**await self.hash_password(values))
+        user_cache.pop(self.id)
+        if revoke:
+            await Revocation.revoke_subject(self.id)
+        return user
+
+    async def delete(self) -> User:
+        user = await super().delete()
+        user_cache.pop(self.id)
+        await Revocation.revoke_subject(self.id)
+        return user
+
+    @classmethod
+    async def get_cached(cls, id: int) -> Optional[User]:
+        """ Get a user by id, reusing the user fetched by a previous call for up to
+            AUTH_USER_CACHE_TTL seconds. Updating or deleting a user through the
+            model (including deactivating it) removes it from the cache, though
+            changes made by other processes can take up to the TTL to be seen.
+
+        Arguments:
+            id {int} -- the user's id
+
+        Returns:
+            Optional[User] -- the user, or None if no user has the id
+        """
+        now = time.monotonic()
+        cached = user_cache.get(id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        user = await cls.get(id=id)
+        if user is not None and conf.AUTH_USER_CACHE_TTL > 0:
+            user_cache.set(id, (now + conf.AUTH_USER_CACHE_TTL, user))
+        else:
+            user_cache.pop(id)
+        return user
@@ -2,17 +2,19 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Dict, List, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Tuple, Union
 
 from sqlalchemy import Column, text
 from sqlalchemy.schema import PrimaryKeyConstraint
 from sqlalchemy.sql.base import ImmutableColumnCollection
-from sqlalchemy.sql.elements import BinaryExpression, TextClause
+from sqlalchemy.sql.elements import ClauseElement
 from sqlalchemy.sql.functions import Function
 
 import util
 import util.jsontools
 from db import db
+from db.explain import explain
+from db.registry import ColumnSet
 
 if TYPE_CHECKING:
     from db.models.bases import Model
@@ -30,8 +32,11 @@ class ColumnProxy(ProxyBase):
         for col in self.columns:
             yield col
 
+    def __len__(self) -> int:
+        return len(self.meta)
+
     def __repr__(self):
-        return util.jsontools.make_repr(self.names)
+        return util.jsontools.make_repr(list(self.names))
 
     def __getitem__(self, item):
         try:  # item is int
@@ -41,8 +46,13 @@ class ColumnProxy(ProxyBase):
 
         return self.dict()[item]
 
-    def dict(self) -> Dict[str, Column]:
-        return dict(self.sa_obj)  # type: ignore
+    @property
+    def meta(self) -> ColumnSet:
+        """ Precomputed metadata backing this proxy """
+        return self.model.meta.columns
+
+    def dict(self) -> Mapping[str, Column]:
+        return self.meta.mapping
 
     @property
     def sa_obj(self) -> ImmutableColumnCollection:
@@ -50,15 +60,15 @@ class ColumnProxy(ProxyBase):
         return self.model.__table__.columns
 
     @property
-    def columns(self) -> List[Column]:
-        return list(self.sa_obj)
+    def columns(self) -> Tuple[Column, ...]:
+        return self.meta.columns
 
     @property
-    def names(self) -> List[str]:
-        return [x.name for x in self.columns]
+    def names(self) -> Tuple[str, ...]:
+        return self.meta.names
 
     @property
-    def pytypes(self) -> Dict[str, Any]:
+    def pytypes(self) -> Mapping[str, Any]:
         """ Return a mapping of the model's field names to Python types.
 
         Example:
@@ -66,16 +76,12 @@ class ColumnProxy(ProxyBase):
         >>> {"id": int, "name": str}
 
         Returns:
-            Dict[str, Any]
+            Mapping[str, Any]
         """
-        dtypes = {}
-        for col in self.columns:
-            dtypes[col.name] = col.type.python_type
-
-        return dtypes
+        return self.meta.pytypes
 
     @property
-    def dtypes(self) -> Dict[str, Any]:
+    def dtypes(self) -> Mapping[str, Any]:
         """ Return a mapping of the model's field names to SQL column types.
 
         Example:
@@ -83,20 +89,32 @@ class ColumnProxy(ProxyBase):
         >>> {'id': BigInteger(), 'first_name': String(length=100)}
 
         Returns:
-            Dict[str, Any]
+            Mapping[str, Any]
         """
-        dtypes = {}
-        for col in self.columns:
-            dtypes[col.name] = col.type
+        return self.meta.dtypes
 
-        return dtypes
+    @property
+    def coercers(self) -> Mapping[str, Callable[[Any], Any]]:
+        """ Return a mapping of the model's field names to functions that convert
+            raw values (e.g. query string parameters) to the field's Python type.
+
+        Example:
+        >>> model.columns.coercers["id"]("5")
+        >>> 5
+
+        Returns:
+            Mapping[str, Callable[[Any], Any]]
+        """
+        return self.meta.coercers
 
 
 class PrimaryKeyProxy(ColumnProxy):
     """ Proxy object for a data model's primary key attributes """
 
-    def dict(self) -> Dict:
-        return dict(self.sa_obj.columns)  # type: ignore
+    @property
+    def meta(self) -> ColumnSet:
+        """ Precomputed metadata backing this proxy """
+        return self.model.meta.pk
 
     @property
     def sa_obj(self) -> PrimaryKeyConstraint:  # type: ignore
@@ -104,8 +122,9 @@ class PrimaryKeyProxy(ColumnProxy):
         return self.model.__table__.primary_key
 
     @property
-    def columns(self) -> List[Column]:
-        return list(self.sa_obj.columns)
+    def positions(self) -> Tuple[int, ...]:
+        """ Index of each primary key column within the model's table """
+        return self.meta.positions
 
     @property
     async def values(self) -> List[Any]:
@@ -134,7 +153,7 @@ class AggregateProxy(ProxyBase):
 
     @property
     def default_column(self) -> Column:
-        return self._pk[0] if len(list(self._pk)) > 0 else self._c[0]
+        return self._pk[0] if len(self._pk) > 0 else self._c[0]
 
     def ensure_column(self, column: Union[str, Column] = None) -> Column:
         col: Column
@@ -152,32 +171,36 @@ class AggregateProxy(ProxyBase):
     async def agg(
         self,
         funcs: Union[Function, List[Function]],
-        filter: Union[str, TextClause, BinaryExpression] = None,
+        filter: Union[str, ClauseElement] = None,
     ) -> Dict[str, Union[int, float]]:
         func_map: Dict[str, Function] = {f.name: f for f in util.ensure_list(funcs)}
 
         stmt = self.model.select(*func_map.values())
 
         if filter is not None:
-            if not isinstance(filter, (TextClause, BinaryExpression)):
+            if isinstance(filter, str):
                 filter = text(filter)
             stmt = stmt.where(filter)
 
+        # a session of its own, rather than the shared scoped session, so the
+        # aggregate can run alongside other queries (e.g. a page being fetched)
         result: db.Row
-        async with db.Session() as session:
+        async with db.session_factory() as session:
             async with session.begin():
                 result = (await session.execute(stmt)).one()
 
         return dict(zip(func_map, result))
 
-    async def count(self, filter: Union[str, TextClause] = None) -> int:
+    async def count(self, filter: Union[str, ClauseElement] = None) -> int:
         """ Get the model's rowcount """
 
         result = await self.agg(db.func.count(self.default_column), filter=filter)
         return util.reduce(result.values())
 
     async def max(
-        self, column: Union[str, Column] = None, filter: Union[str, TextClause] = None
+        self,
+        column: Union[str, Column] = None,
+        filter: Union[str, ClauseElement] = None,
     ) -> int:
         """ Get the maximum value of the given column.  If no column is specified,
             the max value of the first primary key column is returned.
@@ -188,7 +211,9 @@ class AggregateProxy(ProxyBase):
         return util.reduce(result.values())
 
     async def min(
-        self, column: Union[str, Column] = None, filter: Union[str, TextClause] = None
+        self,
+        column: Union[str, Column] = None,
+        filter: Union[str, ClauseElement] = None,
     ) -> int:
         """ Get the minimum value of the given column.  If no column is specified,
             the min value of the first primary key column is returned.
@@ -197,3 +222,24 @@ class AggregateProxy(ProxyBase):
         func: Function = db.func.min(self.ensure_column(column))
         result = await self.agg(func, filter=filter)
         return util.reduce(result.values())
+
+    async def estimate(self, filter: Union[str, ClauseElement] = None) -> int:
+        """ Get the query planner's estimate of the model's rowcount. Without a filter,
+            this is a single catalog lookup regardless of table size, but is only as
+            current as the table's last VACUUM or ANALYZE. Tables that have never been
+            analyzed return -1 (0 before PostgreSQL 14). With a filter, the estimate
+            is the planned row count of the filtered query.
+        """
+
+        if filter is not None:
+            if isinstance(filter, str):
+                filter = text(filter)
+            plan = await explain(self.model.select(self.default_column).where(filter))
+            return int(plan["Plan Rows"])
+
+        stmt = text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)"
+        ).bindparams(name=self.model.__table__.fullname)
+
+        async with db.session_factory() as session:
+            return (await session.execute(stmt)).scalar()
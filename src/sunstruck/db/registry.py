@@ -0,0 +1,261 @@
+""" Precomputed, immutable metadata describing the columns of each data model.
+
+    Enumerating a model's columns through __table__ rebuilds lists and dicts on every
+    access, which adds up quickly in hot paths like Model.dict(), filter translation
+    and bulk upserts. Instead, a ModelMetadata instance is built once per model, when
+    SQLAlchemy finishes configuring the model's mapper, and every proxy reads from it.
+"""
+
+from __future__ import annotations
+
+import logging
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from sqlalchemy import Column, Index, PrimaryKeyConstraint, UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql.type_api import TypeEngine
+from sqlalchemy_utils import EmailType
+
+from util.coercion import Coercer, get_coercer, to_lower_str
+
+if TYPE_CHECKING:
+    from db.models.bases import Model
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ColumnSet", "ModelMetadata", "registry", "get_metadata"]
+
+
+class Frozen:
+    """ Mixin that prevents attribute assignment once __init__ has completed """
+
+    __slots__: Tuple[str, ...] = ()
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def _set(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+
+
+def python_type(column: Column) -> Any:
+    """ Get the python type of a column, falling back to object for column types
+        that don't implement python_type (e.g. some TypeDecorators) """
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return object
+
+
+# column types whose values need more than conversion to their python type.
+# EmailType lowercases values when binding them, so coerced values should match.
+# tsvector columns are compared to search terms, which are plain strings.
+TYPE_COERCERS: Dict[type, Coercer] = {EmailType: to_lower_str, TSVECTOR: str}
+
+
+def column_coercer(column: Column) -> Coercer:
+    """ Get the converter for a column's values, preferring a converter registered
+        for the column's sql type over the one for its python type """
+    for sa_type, coercer in TYPE_COERCERS.items():
+        if isinstance(column.type, sa_type):
+            return coercer
+    return get_coercer(python_type(column))
+
+
+def leading_columns(model: Model) -> Set[str]:
+    """ Get the names of the columns that lead a btree index, or a unique or primary
+        key constraint of a model's table. Rows can be read in the order of these
+        columns (in either direction) by scanning the index, without sorting. Other
+        index types (e.g. GIN) can't return rows in order, so they're ignored.
+        Indexes declared as model attributes (e.g. ix_email = db.Index(...)) are
+        included, even if they haven't been attached to the table.
+    """
+    table = model.__table__
+    declared = list(vars(model).values())
+    # postgres backs primary key and unique constraints with an index
+    constraints = [
+        c
+        for c in table.constraints
+        if isinstance(c, (PrimaryKeyConstraint, UniqueConstraint))
+    ]
+    indexes = [
+        i
+        for i in [*table.indexes, *declared]
+        if isinstance(i, Index)
+        and i.dialect_kwargs.get("postgresql_using", "btree") == "btree"
+    ]
+
+    leading: Set[str] = set()
+    for columns in [list(c.columns) for c in constraints] + [
+        i.expressions for i in indexes
+    ]:
+        if not columns:
+            continue
+        first = columns[0]
+        leading.add(first if isinstance(first, str) else getattr(first, "name", ""))
+
+    return leading & {c.name for c in table.columns}
+
+
+def sortable_columns(model: Model, indexed: Iterable[str]) -> Optional[Tuple[str, ...]]:
+    """ Get the fields a model declares as sortable with __sortable__, checking that
+        each one leads an index.
+
+    Raises:
+        ValueError: a declared field isn't an indexed column of the model
+
+    Returns:
+        Optional[Tuple[str, ...]] -- the declared fields, or None if not declared
+    """
+    declared = getattr(model, "__sortable__", None)
+    if declared is None:
+        return None
+
+    unindexed = [name for name in declared if name not in indexed]
+    if unindexed:
+        raise ValueError(
+            f"{model.__name__}.__sortable__ includes fields that don't lead an "
+            f"index: {unindexed}"
+        )
+    return tuple(declared)
+
+
+class ColumnSet(Frozen):
+    """ Ordered, immutable collection of columns and their precomputed attributes.
+
+    Attributes:
+        columns {Tuple[Column, ...]} -- columns, in table order
+        names {Tuple[str, ...]} -- column names, in table order
+        index {Mapping[str, int]} -- column name to index within this set
+        positions {Tuple[int, ...]} -- index of each column within the table
+        mapping {Mapping[str, Column]} -- column name to column
+        pytypes {Mapping[str, Any]} -- column name to python type
+        dtypes {Mapping[str, TypeEngine]} -- column name to sql type
+        coercers {Mapping[str, Callable]} -- column name to value converter
+    """
+
+    __slots__ = (
+        "columns",
+        "names",
+        "index",
+        "positions",
+        "mapping",
+        "pytypes",
+        "dtypes",
+        "coercers",
+    )
+
+    columns: Tuple[Column, ...]
+    names: Tuple[str, ...]
+    index: Mapping[str, int]
+    positions: Tuple[int, ...]
+    mapping: Mapping[str, Column]
+    pytypes: Mapping[str, Any]
+    dtypes: Mapping[str, TypeEngine]
+    coercers: Mapping[str, Callable[[Any], Any]]
+
+    def __init__(self, columns: Iterable[Column], table_names: Tuple[str, ...]):
+        columns = tuple(columns)
+        names = tuple(c.name for c in columns)
+        pytypes = {c.name: python_type(c) for c in columns}
+
+        self._set("columns", columns)
+        self._set("names", names)
+        self._set("index", MappingProxyType({n: i for i, n in enumerate(names)}))
+        self._set("positions", tuple(table_names.index(n) for n in names))
+        self._set("mapping", MappingProxyType(dict(zip(names, columns))))
+        self._set("pytypes", MappingProxyType(pytypes))
+        self._set("dtypes", MappingProxyType({c.name: c.type for c in columns}))
+        self._set(
+            "coercers", MappingProxyType({c.name: column_coercer(c) for c in columns}),
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __contains__(self, item: Any) -> bool:
+        if isinstance(item, str):
+            return item in self.mapping
+        return item in self.columns
+
+    def __repr__(self):
+        return f"ColumnSet{self.names}"
+
+
+class ModelMetadata(Frozen):
+    """ Immutable description of a data model's table, built once per model.
+
+    Attributes:
+        model_name {str} -- fully qualified name of the model
+        columns {ColumnSet} -- every column on the model's table
+        pk {ColumnSet} -- the primary key columns
+        updatable {Tuple[str, ...]} -- names of the columns an upsert can write:
+            neither part of the primary key nor generated (Computed) columns
+        indexed {FrozenSet[str]} -- names of the columns leading an index
+        sortable {Optional[Tuple[str, ...]]} -- fields declared as sortable with
+            __sortable__, or None if the model doesn't declare any
+    """
+
+    __slots__ = ("model_name", "columns", "pk", "updatable", "indexed", "sortable")
+
+    model_name: str
+    columns: ColumnSet
+    pk: ColumnSet
+    updatable: Tuple[str, ...]
+    indexed: FrozenSet[str]
+    sortable: Optional[Tuple[str, ...]]
+
+    def __init__(self, model: Model):
+        table = model.__table__
+        names = tuple(c.name for c in table.columns)
+        pk = ColumnSet(table.primary_key.columns, names)
+
+        self._set("model_name", f"{model.__module__}.{model.__name__}")
+        self._set("columns", ColumnSet(table.columns, names))
+        self._set("pk", pk)
+        self._set(
+            "updatable",
+            tuple(
+                c.name
+                for c in table.columns
+                if c.name not in pk and c.computed is None
+            ),
+        )
+        self._set("indexed", frozenset(leading_columns(model)))
+        self._set("sortable", sortable_columns(model, self.indexed))
+
+    def __repr__(self):
+        return f"ModelMetadata({self.model_name})"
+
+
+registry: Dict[type, ModelMetadata] = {}
+
+
+def register(model: Model) -> ModelMetadata:
+    """ Build and store the metadata for the given model, replacing any
+        previously registered metadata. """
+    meta = ModelMetadata(model)
+    registry[model] = meta
+    logger.debug(f"registered metadata for {meta.model_name}")
+    return meta
+
+
+def get_metadata(model: Model) -> ModelMetadata:
+    """ Get the metadata for the given model, building it on first use if the
+        model was accessed before its mapper was configured. """
+    try:
+        return registry[model]
+    except KeyError:
+        return register(model)
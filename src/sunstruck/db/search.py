@@ -0,0 +1,39 @@
+""" Full text and trigram search expressions.
+
+    Full text search matches tsvector documents against a query parsed from a search
+    term. Trigram search (pg_trgm) matches text similar to a search term, tolerating
+    typos and partial words. Both can be answered from a GIN index.
+
+    ### References:
+    - https://www.postgresql.org/docs/current/textsearch-controls.html
+    - https://www.postgresql.org/docs/current/pgtrgm.html
+"""
+
+from typing import Any
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.functions import Function
+
+from const import TEXT_SEARCH_CONFIG
+
+__all__ = ["tsquery", "matches", "similar"]
+
+
+def tsquery(term: Any) -> Function:
+    """ Parse a search term in web search syntax (e.g. "john smith", "john or jon",
+        "-smith") as a full text query. The configuration is rendered as a literal,
+        so postgres resolves it to a regconfig. """
+    config = literal_column(f"'{TEXT_SEARCH_CONFIG}'")
+    return func.websearch_to_tsquery(config, term)
+
+
+def matches(document: ColumnElement, term: Any) -> ColumnElement:
+    """ Full text match of a tsvector against a search term """
+    return document.op("@@")(tsquery(term))
+
+
+def similar(column: ColumnElement, term: Any) -> ColumnElement:
+    """ Trigram similarity match of a text column against a search term. Matches if
+        the similarity exceeds pg_trgm.similarity_threshold (0.3 by default). """
+    return column.op("%")(term)
@@ -4,3 +4,21 @@ class RootException(Exception):
     Base class for all custom exceptions.
 
     """
+
+
+class FilterSyntaxError(RootException, ValueError):
+    """ Raised when a filter expression can't be parsed """
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} (position {position})")
+        self.message = message
+        self.position = position
+
+
+class InvalidCursorError(RootException, ValueError):
+    """ Raised when a pagination cursor is malformed, tampered with, or doesn't
+        match the requested sort order """
+
+
+class PasswordHashQueueFull(RootException):
+    """ Raised when too many passwords are waiting to be hashed or verified """
@@ -1,3 +1,8 @@
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+
+import config as conf
 import loggers
 from api.helpers.middlewares import ORJSONMiddleware
 from sunstruck import app
@@ -8,15 +13,73 @@ loggers.config()
 def configure_routers(app):
     import api.v1 as v1
 
+    from api.well_known import router as well_known_router
+
     app.include_router(v1.api_router, prefix="/api/v1")
+    app.include_router(well_known_router, tags=["Discovery"])
 
 
 def configure_middlewares(app):
+    from api.helpers.ratelimit import RateLimitMiddleware
+
     app.add_middleware(ORJSONMiddleware)
+    if conf.RATE_LIMIT_ENABLED:
+        # added last, so it's outermost and rejects requests before anything else
+        app.add_middleware(RateLimitMiddleware)
+
+
+def configure_events(app):
+    from api.helpers.filtering import telemetry
+    from db.models.revocations import RevocationPoller
+    from util.keys import keyring
+    from util.security import hash_executor
+
+    # create the first signing key, or publish the next one if it's due
+    app.add_event_handler("startup", keyring.rotate)
+
+    # apply token revocations made by every process
+    poller = RevocationPoller()
+    app.add_event_handler("startup", poller.start)
+    app.add_event_handler("shutdown", poller.stop)
+    # keep the last snapshot of filter usage for sunstruck db advise-indexes
+    app.add_event_handler("shutdown", telemetry.flush)
+    app.add_event_handler("shutdown", hash_executor.shutdown)
+
+
+def configure_exception_handlers(app):
+    from exc import FilterSyntaxError, InvalidCursorError, PasswordHashQueueFull
+
+    async def password_hash_queue_full(request: Request, exc: PasswordHashQueueFull):
+        return ORJSONResponse(
+            {"detail": "Too many concurrent authentication attempts. Try again."},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"retry-after": "1"},
+        )
+
+    app.add_exception_handler(PasswordHashQueueFull, password_hash_queue_full)
+
+    # Pagination reports these itself; other callers, e.g. an endpoint translating
+    # a Filter directly, rely on these handlers for a 422 rather than a 500
+    async def invalid_filter(request: Request, exc: FilterSyntaxError):
+        return ORJSONResponse(
+            {"detail": f"Invalid filter: {exc}"},
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    async def invalid_cursor(request: Request, exc: InvalidCursorError):
+        return ORJSONResponse(
+            {"detail": f"Invalid cursor: {exc}"},
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    app.add_exception_handler(FilterSyntaxError, invalid_filter)
+    app.add_exception_handler(InvalidCursorError, invalid_cursor)
 
 
 configure_routers(app)
 configure_middlewares(app)
+configure_events(app)
+configure_exception_handlers(app)
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ import asyncio
 import logging
 import subprocess
 import sys
+import time
 from pathlib import Path
 from typing import List
 
@@ -10,7 +11,9 @@ import typer
 
 import config as conf
 import loggers
+from db import advise
 from db.init_db import init_db
+from util.keys import keyring
 
 loggers.config()
 
@@ -57,6 +60,45 @@ def create_superuser():
     asyncio.run(init_db())
 
 
+@db_cli.command(
+    name="advise-indexes",
+    help="Propose indexes for the fields clients filter and sort by most often, and"
+    " flag indexes that are never used, from the api's filter telemetry and the"
+    " database's index statistics. Prints the changes as an Alembic migration.",
+    short_help="Propose missing indexes and flag unused ones",
+)
+def advise_indexes(
+    telemetry_dir: Path = typer.Option(
+        conf.TELEMETRY_DIR, help="Directory of the api's telemetry snapshots"
+    ),
+    min_uses: int = typer.Option(
+        advise.MIN_USES, help="Uses of a field before an index is proposed for it"
+    ),
+    min_rows: int = typer.Option(
+        advise.MIN_ROWS, help="Rows in a table before indexes are proposed for it"
+    ),
+):
+    advice = asyncio.run(
+        advise.advise_indexes(telemetry_dir, min_uses=min_uses, min_rows=min_rows)
+    )
+    if not advice:
+        typer.echo("No index changes to suggest")
+        return
+
+    if advice.proposals:
+        typer.echo("Proposed indexes:")
+        for p in advice.proposals:
+            typer.echo(f"  {p.name:<40} {p.method:<6} {p.reason}")
+
+    if advice.unused:
+        typer.echo("Unused indexes:")
+        for u in advice.unused:
+            typer.echo(f"  {u.index.name:<40} {u.index.table:<20} {u.reason}")
+
+    typer.echo("\n# --- migration ---\n")
+    typer.echo(advice.migration())
+
+
 @db_cli.command(help="Drop amd rebuild the current database")
 def recreate(args: List[str] = None):  # nocover
 
@@ -84,6 +126,40 @@ def recreate(args: List[str] = None):  # nocover
         logger.warning("Database recreation complete")
 
 
+# --- keys ------------------------------------------------------------------- #
+
+keys_cli = typer.Typer(help="Access Token Signing Keys")
+
+
+@keys_cli.command(
+    help="Publish a new signing key if one is due, and delete keys whose tokens have"
+    " all expired. Run it on a schedule (e.g. daily) to rotate keys every"
+    " JWT_KEY_ROTATION_DAYS.",
+    short_help="Rotate the signing keys",
+)
+def rotate(
+    force: bool = typer.Option(False, help="Publish a new key even if none is due")
+):
+    key = keyring.rotate(force=force)
+    if key:
+        typer.echo(f"Published signing key {key.kid}")
+    else:
+        typer.echo("No signing key is due")
+
+
+@keys_cli.command(name="list", help="List the published signing keys")
+def list_keys():
+    now = time.time()
+    keys = keyring.verification_keys(now)  # newest first
+    signing = next((k.kid for k in keys if k.activates <= now), None)
+    for key in keys:
+        if key.activates > now:
+            state = "pending"
+        else:
+            state = "signing" if key.kid == signing else "verifying"
+        typer.echo(f"{key.kid:<30} {state}")
+
+
 # --- run -------------------------------------------------------------------- #
 
 # NOTE: typer doesn't yet support passing unknown options. The workaround below is
@@ -132,6 +208,7 @@ def routes():
 
 cli.add_command(run_cli)
 cli.add_command(typer.main.get_command(db_cli), "db")
+cli.add_command(typer.main.get_command(keys_cli), "keys")
 
 
 def main(argv: List[str] = sys.argv):
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -15,3 +15,18 @@ class TokenPayload(BaseModel):
         None,
         description="Subject, or purpose, of the token. For example, a url or user's email. ",
     )
+    exp: Optional[float] = Field(None, description="Expiration, as a unix timestamp")
+    iat: Optional[float] = Field(None, description="Issued at, as a unix timestamp")
+    jti: Optional[str] = Field(None, description="Unique id of the token")
+    scope: str = Field("", description="Space delimited scopes granted to the token")
+    # None in tokens issued before these claims were added; read from the user
+    is_superuser: Optional[bool] = Field(
+        None, description="Whether the subject was a superuser when issued"
+    )
+    active: Optional[bool] = Field(
+        None, description="Whether the subject was active when issued"
+    )
+
+    @property
+    def scopes(self) -> List[str]:
+        return self.scope.split()
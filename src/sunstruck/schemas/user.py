@@ -1,11 +1,10 @@
 from typing import Optional
 
-from pydantic import EmailStr, Field, validator
+from pydantic import EmailStr
 
-import util.security as security
 from schemas.bases import BaseModel, ORMBase
 
-__all__ = ["User", "UserCreateIn", "UserUpdateIn", "UserOut"]
+__all__ = ["User", "UserCreateIn", "UserUpdateIn", "UserOut", "UserSearchOut"]
 
 
 class User(BaseModel):
@@ -22,25 +21,20 @@ class User(BaseModel):
 
 
 class UserCreateIn(User):
-    """ Properties available to POST requests """
+    """ Properties available to POST requests. The password is hashed when the
+        user is written (see db.models.User.hash_password), since hashing is too
+        slow to run on the event loop while parsing the request. """
 
     username: str
     email: EmailStr
-    hashed_password: str = Field(..., alias="password")
-
-    @validator("hashed_password")
-    def hash_password(v: str) -> str:
-        return security.get_password_hash(v)
+    password: str
 
 
 class UserUpdateIn(User):
-    """ Properties available to PUT/PATCH requests """
-
-    hashed_password: Optional[str] = Field(None, alias="password")
+    """ Properties available to PUT/PATCH requests. The password is hashed when
+        the user is written, as with UserCreateIn. """
 
-    @validator("hashed_password")
-    def hash_password(v: str) -> str:
-        return security.get_password_hash(v)
+    password: Optional[str]
 
 
 class UserOut(ORMBase, User):
@@ -50,6 +44,12 @@ class UserOut(ORMBase, User):
     email: EmailStr
 
 
+class UserSearchOut(UserOut):
+    """ Search result, ranked by relevance to the search term """
+
+    rank: float
+
+
 class UserInDB(ORMBase, User):
     """ Internal only properties """
 
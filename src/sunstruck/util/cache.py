@@ -0,0 +1,82 @@
+""" In-process caching primitives """
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["LRUCache"]
+
+V = TypeVar("V")
+
+MISSING = object()
+
+
+class LRUCache(Generic[V]):
+    """ Bounded mapping that evicts the least recently used key once maxsize is
+        exceeded. Hits and misses are counted on every lookup.
+
+    Example:
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache["a"] = 1
+    >>> cache.get("a")
+    >>> 1
+    >>> cache.info()
+    >>> {'name': 'cache', 'hits': 1, 'misses': 0, 'maxsize': 2, 'currsize': 1}
+    """
+
+    def __init__(self, maxsize: int = 128, name: str = "cache"):
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def __repr__(self):
+        return f"LRUCache({self.name}: {self.info()})"
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __setitem__(self, key: Hashable, value: V):
+        self.set(key, value)
+
+    def get(self, key: Hashable, default: Optional[V] = None) -> Optional[V]:
+        value = self._data.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def clear(self):
+        """ Remove all entries and reset the hit/miss counters """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> Dict[str, Any]:
+        """ Get the cache's hit/miss counters and current size """
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "maxsize": self.maxsize,
+            "currsize": len(self._data),
+        }
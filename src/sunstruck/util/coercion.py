@@ -0,0 +1,101 @@
+""" Fast converters for coercing raw (usually string) values to Python types """
+
+import functools
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Type
+
+from pydantic import parse_obj_as
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["get_coercer", "to_bool", "to_date", "to_datetime", "to_lower_str"]
+
+Coercer = Callable[[Any], Any]
+
+TRUTHY = frozenset({"1", "on", "t", "true", "y", "yes"})
+FALSY = frozenset({"0", "off", "f", "false", "n", "no"})
+
+
+def to_bool(v: Any) -> bool:
+    """ Coerce a value to a boolean, accepting the same literals as pydantic """
+    if isinstance(v, bool):
+        return v
+    value = str(v).strip().lower()
+    if value in TRUTHY:
+        return True
+    if value in FALSY:
+        return False
+    raise ValueError(f"value could not be parsed to a boolean: {v}")
+
+
+def to_datetime(v: Any) -> datetime:
+    """ Coerce a value to a datetime, falling back to pydantic for anything
+        that isn't an ISO-8601 string (e.g. unix timestamps). """
+    if isinstance(v, datetime):
+        return v
+    try:
+        return datetime.fromisoformat(str(v).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return parse_obj_as(datetime, v)
+
+
+def to_date(v: Any) -> date:
+    """ Coerce a value to a date, falling back to pydantic for non-ISO values """
+    if isinstance(v, date) and not isinstance(v, datetime):
+        return v
+    try:
+        return date.fromisoformat(str(v).strip())
+    except ValueError:
+        return parse_obj_as(date, v)
+
+
+def to_lower_str(v: Any) -> str:
+    """ Coerce a value to a lowercased string (e.g. for case-insensitive emails) """
+    return str(v).lower()
+
+
+def _strict(pytype: Type, func: Callable) -> Coercer:
+    """ Return the value untouched if it is already of the target type, otherwise
+        convert it with func. """
+
+    def coerce(v: Any) -> Any:
+        if type(v) is pytype:
+            return v
+        return func(v)
+
+    return coerce
+
+
+FAST_COERCERS: Dict[Type, Coercer] = {
+    int: _strict(int, int),
+    float: _strict(float, float),
+    Decimal: _strict(Decimal, Decimal),
+    str: _strict(str, str),
+    bool: to_bool,
+    datetime: to_datetime,
+    date: to_date,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_coercer(pytype: Type) -> Coercer:
+    """ Get a converter for the given Python type. Common scalar types are handled
+        by purpose built functions; everything else is delegated to pydantic.
+
+    Example:
+    >>> get_coercer(int)("5")
+    >>> 5
+
+    Arguments:
+        pytype {Type} -- target Python type
+
+    Returns:
+        Callable[[Any], Any] -- single argument conversion function
+    """
+    try:
+        return FAST_COERCERS[pytype]
+    except KeyError:
+        logger.debug(f"no fast coercer for {pytype}, falling back to pydantic")
+        return functools.partial(parse_obj_as, pytype)
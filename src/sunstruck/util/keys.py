@@ -0,0 +1,282 @@
+""" Asymmetric signing keys for access tokens, with scheduled rotation.
+
+    Access tokens are signed with a private key and carry the id of that key (kid)
+    in their header, so any service holding the public keys, e.g. from the
+    /.well-known/jwks.json endpoint, can validate them without calling this api or
+    sharing a secret.
+
+    Private keys are kept as PEM files in JWT_KEYS_DIR, named after their kid. A kid
+    starts with the time its key becomes active, so every process sharing the
+    directory agrees on which key signs, and processes rescan it every
+    JWT_KEY_RELOAD_INTERVAL seconds to pick up keys rotated by another process.
+
+    Rotation (sunstruck keys rotate, run on a schedule) adds a key every
+    JWT_KEY_ROTATION_DAYS. A new key is published JWKS_MAX_AGE seconds before it
+    signs anything, so verifiers' cached key sets include it by the time tokens
+    signed with it arrive. A replaced key is published until every token it signed
+    has expired, then it's deleted.
+"""
+
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import ecdsa
+import rsa
+from jose import jwk, jwt
+from jose.constants import ALGORITHMS
+
+import config as conf
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["SigningKey", "KeyRing", "keyring"]
+
+KID_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def generate_rsa() -> bytes:
+    _, private = rsa.newkeys(2048)
+    return private.save_pkcs1()
+
+
+def generate_ec(curve: ecdsa.curves.Curve) -> Callable[[], bytes]:
+    def generate() -> bytes:
+        return ecdsa.SigningKey.generate(curve=curve).to_pem()
+
+    return generate
+
+
+# algorithm -> function generating a private key as pem
+GENERATORS: Dict[str, Callable[[], bytes]] = {
+    ALGORITHMS.RS256: generate_rsa,
+    ALGORITHMS.RS384: generate_rsa,
+    ALGORITHMS.RS512: generate_rsa,
+    ALGORITHMS.ES256: generate_ec(ecdsa.NIST256p),
+    ALGORITHMS.ES384: generate_ec(ecdsa.NIST384p),
+    ALGORITHMS.ES512: generate_ec(ecdsa.NIST521p),
+}
+
+
+def make_kid(activates: float) -> str:
+    """ Create a unique key id beginning with the time the key becomes active """
+    when = datetime.fromtimestamp(activates, tz=timezone.utc)
+    return f"{when:{KID_TIME_FORMAT}}-{secrets.token_hex(4)}"
+
+
+def parse_kid(kid: str) -> float:
+    """ Get the time a key becomes active from its id """
+    when = datetime.strptime(kid.split("-", 1)[0], KID_TIME_FORMAT)
+    return when.replace(tzinfo=timezone.utc).timestamp()
+
+
+class SigningKey:
+    """ A private key and its public counterpart """
+
+    __slots__ = ("kid", "activates", "private", "public")
+
+    def __init__(self, kid: str, pem: Union[str, bytes], algorithm: str):
+        self.kid = kid
+        self.activates = parse_kid(kid)
+        self.private = jwk.construct(pem, algorithm)
+        self.public = self.private.public_key()
+
+    def __repr__(self):
+        return f"SigningKey(kid={self.kid})"
+
+    def to_jwk(self) -> Dict[str, Any]:
+        """ Get the public key as a JSON Web Key """
+        return {**self.public.to_dict(), "kid": self.kid, "use": "sig"}
+
+
+class KeyRing:
+    """ The signing keys in a directory, and the schedule they're rotated on.
+
+    Example:
+    >>> keyring = KeyRing(".keys", algorithm="RS256")
+    >>> keyring.rotate()
+    >>> token = keyring.sign({"sub": "7"})
+    >>> keyring.verify(token)
+    >>> {'sub': '7'}
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        algorithm: str = ALGORITHMS.RS256,
+        rotation_interval: float = 30 * 86400,
+        publish_ahead: float = 3600,
+        token_lifetime: float = 7 * 86400,
+        reload_interval: float = 60,
+    ):
+        if algorithm not in GENERATORS:
+            raise ValueError(
+                f"Unsupported signing algorithm: {algorithm}. Use one of: "
+                + ", ".join(GENERATORS)
+            )
+        self.directory = Path(directory)
+        self.algorithm = algorithm
+        self.rotation_interval = rotation_interval
+        self.publish_ahead = publish_ahead
+        self.token_lifetime = token_lifetime
+        self.reload_interval = reload_interval
+        self.keys: Dict[str, SigningKey] = {}
+        self.loaded_at = 0.0
+        self.next_reload = 0.0
+
+    def __repr__(self):
+        return f"KeyRing(algorithm={self.algorithm}, keys={len(self.keys)})"
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def load(self):
+        """ Read the keys in the directory. Keys already loaded aren't parsed again,
+            and keys no longer in the directory are dropped. """
+        self.loaded_at = time.monotonic()
+        self.next_reload = self.loaded_at + self.reload_interval
+        keys: Dict[str, SigningKey] = {}
+        for path in sorted(self.directory.glob("*.pem")):
+            kid = path.stem
+            if kid in self.keys:
+                keys[kid] = self.keys[kid]
+                continue
+            try:
+                keys[kid] = SigningKey(kid, path.read_bytes(), self.algorithm)
+            except Exception as e:
+                logger.warning(f"skipping unreadable signing key {path}: {e}")
+        self.keys = keys
+
+    def maybe_reload(self):
+        if time.monotonic() >= self.next_reload:
+            self.load()
+
+    def retired(self, key: SigningKey, now: float) -> bool:
+        """ A key is retired once a newer key has signed for longer than a token
+            lives, since every token it signed has then expired """
+        return any(
+            k.activates > key.activates and k.activates + self.token_lifetime <= now
+            for k in self.keys.values()
+        )
+
+    def signing_key(self, now: Optional[float] = None) -> SigningKey:
+        """ Get the newest active key, creating the first key if there are none """
+        now = time.time() if now is None else now
+        self.maybe_reload()
+        active = [k for k in self.keys.values() if k.activates <= now]
+        if not active:
+            self.rotate(now=now, force=True)
+            active = [k for k in self.keys.values() if k.activates <= now]
+        return max(active, key=lambda k: k.activates)
+
+    def verification_keys(self, now: Optional[float] = None) -> List[SigningKey]:
+        """ Get the keys tokens may have been, or soon will be, signed with """
+        now = time.time() if now is None else now
+        self.maybe_reload()
+        keys = [k for k in self.keys.values() if not self.retired(k, now)]
+        return sorted(keys, key=lambda k: k.activates, reverse=True)
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """ Check whether a new key should be published """
+        now = time.time() if now is None else now
+        if not self.keys:
+            return True
+        newest = max(k.activates for k in self.keys.values())
+        return newest + self.rotation_interval - self.publish_ahead <= now
+
+    def rotate(
+        self, now: Optional[float] = None, force: bool = False
+    ) -> Optional[SigningKey]:
+        """ Publish a new key if one is due, and delete retired keys.
+
+        Keyword Arguments:
+            now {Optional[float]} -- current unix time (default: {None})
+            force {bool} -- publish a new key even if one isn't due (default: {False})
+
+        Returns:
+            Optional[SigningKey] -- the new key, if one was published
+        """
+        now = time.time() if now is None else now
+        self.load()
+
+        key = None
+        if force or self.due(now):
+            # the first key signs right away, later keys once verifiers have them
+            signing = any(k.activates <= now for k in self.keys.values())
+            activates = now + self.publish_ahead if signing else now
+            key = self.create(activates)
+
+        self.prune(now)
+        return key
+
+    def create(self, activates: float) -> SigningKey:
+        kid = make_kid(activates)
+        pem = GENERATORS[self.algorithm]()
+        key = SigningKey(kid, pem, self.algorithm)
+
+        # written aside and moved into place, so other processes never read a
+        # partial key
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f"{kid}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        tmp.replace(self.directory / f"{kid}.pem")
+
+        self.keys[kid] = key
+        logger.warning(f"created signing key {kid}")
+        return key
+
+    def prune(self, now: Optional[float] = None):
+        """ Delete retired keys """
+        now = time.time() if now is None else now
+        for kid, key in list(self.keys.items()):
+            if self.retired(key, now):
+                (self.directory / f"{kid}.pem").unlink(missing_ok=True)
+                del self.keys[kid]
+                logger.warning(f"deleted retired signing key {kid}")
+
+    def sign(self, claims: Dict[str, Any]) -> str:
+        key = self.signing_key()
+        return jwt.encode(
+            claims, key.private, algorithm=self.algorithm, headers={"kid": key.kid}
+        )
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """ Verify a token signed with one of the keys, returning its claims.
+
+        Raises:
+            jwt.JWTError: if the token is invalid, expired, or signed with an
+                unknown key
+
+        Returns:
+            Dict[str, Any] -- the token's claims
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        self.maybe_reload()
+        key = self.keys.get(kid)
+        if key is None and time.monotonic() - self.loaded_at >= 1:
+            # possibly created by another process since the last reload
+            self.load()
+            key = self.keys.get(kid)
+        if key is None:
+            raise jwt.JWTError(f"Unknown signing key: {kid}")
+        return jwt.decode(token, key.public, algorithms=[self.algorithm])
+
+    def jwks(self, now: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """ Get the public keys as a JSON Web Key Set """
+        return {"keys": [k.to_jwk() for k in self.verification_keys(now)]}
+
+
+keyring = KeyRing(
+    conf.JWT_KEYS_DIR,
+    algorithm=conf.JWT_ALGORITHM,
+    rotation_interval=conf.JWT_KEY_ROTATION_DAYS * 86400,
+    publish_ahead=conf.JWKS_MAX_AGE,
+    token_lifetime=conf.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    reload_interval=conf.JWT_KEY_RELOAD_INTERVAL,
+)
@@ -0,0 +1,261 @@
+""" Rate limiting: token buckets and sliding window counters, keyed by client.
+
+    A rule limits the requests made with one identity of the client, e.g. its ip
+    address, the username it's logging in as, or the user its token was issued to.
+    Rules are written as "<identity>:<count>/<period>", optionally followed by
+    ":window":
+
+    - ip:20/minute is a token bucket holding 20 tokens, refilled at 20 per
+      minute. It allows bursts of up to 20 requests, then one every 3 seconds.
+    - username:50/hour:window is a sliding window counter allowing 50 requests in
+      any hour. It bounds the total over a longer period than a bucket refills in.
+
+    Limit state is kept by a backend. MemoryBackend keeps it per process, which
+    bounds each process's load. Backends shared by every process (e.g. on redis)
+    enforce a limit across all of them; they implement RateLimitBackend and are
+    selected with RATE_LIMIT_BACKEND.
+"""
+
+import importlib
+import logging
+import math
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from util.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "Rule",
+    "parse_rules",
+    "RateLimitBackend",
+    "MemoryBackend",
+    "RateLimiter",
+    "load_backend",
+    "retry_after",
+]
+
+PERIODS: Dict[str, float] = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+IDENTITIES = ("ip", "username", "client_id", "user")
+
+
+class Rule(NamedTuple):
+    """ A limit on the requests made with one identity of a client """
+
+    identity: str
+    count: int
+    period: float
+    window: bool = False
+
+    def __str__(self) -> str:
+        period = next((k for k, v in PERIODS.items() if v == self.period), self.period)
+        kind = ":window" if self.window else ""
+        return f"{self.identity}:{self.count}/{period}{kind}"
+
+    @property
+    def rate(self) -> float:
+        """ Tokens added to the rule's buckets per second """
+        return self.count / self.period
+
+
+def parse_rule(spec: str) -> Rule:
+    """ Parse a rule from its spec, e.g. "ip:20/minute" or "username:50/hour:window" """
+    try:
+        identity, limit, *kind = spec.strip().split(":")
+        count, period = limit.split("/")
+        rule = Rule(identity, int(count), PERIODS[period], window=kind == ["window"])
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"Invalid rate limit rule: {spec!r}") from e
+
+    if rule.identity not in IDENTITIES or kind not in ([], ["window"]):
+        raise ValueError(f"Invalid rate limit rule: {spec!r}")
+    if rule.count <= 0:
+        raise ValueError(f"Rate limit must allow at least one request: {spec!r}")
+    return rule
+
+
+def parse_rules(specs: str) -> List[Rule]:
+    """ Parse a comma separated list of rules """
+    return [parse_rule(spec) for spec in specs.split(",") if spec.strip()]
+
+
+class RateLimitBackend:
+    """ Storage of the state of each rate limit. """
+
+    async def acquire(self, limits: Sequence[Tuple[str, Rule]], now: float) -> float:
+        """ Record a request against each of its limits, but only if every limit
+            allows it: a rejected request doesn't use up any limit's budget. Shared
+            backends should check and record the limits atomically.
+
+        Arguments:
+            limits {Sequence[Tuple[str, Rule]]} -- key of each limit's state, and
+                its rule
+            now {float} -- current unix time
+
+        Returns:
+            float -- seconds until every limit would allow the request, or zero if
+                it was allowed and recorded
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """ In-process backend. Keys are kept in an LRU cache, so a flood of distinct
+        keys evicts the oldest state instead of exhausting memory. Limits are
+        checked and recorded without yielding to the event loop, so concurrent
+        requests can't both pass a check before either is recorded. """
+
+    def __init__(self, maxsize: int = 100_000):
+        # key -> (tokens, updated)
+        self.buckets: LRUCache[Tuple[float, float]] = LRUCache(
+            maxsize=maxsize, name="ratelimit_buckets"
+        )
+        # key -> (window start, previous window's count, current window's count)
+        self.windows: LRUCache[Tuple[float, int, int]] = LRUCache(
+            maxsize=maxsize, name="ratelimit_windows"
+        )
+
+    def bucket(self, key: str, rule: Rule, now: float) -> Tuple[float, Any]:
+        """ Check a token bucket holding up to rule.count tokens, refilled at
+            rule.rate tokens per second. Returns the wait for a token, and the
+            bucket's state once the token is taken. """
+        tokens, updated = self.buckets.get(key) or (float(rule.count), now)
+        tokens = min(float(rule.count), tokens + (now - updated) * rule.rate)
+        if tokens >= 1:
+            return 0.0, (tokens - 1, now)
+        return (1 - tokens) / rule.rate, None
+
+    def window(self, key: str, rule: Rule, now: float) -> Tuple[float, Any]:
+        """ Check a sliding window allowing rule.count requests per rule.period.
+            Returns the wait for the window to allow a request, and the window's
+            state once the request is counted. """
+        # approximates a sliding window by weighting the previous fixed window's
+        # count by how much of it the sliding window still overlaps
+        limit, period = rule.count, rule.period
+        start = now - now % period
+        started, previous, current = self.windows.get(key) or (start, 0, 0)
+        if started != start:
+            previous = current if start - started == period else 0
+            current = 0
+
+        overlap = 1 - (now - start) / period
+        if previous * overlap + current + 1 > limit:
+            if current + 1 > limit or not previous:
+                return start + period - now, None
+            # until enough of the previous window's requests have slid out
+            needed = (previous * overlap + current + 1 - limit) / previous
+            return min(needed * period, start + period - now), None
+        return 0.0, (start, previous, current + 1)
+
+    async def acquire(self, limits: Sequence[Tuple[str, Rule]], now: float) -> float:
+        checked = []
+        wait = 0.0
+        for key, rule in limits:
+            if rule.window:
+                checked.append((self.windows, key, *self.window(key, rule, now)))
+            else:
+                checked.append((self.buckets, key, *self.bucket(key, rule, now)))
+            wait = max(wait, checked[-1][2])
+
+        if wait > 0:
+            return wait
+        for states, key, _, state in checked:
+            states.set(key, state)
+        return 0.0
+
+    def clear(self):
+        self.buckets.clear()
+        self.windows.clear()
+
+
+def load_backend(path: str) -> RateLimitBackend:
+    """ Create a backend from its import path, e.g. util.ratelimit.MemoryBackend """
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)()
+
+
+class RateLimiter:
+    """ Checks a request against the rules of its route.
+
+    Example:
+    >>> limiter = RateLimiter(MemoryBackend(), default=parse_rules("ip:2/minute"))
+    >>> await limiter.check("GET", "/api/v1/users", {"ip": "10.0.0.1"})
+    >>> 0.0
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        default: Iterable[Rule] = (),
+        routes: Dict[str, Iterable[Rule]] = None,
+    ):
+        self.backend = backend
+        self.default = list(default)
+        # "<METHOD> <path>" -> rules, in addition to the default rules
+        self.routes = {route: list(rules) for route, rules in (routes or {}).items()}
+        self.rejected = 0
+
+    def __repr__(self):
+        return f"RateLimiter(routes={len(self.routes)}, rejected={self.rejected})"
+
+    def rules(self, method: str, path: str) -> List[Tuple[str, Rule]]:
+        """ Get the rules applying to a route, with the scope of their state """
+        route = f"{method} {path}"
+        rules = [("*", rule) for rule in self.default]
+        rules += [(route, rule) for rule in self.routes.get(route, ())]
+        return rules
+
+    def identities(self, method: str, path: str) -> set:
+        """ Get the identities the rules of a route are keyed by """
+        return {rule.identity for _, rule in self.rules(method, path)}
+
+    async def check(
+        self,
+        method: str,
+        path: str,
+        identities: Dict[str, Optional[str]],
+        now: Optional[float] = None,
+    ) -> float:
+        """ Record a request against every rule of its route, if every rule allows
+            it. A rejected request isn't recorded against any rule, so it doesn't
+            use up the budgets of the rules it passed.
+
+        Arguments:
+            method {str} -- request method
+            path {str} -- request path
+            identities {Dict[str, Optional[str]]} -- the client's identities. Rules
+                keyed by an identity the client doesn't have are skipped.
+
+        Returns:
+            float -- seconds until the request would be allowed, or zero if it's
+                allowed now
+        """
+        now = time.time() if now is None else now
+        limits = []
+        for scope, rule in self.rules(method, path):
+            value = identities.get(rule.identity)
+            if value is not None:
+                limits.append((f"{scope}|{rule}|{value}", rule))
+        if not limits:
+            return 0.0
+
+        wait = await self.backend.acquire(limits, now)
+        if wait > 0:
+            self.rejected += 1
+            logger.info(f"rate limited {method} {path} ({identities.get('ip')})")
+        return wait
+
+
+def retry_after(wait: float) -> str:
+    """ Format a wait as a Retry-After header value, in whole seconds """
+    return str(max(math.ceil(wait), 1))
@@ -0,0 +1,184 @@
+""" Revocation of access tokens that are otherwise still valid.
+
+    Access tokens carry the claims needed to authorize most requests (see
+    api.helpers.auth), so they're trusted until they expire without reading the
+    user. Tokens are revoked individually by their id (jti), e.g. on logout, or for
+    a subject as of a point in time, e.g. when a user is deactivated, loses
+    privileges or changes their password. Either way, entries are only kept until
+    every token they could match has expired, so the list stays small.
+
+    Every request checks its token against the list, and nearly every token isn't
+    revoked. A Bloom filter over the revoked token ids and subjects answers those
+    negative lookups without touching the exact entries, which are only consulted
+    to rule out the filter's false positives. Revocations are stored in the
+    revocations table (see db.models.Revocation), and each process applies the
+    rows added since it last polled the table.
+"""
+
+import hashlib
+import logging
+import math
+import time
+from typing import Dict, Iterator, Optional
+
+import config as conf
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["BloomFilter", "RevocationList", "revocations"]
+
+
+class BloomFilter:
+    """ Set membership with false positives, but no false negatives, in a fixed
+        number of bits. Sized to hold capacity keys at the given false positive
+        rate; the rate grows as more keys are added.
+
+    Example:
+    >>> bloom = BloomFilter(capacity=1000, error_rate=0.001)
+    >>> bloom.add("t:9c1f")
+    >>> "t:9c1f" in bloom
+    >>> True
+    """
+
+    __slots__ = ("capacity", "error_rate", "size", "hashes", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        # optimal number of bits and hash functions for the capacity and rate
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __repr__(self):
+        return f"BloomFilter(count={self.count}, capacity={self.capacity})"
+
+    def __len__(self) -> int:
+        return self.count
+
+    def positions(self, key: str) -> Iterator[int]:
+        # derive every position from two halves of one digest (double hashing)
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self.positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # inlined positions(), returning at the first unset bit: most lookups miss
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def saturated(self) -> bool:
+        return self.count > self.capacity
+
+
+class RevocationList:
+    """ Revoked token ids and subjects, checked against a token's claims.
+
+    Example:
+    >>> revocations = RevocationList(max_token_age=3600)
+    >>> revocations.revoke_subject("7")
+    >>> revocations.is_revoked(jti="9c1f...", sub="7", iat=issued_before_revoking)
+    >>> True
+    """
+
+    def __init__(
+        self,
+        max_token_age: float,
+        capacity: int = 100_000,
+        error_rate: float = 0.001,
+        prune_interval: float = 60,
+    ):
+        self.max_token_age = max_token_age
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.prune_interval = prune_interval
+        # token id -> token expiration
+        self.tokens: Dict[str, float] = {}
+        # subject -> time before which its tokens are revoked
+        self.subjects: Dict[str, float] = {}
+        self.bloom = BloomFilter(capacity, error_rate)
+        # id of the last row of the revocations table applied to the list
+        self.cursor = 0
+        self.next_prune = time.monotonic() + prune_interval
+
+    def __repr__(self):
+        tokens, subjects = len(self.tokens), len(self.subjects)
+        return f"RevocationList(tokens={tokens}, subjects={subjects})"
+
+    def __len__(self) -> int:
+        return len(self.tokens) + len(self.subjects)
+
+    def revoke_token(self, jti: str, exp: float):
+        """ Revoke a single token until it expires """
+        self.tokens[jti] = exp
+        self.bloom.add(f"t:{jti}")
+        self.maybe_prune()
+
+    def revoke_subject(self, sub: str, at: Optional[float] = None):
+        """ Revoke every token issued to a subject before the given time (default:
+            now). Tokens issued afterwards, e.g. by logging in again, are valid. """
+        at = time.time() if at is None else at
+        self.subjects[str(sub)] = max(at, self.subjects.get(str(sub), at))
+        self.bloom.add(f"s:{sub}")
+        self.maybe_prune()
+
+    def is_revoked(self, jti: Optional[str], sub: str, iat: Optional[float]) -> bool:
+        """ Check a token's claims against the revocations. Tokens without an
+            issue time are treated as issued before any revocation. """
+        bloom = self.bloom
+        if jti is not None and f"t:{jti}" in bloom and jti in self.tokens:
+            return True
+        if f"s:{sub}" not in bloom:
+            return False
+        revoked_at = self.subjects.get(str(sub))
+        return revoked_at is not None and (iat is None or iat <= revoked_at)
+
+    def maybe_prune(self):
+        if self.bloom.saturated or time.monotonic() >= self.next_prune:
+            self.prune()
+
+    def prune(self, now: Optional[float] = None):
+        """ Forget revocations that can no longer match an unexpired token, and
+            rebuild the Bloom filter without them, since keys can't be removed from
+            it. The filter grows if the remaining entries would saturate it. """
+        self.next_prune = time.monotonic() + self.prune_interval
+        now = time.time() if now is None else now
+        self.tokens = {jti: exp for jti, exp in self.tokens.items() if exp > now}
+        oldest = now - self.max_token_age
+        self.subjects = {s: at for s, at in self.subjects.items() if at > oldest}
+
+        bloom = BloomFilter(max(self.capacity, 2 * len(self)), self.error_rate)
+        for jti in self.tokens:
+            bloom.add(f"t:{jti}")
+        for sub in self.subjects:
+            bloom.add(f"s:{sub}")
+        self.bloom = bloom
+
+    def clear(self):
+        self.tokens.clear()
+        self.subjects.clear()
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.cursor = 0
+
+
+revocations = RevocationList(
+    max_token_age=conf.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    capacity=conf.REVOCATION_BLOOM_CAPACITY,
+    error_rate=conf.REVOCATION_BLOOM_ERROR_RATE,
+)
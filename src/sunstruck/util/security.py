@@ -1,12 +1,20 @@
+import asyncio
+import hashlib
+import hmac
 import logging
+import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
 import config as conf
+from exc import PasswordHashQueueFull
 from util.dt import utcnow
+from util.keys import keyring
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +25,16 @@ ALGORITHM = "HS256"
 
 
 def create_access_token(
-    subject: Union[str, Any], expires_delta: timedelta = None, secret: str = None
+    subject: Union[str, Any],
+    expires_delta: timedelta = None,
+    secret: str = None,
+    claims: Dict[str, Any] = None,
 ) -> str:
-    """ Generate a JWT access token.
+    """ Generate a JWT access token. Every token has a unique id (jti) and the time
+        it was issued (iat, with sub-second precision), so it can be revoked
+        individually or along with every token issued to its subject before a point
+        in time (see util.revocation). Tokens are signed with the current signing
+        key (see util.keys), unless an extra secret is given.
 
     Arguments:
         subject {Union[str, Any]} -- the subject of the key's purpose.
@@ -28,21 +43,58 @@ def create_access_token(
         expires_delta {timedelta} -- duration the key should remain active (default: {None})
         secret {str} -- an extra secret to augment the system-wide secret key.
             For example, a user's email address or hashed_password. (default: {None})
+        claims {Dict[str, Any]} -- additional claims to include, e.g. the scope
+            and privileges of the subject (default: {None})
 
 
     Returns:
         str -- [description]
     """
-    expire = utcnow() + (
+    now = utcnow()
+    expire = now + (
         expires_delta or timedelta(minutes=conf.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    to_encode = {"exp": expire, "sub": str(subject)}
-    secret = f"{conf.SECRET_KEY}{secret or ''}"
+    to_encode = {
+        **(claims or {}),
+        "exp": expire,
+        "iat": now.timestamp(),
+        "jti": uuid.uuid4().hex,
+        "sub": str(subject),
+    }
+    if secret is None:
+        return keyring.sign(to_encode)
+
+    secret = f"{conf.SECRET_KEY}{secret}"
     encoded_jwt = jwt.encode(to_encode, secret, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def decode_token(token: str, secret: str = None) -> Dict[str, Union[str, int]]:
+    """ Verify an access token and return its claims. Access tokens are verified
+        with the signing key they name (kid). Tokens issued with an extra secret
+        are verified as by decode_secret_token. Access tokens signed with the
+        secret key alone, as issued before signing keys were introduced, are only
+        accepted if JWT_ACCEPT_LEGACY_TOKENS is set.
+
+    Raises:
+        jwt.JWTError: if the token is invalid or expired
+    """
+    if secret is not None:
+        return decode_secret_token(token, secret)
+    if "kid" in jwt.get_unverified_header(token):
+        return keyring.verify(token)
+    if not conf.JWT_ACCEPT_LEGACY_TOKENS:
+        raise jwt.JWTError("Token isn't signed with a signing key")
+    return decode_secret_token(token)
+
+
+def decode_secret_token(token: str, secret: str = None) -> Dict[str, Union[str, int]]:
+    """ Verify a token signed with the secret key, augmented by the extra secret if
+        given, e.g. a password reset token, and return its claims.
+
+    Raises:
+        jwt.JWTError: if the token is invalid or expired
+    """
     return jwt.decode(token, f"{conf.SECRET_KEY}{secret or ''}", algorithms=[ALGORITHM])
 
 
@@ -54,6 +106,186 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+T = TypeVar("T")
+
+
+class HashExecutor:
+    """ Bounded thread pool for password hashing. bcrypt is deliberately slow (on
+        the order of 100ms per hash), so hashing on the event loop would stall every
+        other request on the worker. The bcrypt backend releases the GIL while
+        hashing, so threads hash in parallel without blocking the loop.
+
+        At most max_pending hashes may be waiting for or running on a worker; more
+        are rejected with PasswordHashQueueFull rather than queueing without bound
+        during a burst of logins.
+
+    Example:
+    >>> await hash_executor.run(pwd_context.hash, "password")
+    >>> hash_executor.info()
+    >>> {'workers': 8, 'max_pending': 256, 'pending': 0, 'queued': 0, 'peak': 1, ...}
+    """
+
+    def __init__(self, workers: int = 0, max_pending: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peak = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __repr__(self):
+        return f"HashExecutor({self.info()})"
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # created on first use, so importing this module doesn't start threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        """ Number of hashes waiting for a free worker """
+        return max(self.pending - self.workers, 0)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """ Run fn(*args) on a worker thread.
+
+        Raises:
+            PasswordHashQueueFull: max_pending hashes are already pending
+        """
+        if self.max_pending and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashQueueFull(
+                f"{self.pending} password hashes are already pending"
+            )
+
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(fn, *args)
+        self.pending += 1
+        self.peak = max(self.peak, self.pending)
+        # a job keeps running on its thread if the awaiting request is cancelled,
+        # so it stays pending until the thread is done with it. Registered before
+        # the future is wrapped, so the count is updated before the caller resumes.
+        future.add_done_callback(
+            lambda f: loop.is_closed() or loop.call_soon_threadsafe(self._done, f)
+        )
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _done(self, future: Future):
+        self.pending -= 1
+        if not future.cancelled():
+            self.completed += 1
+
+    def info(self) -> Dict[str, int]:
+        """ Get the executor's queue depth and throughput counters """
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": self.queued,
+            "peak": self.peak,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+hash_executor = HashExecutor(
+    workers=conf.PASSWORD_HASH_WORKERS, max_pending=conf.PASSWORD_HASH_MAX_PENDING
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """ Verify a password on the hash executor, without blocking the event loop """
+    return await hash_executor.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """ Hash a password on the hash executor, without blocking the event loop """
+    return await hash_executor.run(get_password_hash, password)
+
+
+# --- client secrets --------------------------------------------------------- #
+
+# Client secrets are generated with 512 bits of entropy (see
+# schemas.ClientCredentialsCreateIn), so unlike passwords they can't be guessed and
+# don't need a deliberately slow hash. They're hashed with HMAC-SHA256 keyed by a
+# pepper derived from SECRET_KEY, which takes microseconds instead of bcrypt's
+# ~100ms, and leaked hashes are useless without the key.
+#
+# Hashes are stored as $<scheme>$<version>$<digest>. The version identifies how the
+# pepper is derived, so it can change without invalidating existing hashes.
+# Secrets hashed with bcrypt, before this scheme existed, are still verified and
+# should be rehashed once verified (see client_secret_needs_update).
+
+CLIENT_SECRET_SCHEME = "hmac-sha256"
+CLIENT_SECRET_VERSION = 1
+
+
+def client_secret_pepper(version: int = CLIENT_SECRET_VERSION) -> bytes:
+    """ Derive the key used to hash client secrets from SECRET_KEY. The key is
+        derived rather than used directly, so the key signing tokens is never used
+        to hash anything else. """
+    if version != 1:
+        raise ValueError(f"unknown client secret hash version: {version}")
+    return hmac.new(
+        str(conf.SECRET_KEY).encode(), b"oauth2-client-secret", hashlib.sha256
+    ).digest()
+
+
+def hash_client_secret(secret: str, version: int = CLIENT_SECRET_VERSION) -> str:
+    """ Hash a client secret with the current client secret scheme.
+
+    Example:
+    >>> hash_client_secret("3f9a...")
+    >>> '$hmac-sha256$1$5d41402abc4b2a76b9719d911017c592...'
+    """
+    digest = hmac.new(
+        client_secret_pepper(version), secret.encode(), hashlib.sha256
+    ).hexdigest()
+    return f"${CLIENT_SECRET_SCHEME}${version}${digest}"
+
+
+def parse_client_secret_hash(hashed: str) -> Optional[int]:
+    """ Get the version of a client secret hash, or None if it wasn't hashed with
+        the client secret scheme (e.g. a legacy bcrypt hash) """
+    _, scheme, version, _ = (hashed.split("$", 3) + ["", "", ""])[:4]
+    if scheme != CLIENT_SECRET_SCHEME or not version.isdigit():
+        return None
+    return int(version)
+
+
+def client_secret_needs_update(hashed: str) -> bool:
+    """ True if a client secret hash should be replaced with one using the current
+        scheme and version """
+    return parse_client_secret_hash(hashed) != CLIENT_SECRET_VERSION
+
+
+async def verify_client_secret(secret: str, hashed: str) -> bool:
+    """ Verify a client secret against its hash. Hashes of the client secret
+        scheme are compared in constant time on the event loop, since they're
+        cheap. Legacy bcrypt hashes are verified on the hash executor.
+    """
+    version = parse_client_secret_hash(hashed)
+    if version is None:
+        return await verify_password_async(secret, hashed)
+
+    try:
+        expected = hash_client_secret(secret, version=version)
+    except ValueError as e:
+        logger.warning(f"can't verify client secret: {e}")
+        return False
+    return hmac.compare_digest(expected, hashed)
+
+
 def generate_password_reset_token(
     email: str, expires_delta: timedelta = None, secret: str = None
 ) -> str:
@@ -117,7 +349,7 @@ def verify_password_reset_token(token: str, secret: str = None) -> Optional[Dict
             was successful.
     """
     try:
-        content = decode_token(token, secret=secret)
+        content = decode_secret_token(token, secret=secret)
         return content
     except jwt.JWTError as e:
         using_extra_secret = secret is not None
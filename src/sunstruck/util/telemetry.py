@@ -0,0 +1,236 @@
+""" In-process usage telemetry: counters and latency histograms per key.
+
+    Each process records into its own Telemetry instance and periodically writes a
+    snapshot to a json file named after its pid, so the snapshots of every worker
+    can be read and merged by another process (e.g. sunstruck db advise-indexes)
+    without a metrics backend.
+"""
+
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["UsageKey", "Histogram", "UsageStats", "Telemetry", "load"]
+
+# upper bounds of the latency histogram buckets, in seconds. Latencies above the
+# last bound are counted in an overflow bucket.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class UsageKey(NamedTuple):
+    """ Identifies how a model's data was queried: the model's table, the field,
+        and the filter operator (or "sort" if the field was sorted by) """
+
+    table: str
+    field: str
+    operator: str
+
+
+class Histogram:
+    """ Fixed bucket latency histogram
+
+    Example:
+    >>> h = Histogram()
+    >>> h.observe(0.012)
+    >>> h.quantile(0.5)
+    >>> 0.025
+    """
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """ Estimate a quantile as the upper bound of the bucket it falls in.
+            Quantiles in the overflow bucket are reported as the mean of the
+            histogram or the last bound, whichever is greater. """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return max(self.mean, BUCKETS[-1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counts": self.counts, "count": self.count, "total": self.total}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        histogram = cls()
+        if len(data["counts"]) == len(histogram.counts):
+            histogram.counts = list(data["counts"])
+        else:  # written with different buckets, only the totals are comparable
+            histogram.counts[-1] = data["count"]
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        return histogram
+
+
+class UsageStats:
+    """ Number of times a key was used, and the latency of the queries using it """
+
+    __slots__ = ("uses", "latency")
+
+    def __init__(self):
+        self.uses = 0
+        self.latency = Histogram()
+
+    def merge(self, other: "UsageStats"):
+        self.uses += other.uses
+        self.latency.merge(other.latency)
+
+
+class Telemetry:
+    """ Usage counters and latency histograms, keyed by UsageKey.
+
+    Example:
+    >>> telemetry = Telemetry()
+    >>> key = UsageKey("users", "email", "eq")
+    >>> telemetry.count([key])
+    >>> with telemetry.timed([key]):
+            await run_query()
+    >>> telemetry.stats[key].latency.quantile(0.95)
+    >>> 0.01
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        flush_interval: float = 60,
+        enabled: bool = True,
+    ):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.stats: Dict[UsageKey, UsageStats] = {}
+        self.next_flush = time.monotonic() + flush_interval
+
+    def __repr__(self):
+        return f"Telemetry(keys={len(self.stats)}, directory={self.directory})"
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def get(self, key: UsageKey) -> UsageStats:
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = UsageStats()
+        return stats
+
+    def count(self, keys: Iterable[UsageKey]):
+        """ Count one use of each key """
+        if not self.enabled:
+            return
+        for key in keys:
+            self.get(key).uses += 1
+
+    def observe(self, keys: Iterable[UsageKey], seconds: float):
+        """ Record the latency of a query using each of the keys """
+        if not self.enabled:
+            return
+        for key in keys:
+            self.get(key).latency.observe(seconds)
+        self.maybe_flush()
+
+    @contextmanager
+    def timed(self, keys: Iterable[UsageKey]) -> Iterator[None]:
+        """ Record the latency of the wrapped block for each of the keys. Nothing is
+            recorded if the block raises. """
+        keys = tuple(keys)
+        if not keys or not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        yield
+        self.observe(keys, time.perf_counter() - start)
+
+    def clear(self):
+        self.stats.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """ Get the recorded stats as a json serializable list """
+        return [
+            {**key._asdict(), "uses": s.uses, "latency": s.latency.to_dict()}
+            for key, s in self.stats.items()
+        ]
+
+    @property
+    def path(self) -> Optional[Path]:
+        if self.directory is None:
+            return None
+        return self.directory / f"telemetry-{os.getpid()}.json"
+
+    def maybe_flush(self):
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def flush(self):
+        """ Write a snapshot to the telemetry directory, replacing this process's
+            previous snapshot. Snapshots are cumulative, so a failed write only
+            delays the next one. """
+        self.next_flush = time.monotonic() + self.flush_interval
+        path = self.path
+        if path is None or not self.stats:
+            return
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.snapshot()))
+            tmp.replace(path)
+        except OSError as e:
+            logger.warning(f"failed writing telemetry to {path}: {e}")
+
+
+def load(directory: Union[str, Path]) -> Dict[UsageKey, UsageStats]:
+    """ Read and merge the snapshots written to a telemetry directory.
+
+    Arguments:
+        directory {Union[str, Path]} -- directory the snapshots were written to
+
+    Returns:
+        Dict[UsageKey, UsageStats] -- merged stats of every snapshot
+    """
+    merged: Dict[UsageKey, UsageStats] = {}
+    for path in sorted(Path(directory).glob("telemetry-*.json")):
+        try:
+            records = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"skipping unreadable telemetry snapshot {path}: {e}")
+            continue
+
+        for record in records:
+            key = UsageKey(record["table"], record["field"], record["operator"])
+            stats = UsageStats()
+            stats.uses = record["uses"]
+            stats.latency = Histogram.from_dict(record["latency"])
+            merged.setdefault(key, UsageStats()).merge(stats)
+
+    return merged
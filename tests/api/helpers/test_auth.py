@@ -0,0 +1,228 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import SecurityScopes
+
+import api.helpers.auth as auth
+import config as conf
+from api.helpers.auth import (
+    get_active_claims,
+    get_current_claims,
+    get_current_user,
+    get_superuser_claims,
+    token_cache,
+    verify_access_token,
+)
+from db.models import User
+from db.models.users import user_cache
+from util import security
+from util.revocation import revocations
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    token_cache.clear()
+    user_cache.clear()
+    revocations.clear()
+    yield
+    token_cache.clear()
+    user_cache.clear()
+    revocations.clear()
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """ Count the tokens decoded by python-jose """
+    calls = []
+    decode = auth.jwt.decode
+
+    def counted(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counted)
+    yield calls
+
+
+class TestVerifyAccessToken:
+    async def test_verified_tokens_are_cached(self, decodes):
+        token = security.create_access_token(7)
+
+        assert verify_access_token(token).sub == 7
+        assert verify_access_token(token).sub == 7
+        assert len(decodes) == 1
+        assert token_cache.info()["hits"] == 1
+
+    async def test_expired_entries_are_verified_again(self, decodes):
+        token = security.create_access_token(7, expires_delta=timedelta(minutes=1))
+        verify_access_token(token)
+
+        # age the cached entry past its expiration
+        key, (_, claims) = next(iter(token_cache._data.items()))
+        token_cache.set(key, (0.0, claims))
+
+        assert verify_access_token(token).sub == 7
+        assert len(decodes) == 2
+
+    @pytest.mark.parametrize(
+        "token",
+        [
+            "not.a.token",
+            security.create_access_token(7, secret="another key"),
+            security.create_access_token(7, expires_delta=timedelta(minutes=-1)),
+        ],
+    )
+    async def test_invalid_tokens_are_rejected(self, token):
+        with pytest.raises(HTTPException) as exc:
+            verify_access_token(token)
+        assert exc.value.status_code == 403
+        assert len(token_cache) == 0
+
+    async def test_revoked_tokens_are_rejected(self):
+        token = security.create_access_token(7)
+        claims = verify_access_token(token)
+
+        revocations.revoke_token(claims.jti, claims.exp)
+        with pytest.raises(HTTPException) as exc:
+            verify_access_token(token)
+        assert exc.value.status_code == 401
+
+        # other tokens of the subject remain valid
+        assert verify_access_token(security.create_access_token(7)).sub == 7
+
+    async def test_revoked_subjects_are_rejected(self):
+        token = security.create_access_token(7)
+        verify_access_token(token)
+
+        revocations.revoke_subject(7)
+        with pytest.raises(HTTPException) as exc:
+            verify_access_token(token)
+        assert exc.value.status_code == 401
+
+        # tokens issued after the revocation are valid
+        assert verify_access_token(security.create_access_token(7)).sub == 7
+
+
+class TestClaims:
+    async def test_scopes(self):
+        token = security.create_access_token(7, claims={"scope": "users:read me"})
+
+        claims = get_current_claims(SecurityScopes(["users:read"]), token)
+        assert claims.sub == 7
+        assert claims.scopes == ["users:read", "me"]
+
+        with pytest.raises(HTTPException) as exc:
+            get_current_claims(SecurityScopes(["users:write"]), token)
+        assert exc.value.status_code == 403
+
+    async def test_active(self):
+        claims = verify_access_token(
+            security.create_access_token(
+                7, claims={"active": True, "is_superuser": False}
+            )
+        )
+        assert await get_active_claims(claims) is claims
+
+        claims = verify_access_token(
+            security.create_access_token(
+                7, claims={"active": False, "is_superuser": False}
+            )
+        )
+        with pytest.raises(HTTPException) as exc:
+            await get_active_claims(claims)
+        assert exc.value.status_code == 400
+
+    async def test_claims_missing_from_legacy_tokens_are_read(self, bind):
+        master = await User.get_by_username(conf.MASTER_USERNAME)
+        claims = verify_access_token(security.create_access_token(master.id))
+        assert claims.active is None
+
+        claims = await get_active_claims(claims)
+        assert claims.active is True
+        assert claims.is_superuser is master.is_superuser
+
+    async def test_superuser(self):
+        claims = verify_access_token(
+            security.create_access_token(
+                7, claims={"active": True, "is_superuser": True}
+            )
+        )
+        assert get_superuser_claims(claims) is claims
+
+        claims = verify_access_token(
+            security.create_access_token(
+                7, claims={"active": True, "is_superuser": False}
+            )
+        )
+        with pytest.raises(HTTPException) as exc:
+            get_superuser_claims(claims)
+        assert exc.value.status_code == 400
+
+
+class TestGetCurrentUser:
+    async def test_user_is_cached(self, bind, monkeypatch):
+        master = await User.get_by_username(conf.MASTER_USERNAME)
+        token = security.create_access_token(master.id)
+
+        first = await get_current_user(token)
+        second = await get_current_user(token)
+        assert first is second
+        assert first.id == master.id
+        assert user_cache.info()["hits"] == 1
+
+    async def test_update_invalidates_cached_user(self, bind):
+        master = await User.get_by_username(conf.MASTER_USERNAME)
+        token = security.create_access_token(master.id)
+
+        user = await get_current_user(token)
+        await user.update(first_name="updated")
+        assert master.id not in user_cache
+
+        assert (await get_current_user(token)).first_name == "updated"
+
+    async def test_deactivating_revokes_tokens(self, bind):
+        user = await User.create(
+            username="deactivated", email="deactivated@example.com", password="x"
+        )
+        token = security.create_access_token(user.id)
+        await get_current_user(token)
+
+        await user.update(is_active=False)
+        with pytest.raises(HTTPException) as exc:
+            await get_current_user(token)
+        assert exc.value.status_code == 401
+        await user.delete()
+
+    async def test_unchanged_fields_do_not_revoke_tokens(self, bind):
+        user = await User.create(
+            username="unchanged", email="unchanged@example.com", password="x"
+        )
+        token = security.create_access_token(user.id)
+
+        # as sent by a PUT that only changes the email
+        await user.update(
+            email="changed@example.com",
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            password=None,
+        )
+        assert (await get_current_user(token)).email == "changed@example.com"
+        await user.delete()
+
+    async def test_cache_expires(self, bind, monkeypatch):
+        master = await User.get_by_username(conf.MASTER_USERNAME)
+        token = security.create_access_token(master.id)
+        monkeypatch.setattr(conf, "AUTH_USER_CACHE_TTL", 0)
+
+        first = await get_current_user(token)
+        assert first is not await get_current_user(token)
+        assert master.id not in user_cache
+
+    async def test_missing_user(self, bind):
+        token = security.create_access_token(999999)
+        with pytest.raises(HTTPException) as exc:
+            await get_current_user(token)
+        assert exc.value.status_code == 404
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+from api.helpers.conditional import (
+    http_date,
+    is_not_modified,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+
+modified = datetime(2020, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def make_request(method: str = "GET", **headers) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": method,
+            "path": "/",
+            "query_string": b"",
+            "headers": [
+                (k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()
+            ],
+        }
+    )
+
+
+class TestMakeEtag:
+    def test_weak(self):
+        etag = make_etag("users", 1, modified)
+        assert etag.startswith('W/"') and etag.endswith('"')
+
+    def test_stable(self):
+        assert make_etag("users", 1, modified) == make_etag("users", 1, modified)
+
+    @pytest.mark.parametrize(
+        "parts", [("users", 2, modified), ("users", 1, modified + timedelta(1))]
+    )
+    def test_changes_with_parts(self, parts):
+        assert make_etag("users", 1, modified) != make_etag(*parts)
+
+
+class TestIsNotModified:
+    etag = make_etag("users", 1, modified)
+
+    def test_no_conditional_headers(self):
+        assert is_not_modified(make_request(), self.etag, modified) is False
+
+    @pytest.mark.parametrize(
+        "header",
+        [etag, etag[2:], f'"other", {etag}', "*"],
+        ids=["weak", "strong", "list", "wildcard"],
+    )
+    def test_if_none_match(self, header):
+        request = make_request(if_none_match=header)
+        assert is_not_modified(request, self.etag, modified) is True
+
+    def test_if_none_match_stale(self):
+        request = make_request(if_none_match='W/"other"')
+        assert is_not_modified(request, self.etag, modified) is False
+
+    def test_if_none_match_takes_precedence(self):
+        request = make_request(
+            if_none_match='W/"other"', if_modified_since=http_date(modified)
+        )
+        assert is_not_modified(request, self.etag, modified) is False
+
+    def test_if_modified_since(self):
+        request = make_request(if_modified_since=http_date(modified))
+        assert is_not_modified(request, self.etag, modified) is True
+
+    def test_if_modified_since_stale(self):
+        since = http_date(modified - timedelta(seconds=1))
+        request = make_request(if_modified_since=since)
+        assert is_not_modified(request, self.etag, modified) is False
+
+    def test_if_modified_since_naive(self):
+        request = make_request(if_modified_since=http_date(modified))
+        naive = modified.replace(tzinfo=None)
+        assert is_not_modified(request, self.etag, naive) is True
+
+    def test_if_modified_since_invalid(self):
+        request = make_request(if_modified_since="yesterday")
+        assert is_not_modified(request, self.etag, modified) is False
+
+    def test_unsafe_method(self):
+        request = make_request("PUT", if_none_match=self.etag)
+        assert is_not_modified(request, self.etag, modified) is False
+
+
+class TestResponses:
+    def test_set_validators(self):
+        response = set_validators(Response(), 'W/"abc"', modified)
+        assert response.headers["etag"] == 'W/"abc"'
+        assert response.headers["last-modified"] == "Wed, 01 Jan 2020 12:30:15 GMT"
+
+    def test_set_validators_without_last_modified(self):
+        response = set_validators(Response(), 'W/"abc"')
+        assert "last-modified" not in response.headers
+
+    def test_not_modified(self):
+        response = not_modified('W/"abc"', modified)
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == 'W/"abc"'
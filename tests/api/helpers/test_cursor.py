@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from api.helpers.cursor import Cursor, _b64encode, _sign, decode_cursor, encode_cursor
+from exc import InvalidCursorError
+from tests.fixtures.models import TestModel as Model
+
+
+class TestCursor:
+    def test_roundtrip(self):
+        ts = datetime(2020, 1, 1, 12, 30, tzinfo=timezone.utc)
+        token = encode_cursor(("created_at", "id"), (ts, 42), desc=True)
+        cursor = decode_cursor(token)
+
+        assert cursor == Cursor(("created_at", "id"), (ts.isoformat(), 42), True)
+        assert cursor.coerce(Model.c.coercers) == (ts, 42)
+
+    def test_roundtrip_mixed_directions(self):
+        token = encode_cursor(("username", "id"), ("bob", 42), desc=[False, True])
+        assert decode_cursor(token).desc == (False, True)
+
+    def test_single_direction_applies_to_every_key(self):
+        assert Cursor(("username", "id"), ("bob", 42), True).desc == (True, True)
+
+    def test_reject_single_direction(self):
+        payload = b'{"k":["id"],"v":[10],"d":1}'
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(_b64encode(payload + _sign(payload)))
+
+    def test_reject_mismatched_directions(self):
+        payload = b'{"k":["username","id"],"v":["bob",10],"d":[1]}'
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(_b64encode(payload + _sign(payload)))
+
+    def test_url_safe(self):
+        token = encode_cursor(("id",), (2 ** 40,), desc=False)
+        assert all(c.isalnum() or c in "-_" for c in token)
+
+    def test_reject_tampered_cursor(self):
+        token = encode_cursor(("id",), (10,), desc=False)
+        forged = encode_cursor(("id",), (10,), desc=False, secret="not-the-secret")
+
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(forged)
+
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(token[:-1] + ("A" if token[-1] != "A" else "B"))
+
+    @pytest.mark.parametrize("token", ["", "abc", "!!!!", "e30"])
+    def test_reject_malformed_cursor(self, token):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(token)
+
+    def test_reject_uncoercible_value(self):
+        cursor = decode_cursor(encode_cursor(("id",), ("abc",), desc=False))
+        with pytest.raises(InvalidCursorError):
+            cursor.coerce(Model.c.coercers)
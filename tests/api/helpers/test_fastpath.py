@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+from pydantic import Field, validator
+
+from api.helpers.fastpath import encode_rows, fast_path_fields
+from schemas.bases import ORMBase
+from schemas.user import UserCreateIn, UserOut
+from tests.fixtures.models import TestModel as Model
+
+
+class TestFastPathFields:
+    def test_matching_schema(self):
+        assert fast_path_fields(UserOut, Model) == tuple(UserOut.__fields__)
+
+    def test_unknown_column(self):
+        class Schema(ORMBase):
+            nickname: Optional[str]
+
+        assert fast_path_fields(Schema, Model) is None
+
+    def test_aliased_field(self):
+        assert fast_path_fields(UserCreateIn, Model) is None
+
+    def test_mismatched_type(self):
+        class Schema(ORMBase):
+            username: int
+
+        assert fast_path_fields(Schema, Model) is None
+
+    def test_validated_field(self):
+        class Schema(ORMBase):
+            username: str = Field(...)
+
+            @validator("username")
+            def upper(cls, v):
+                return v.upper()
+
+        assert fast_path_fields(Schema, Model) is None
+
+
+class TestEncodeRows:
+    def test_matches_response_model(self):
+        now = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        row = (1, "bob", "bob@example.com", now, now.replace(tzinfo=None))
+        fields = ("id", "username", "email", "created_at", "updated_at")
+
+        class Schema(ORMBase):
+            username: str
+            email: str
+
+        expected = orjson.loads(Schema(**dict(zip(fields, row))).json())
+        assert orjson.loads(encode_rows([row], fields)) == [expected]
+
+    def test_ignores_trailing_values(self):
+        assert encode_rows([(1, "sort key")], ("id",)) == b'[{"id":1}]'
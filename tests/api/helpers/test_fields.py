@@ -0,0 +1,41 @@
+import pytest
+from fastapi import HTTPException
+
+from api.helpers.fields import parse_fields, partial_schema, sparse_response
+from schemas.user import UserOut
+from tests.fixtures.models import TestModel as Model
+
+
+class TestParseFields:
+    @pytest.mark.parametrize("fields", [None, ""])
+    def test_no_fields(self, fields):
+        assert parse_fields(fields, UserOut, Model) is None
+
+    def test_schema_order_and_unique(self):
+        assert parse_fields("email, id,email", UserOut, Model) == ("email", "id")
+
+    @pytest.mark.parametrize("fields", ["hashed_password", "id,nope", ",", "id;drop"])
+    def test_reject_invalid_fields(self, fields):
+        with pytest.raises(HTTPException) as exc:
+            parse_fields(fields, UserOut, Model)
+        assert exc.value.status_code == 422
+
+
+class TestPartialSchema:
+    def test_only_requested_fields(self):
+        schema = partial_schema(UserOut, ("id", "username"))
+        assert list(schema.__fields__) == ["username", "id"]
+        assert schema.__name__ == "UserOutPartial"
+
+    def test_cached(self):
+        assert partial_schema(UserOut, ("id",)) is partial_schema(UserOut, ("id",))
+
+    def test_validators_carried_over(self):
+        schema = partial_schema(UserOut, ("id", "created_at"))
+        obj = schema(id=1, created_at="2020-01-01T00:00:00")
+        assert obj.created_at.tzinfo is not None
+
+    def test_sparse_response(self):
+        schema = partial_schema(UserOut, ("id",))
+        response = sparse_response([schema(id=1), schema(id=2)])
+        assert response.body == b'[{"id":1},{"id":2}]'
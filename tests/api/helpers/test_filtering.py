@@ -73,6 +73,18 @@ DataFrame output of parsing multiple queries:
 
 """  # noqa
 
+import pytest
+from sqlalchemy import Column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from api.helpers.filter_parser import FilterTerm, parse
+from api.helpers.filtering import Filter, search, telemetry
+from const import FilterOperator
+from exc import FilterSyntaxError
+from tests.fixtures.models import TestModel as Model
+from util.telemetry import UsageKey
+
 # import itertools
 # import pandas as pd
 # from api.helpers import pattern
@@ -150,3 +162,209 @@ DataFrame output of parsing multiple queries:
 # pd.options.display.max_colwidth = 100
 
 # pd.DataFrame(records)
+
+
+class TestFilterCache:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        Filter.cache.clear()
+        yield
+        Filter.cache.clear()
+
+    def test_repeated_filter_hits_cache(self):
+        first = Filter(Model)("id:lte:5")
+        second = Filter(Model)("id:lte:5")
+
+        assert first is second
+        assert Filter.cache_info()["hits"] == 1
+        assert Filter.cache_info()["misses"] == 1
+
+    def test_distinct_filters_miss(self):
+        Filter(Model)("id:lte:5")
+        Filter(Model)("id:lte:6")
+
+        assert Filter.cache_info()["misses"] == 2
+        assert Filter.cache_info()["currsize"] == 2
+
+    def test_predicate_uses_bind_parameters(self):
+        predicate = Filter(Model)("id:lte:5")
+        assert "5" not in str(predicate.compile())
+
+
+class TestFilterTelemetry:
+    @pytest.fixture(autouse=True)
+    def clear(self):
+        Filter.cache.clear()
+        telemetry.clear()
+        yield
+        Filter.cache.clear()
+        telemetry.clear()
+
+    def test_translate_records_usage(self):
+        filt = Filter(Model)
+        filt.translate(parse("id:gte:1:lte:5|username:like:a%"))
+
+        table = Model.__table__.name
+        assert filt.usage == (
+            UsageKey(table, "id", "gte"),
+            UsageKey(table, "id", "lte"),
+            UsageKey(table, "username", "like"),
+        )
+        assert all(telemetry.stats[key].uses == 1 for key in filt.usage)
+
+    def test_cache_hits_are_counted(self):
+        Filter(Model)("id:lte:5")
+        cached = Filter(Model)
+        cached("id:lte:5")
+
+        key = UsageKey(Model.__table__.name, "id", "lte")
+        assert Filter.cache_info()["hits"] == 1
+        assert cached.usage == (key,)
+        assert telemetry.stats[key].uses == 2
+
+    def test_negated_operator(self):
+        filt = Filter(Model)
+        filt.translate(parse("id:~in:1,2"))
+        assert filt.usage == (UsageKey(Model.__table__.name, "id", "~in"),)
+
+
+class TestFilterParser:
+    def test_single_term(self):
+        assert parse("field:gte:7") == [
+            FilterTerm(None, "field", ":", False, FilterOperator.GTE, "7", position=0)
+        ]
+
+    def test_compound(self):
+        terms = parse(
+            'field:gte:7|other_field:~in:a,b,c:another_field:between:"2020-01-01T17:22:20.937752,2020-01-31T17:22:20.937752"'  # noqa
+        )
+        assert [t.field for t in terms] == ["field", "other_field", "another_field"]
+        assert [t.conjunctive for t in terms] == [None, "|", ":"]
+        assert [t.op for t in terms] == ["gte", "~in", "between"]
+        assert terms[1].values == ("a", "b", "c")
+        assert terms[2].values == (
+            "2020-01-01T17:22:20.937752",
+            "2020-01-31T17:22:20.937752",
+        )
+        assert terms[2].quoted
+
+    @pytest.mark.parametrize(
+        "s,seps",
+        [
+            ("field:gt:7|lt:14", [":", "|"]),
+            ("field:gte:7:lte:14", [":", ":"]),
+            ("field:~in:a,b,c|~in:1,2,3", [":", "|"]),
+        ],
+    )
+    def test_chained_terms(self, s, seps):
+        terms = parse(s)
+        assert [t.field for t in terms] == ["field", None]
+        assert [t.sep for t in terms] == seps
+
+    @pytest.mark.parametrize(
+        "s,expected",
+        [
+            ('field:like:"mui:bueno"', "mui:bueno"),
+            ('field:like:"*mui|bueno"', "*mui|bueno"),
+            ("field:eq:'single'", "single"),
+            (r'field:eq:"escaped \" quote"', 'escaped " quote'),
+        ],
+    )
+    def test_quoted_values(self, s, expected):
+        assert parse(s)[0].value == expected
+
+    @pytest.mark.parametrize(
+        "s,position",
+        [
+            ("field:regex:1", 6),
+            ("field:eq", 8),
+            ('field:eq:"abc', 9),
+            ("~field:eq:1", 0),
+            ("field:eq:", 9),
+            ("field::eq:1", 6),
+            ("field:eq:a'b", 10),
+        ],
+    )
+    def test_syntax_errors_report_position(self, s, position):
+        with pytest.raises(FilterSyntaxError) as exc:
+            parse(s)
+        assert exc.value.position == position
+
+    @pytest.mark.parametrize(
+        "s,position", [("id:between:1", 0), ("id:gt:0:id:between:1,2,3", 8)]
+    )
+    def test_between_takes_two_values(self, s, position):
+        with pytest.raises(FilterSyntaxError) as exc:
+            parse(s)
+        assert exc.value.position == position
+        assert "between" in str(exc.value)
+
+    def test_max_length(self):
+        with pytest.raises(FilterSyntaxError):
+            parse("field:eq:" + "a" * 100, max_length=50)
+
+    def test_max_terms(self):
+        with pytest.raises(FilterSyntaxError):
+            parse("field:gt:1" + "|lt:2" * 5, max_terms=5)
+
+    def test_long_input_is_linear(self):
+        # the replaced regex took seconds to reject input like this
+        with pytest.raises(FilterSyntaxError):
+            parse("a" * 100_000, max_length=100_000)
+
+
+class TestFilterTranslation:
+    def compile(self, predicate):
+        return predicate.compile(dialect=postgresql.dialect())
+
+    def test_values_are_coerced_to_column_type(self):
+        compiled = self.compile(Filter(Model).translate(parse("id:in:1,2,3")))
+        assert list(compiled.params.values()) == [[1, 2, 3]]
+
+    def test_small_in_list_uses_in(self):
+        compiled = self.compile(Filter(Model).translate(parse("id:in:1,2,3")))
+        assert " IN " in str(compiled)
+
+    @pytest.mark.parametrize("op,sql", [("in", "= ANY"), ("~in", "!= ALL")])
+    def test_large_in_list_uses_single_array_param(self, conf, op, sql):
+        values = ",".join(str(x) for x in range(conf.FILTER_ARRAY_THRESHOLD))
+        compiled = self.compile(Filter(Model).translate(parse(f"id:{op}:{values}")))
+
+        assert sql in str(compiled)
+        assert len(compiled.params) == 1
+        assert list(compiled.params.values())[0] == list(
+            range(conf.FILTER_ARRAY_THRESHOLD)
+        )
+
+    def test_is_null(self):
+        compiled = self.compile(Filter(Model).translate(parse("is_active:is:null")))
+        assert "IS NULL" in str(compiled)
+
+    def test_invalid_value_raises_syntax_error(self):
+        with pytest.raises(FilterSyntaxError) as exc:
+            Filter(Model).translate(parse("username:eq:a:id:eq:abc"))
+        assert exc.value.position == 14
+
+    def test_unknown_field_raises_syntax_error(self):
+        with pytest.raises(FilterSyntaxError):
+            Filter(Model).translate(parse("fake_column:eq:1"))
+
+    @pytest.mark.parametrize(
+        "s,sql",
+        [
+            ("username:ilike:%bob%", "test.username ILIKE"),
+            ("username:~ilike:%bob%", "test.username NOT ILIKE"),
+            ("username:search:bob", "test.username %%"),
+            ("username:~search:bob", "NOT (test.username %%"),
+        ],
+    )
+    def test_text_search_operators(self, s, sql):
+        compiled = self.compile(Filter(Model).translate(parse(s)))
+        assert sql in str(compiled)
+
+    def test_search_tsvector_column(self):
+        column = Column("document", TSVECTOR)
+        compiled = self.compile(search(column, "john smith"))
+
+        assert "document @@ websearch_to_tsquery('simple'," in str(compiled)
+        assert list(compiled.params.values()) == ["john smith"]
@@ -0,0 +1,97 @@
+import pytest
+from fastapi import HTTPException
+
+import api.helpers.guard as guard
+from api.helpers.guard import (
+    PlanEstimate,
+    check_budget,
+    estimate_plan,
+    filter_shape,
+    get_budget,
+    plan_cache,
+)
+from db.explain import PlanBudget
+from tests.fixtures.models import TestModel as Model
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    """ Replace EXPLAIN with a fixed plan, recording each planned statement """
+    planned = []
+
+    async def explain(statement):
+        planned.append(statement)
+        return {"Total Cost": 500.0, "Plan Rows": 2000}
+
+    monkeypatch.setattr(guard, "explain", explain)
+    plan_cache.clear()
+    yield planned
+    plan_cache.clear()
+
+
+class TestFilterShape:
+    def shape(self, predicate):
+        return filter_shape(Model.select(Model.id).where(predicate))
+
+    def test_values_share_shape(self):
+        assert self.shape(Model.username == "a") == self.shape(Model.username == "b")
+
+    def test_leading_wildcard_changes_shape(self):
+        assert self.shape(Model.username.like("a%")) != self.shape(
+            Model.username.like("%a%")
+        )
+
+    def test_list_length_magnitude_changes_shape(self):
+        assert self.shape(Model.id.in_([1, 2])) == self.shape(Model.id.in_([3, 4]))
+        assert self.shape(Model.id.in_([1, 2])) != self.shape(
+            Model.id.in_(list(range(1000)))
+        )
+
+
+class TestCheckBudget:
+    async def test_plan_is_cached_per_shape(self, plans):
+        await estimate_plan(Model, Model.username == "a")
+        estimate = await estimate_plan(Model, Model.username == "b")
+
+        assert estimate == PlanEstimate(cost=500.0, rows=2000)
+        assert len(plans) == 1
+
+    async def test_within_budget(self, plans):
+        budget = PlanBudget(cost=1000, rows=5000)
+        estimate = await check_budget(Model, Model.username == "a", budget)
+        assert estimate.cost == 500.0
+
+    @pytest.mark.parametrize(
+        "budget,reason",
+        [(PlanBudget(cost=100), "estimated cost"), (PlanBudget(rows=10), "2000 rows")],
+    )
+    async def test_over_budget(self, plans, budget, reason):
+        with pytest.raises(HTTPException) as exc:
+            await check_budget(Model, Model.username.like("%a%"), budget)
+
+        assert exc.value.status_code == 422
+        assert reason in exc.value.detail
+
+    async def test_unfiltered_queries_are_not_planned(self, plans):
+        assert await check_budget(Model, None, PlanBudget(cost=1)) is None
+        assert not plans
+
+    async def test_disabled_budget(self, plans):
+        assert await check_budget(Model, Model.id == 1, PlanBudget()) is None
+        assert not plans
+
+
+class TestGetBudget:
+    def test_explicit_budget(self):
+        budget = PlanBudget(cost=1)
+        assert get_budget(Model, budget) is budget
+
+    def test_model_budget(self, monkeypatch):
+        budget = PlanBudget(rows=1)
+        monkeypatch.setattr(Model, "__plan_budget__", budget, raising=False)
+        assert get_budget(Model) is budget
+
+    def test_default_budget(self):
+        assert get_budget(Model) is guard.default_budget
@@ -1,17 +1,29 @@
+import asyncio
+import csv
+import io
 import logging
 
+import orjson
 import pytest
 from async_asgi_testclient import TestClient
-from asyncpg.exceptions import UndefinedColumnError
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, HTTPException
 from httpx import URL
 from starlette.requests import Request
 from starlette.responses import Response
 
+import api.helpers.guard as guard
 from api.helpers import Pagination
+from api.helpers.filtering import telemetry
+from api.helpers.guard import plan_cache
+from api.helpers.pagination import row_estimates
+from const import CountStrategy
+from db import db
+from db.explain import PlanBudget
+from db.registry import ModelMetadata, registry
 from schemas.user import UserOut as ModelSchema
 from tests.fixtures.models import TestModel as Model
-from tests.utils import seed_model
+from tests.utils import rand_email, rand_str, seed_model
+from util.telemetry import UsageKey
 
 logger = logging.getLogger(__name__)
 
@@ -33,9 +45,7 @@ async def link_pager(
     response: Response, pagination: Pagination = Depends(Pagination), id: int = None,
 ):
     data, headers = await pagination.paginate_links(Model, serializer=ModelSchema)
-
-    response.headers["x-total-count"] = str(headers["x-total-count"])
-    response.headers["link"] = ",".join([x for x in headers["link"] if x is not None])
+    pagination.set_headers(response, headers)
     return data
 
 
@@ -96,7 +106,7 @@ class TestPaginationResponse:
 
     async def test_filtered_paginator(self):
         async with TestClient(app) as client:
-            response = await client.get("/test/pagination/?filter=id<16")
+            response = await client.get("/test/pagination/?filter=id:lt:16")
             assert response.status_code == 200
             response = response.json()
 
@@ -207,7 +217,7 @@ class TestPaginationCore:
             limit=limit,
             sort="created_at",
             desc=True,
-            filter="id < 11",
+            filter="id:lt:11",
         ).paginate(Model, serializer=ModelSchema)
 
         assert result["count"] == 10
@@ -224,7 +234,7 @@ class TestPaginationCore:
             limit=limit,
             sort="created_at",
             desc=True,
-            filter="id < 16",
+            filter="id:lt:16",
         ).paginate(Model, serializer=ModelSchema)
 
         assert result["count"] == 15
@@ -241,7 +251,7 @@ class TestPaginationCore:
             limit=limit,
             sort="created_at",
             desc=True,
-            filter="id <= 15",
+            filter="id:lte:15",
         ).paginate(Model, serializer=None)
 
         assert result["count"] == 15
@@ -250,22 +260,721 @@ class TestPaginationCore:
         assert len(result["data"]) == 3
 
     async def test_raise_undefined_column(self, bind, request_obj):
-        with pytest.raises(UndefinedColumnError):
-            limit = 3
-
-            result = await Pagination(
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(
                 request_obj,
                 offset=5,
-                limit=limit,
+                limit=3,
                 sort="created_at",
                 desc=True,
-                filter="fake_column <= 15",
+                filter="fake_column:lte:15",
+            ).paginate(Model, serializer=None)
+
+        assert exc.value.status_code == 422
+
+    @pytest.mark.parametrize(
+        "filter", ["id < 16", "id:lt:16; drop table test_model", "id:lt:'16"]
+    )
+    async def test_raise_malformed_filter(self, bind, request_obj, filter):
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(
+                request_obj, offset=0, limit=3, sort="id", desc=True, filter=filter,
+            ).paginate(Model, serializer=None)
+
+        assert exc.value.status_code == 422
+
+    @pytest.mark.parametrize("sort", ["fake_column", "id; drop table test_model"])
+    async def test_raise_invalid_sort(self, bind, request_obj, sort):
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(
+                request_obj, offset=0, limit=3, sort=sort, desc=True, filter="",
+            ).paginate(Model, serializer=None)
+
+        assert exc.value.status_code == 422
+
+    async def test_sort_restricted_to_sortable(self, bind, request_obj):
+        class RestrictedPagination(Pagination):
+            sortable = ["id"]
+
+        with pytest.raises(HTTPException):
+            await RestrictedPagination(
+                request_obj, offset=0, limit=3, sort="created_at", desc=True, filter=""
+            ).paginate(Model, serializer=None)
+
+        result = await RestrictedPagination(
+            request_obj, offset=0, limit=3, sort="id", desc=False, filter=""
+        ).paginate(Model, serializer=None)
+        assert [x.id for x in result["data"]] == [1, 2, 3]
+
+    async def test_filtered_query_uses_bound_parameters(self, bind, request_obj):
+        pagination = Pagination(
+            request_obj, offset=0, limit=3, sort="id", desc=True, filter="id:lt:16",
+        )
+        pagination.model = Model
+        predicate = pagination.predicate(pagination.filter)
+        assert "16" not in str(predicate)
+        assert list(predicate.compile().params.values()) == [16]
+
+
+class TestSorting:
+    async def test_prefix_overrides_desc(self, bind, request_obj):
+        result = await Pagination(
+            request_obj, limit=3, sort="-id", desc=False
+        ).paginate(Model, serializer=None)
+        assert [x.id for x in result["data"]] == [30, 29, 28]
+
+    async def test_multi_key_sort(self, bind, request_obj):
+        result = await Pagination(
+            request_obj, limit=-1, sort="is_active,-id"
+        ).paginate(Model, serializer=None)
+
+        rows = [(x.is_active, x.id) for x in result["data"]]
+        assert rows == sorted(rows, key=lambda x: (x[0], -x[1]))
+
+    @pytest.mark.parametrize(
+        "sort,expected",
+        [
+            ("is_active", {"is_active": True, "id": True}),
+            ("is_active,username", {"is_active": True, "username": True, "id": True}),
+            ("-is_active,username", {"is_active": True, "username": False, "id": True}),
+            ("username,-id", {"username": False, "id": True}),
+            ("", {"id": True}),
+        ],
+    )
+    async def test_primary_key_appended(self, bind, request_obj, sort, expected):
+        pagination = Pagination(request_obj, limit=5, sort=sort)
+        pagination.model = Model
+
+        columns = pagination.sort_columns()
+        assert [c.name for c in columns] == list(expected)
+        assert pagination.directions == expected
+
+    async def test_offset_pages_are_disjoint(self, bind, request_obj):
+        ids = []
+        for offset in range(0, 30, 7):
+            result = await Pagination(
+                request_obj, offset=offset, limit=7, sort="is_active"
             ).paginate(Model, serializer=None)
+            ids += [x.id for x in result["data"]]
+
+        assert sorted(ids) == list(range(1, 31))
+
+    async def test_raise_duplicate_sort(self, bind, request_obj):
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(request_obj, limit=3, sort="id,-id").paginate(Model)
+
+        assert exc.value.status_code == 422
+
+    async def test_sort_restricted_to_model_sortable(
+        self, bind, request_obj, monkeypatch
+    ):
+        monkeypatch.setattr(Model, "__sortable__", ("id",), raising=False)
+        monkeypatch.setitem(registry, Model, ModelMetadata(Model))
+
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(request_obj, limit=3, sort="username").paginate(Model)
+        assert exc.value.status_code == 422
+
+        result = await Pagination(request_obj, limit=3, sort="-id").paginate(Model)
+        assert [x.id for x in result["data"]] == [30, 29, 28]
+
+    async def test_reject_unindexed_sort_of_large_table(
+        self, bind, request_obj, conf, monkeypatch
+    ):
+        monkeypatch.setitem(
+            row_estimates, Model, (float("inf"), conf.PAGINATION_SORT_MAX_ROWS + 1)
+        )
+
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(request_obj, limit=3, sort="first_name").paginate(Model)
+        assert exc.value.status_code == 422
+
+        result = await Pagination(request_obj, limit=3, sort="username").paginate(
+            Model
+        )
+        assert len(result["data"]) == 3
+
+    async def test_unindexed_sort_of_small_table(
+        self, bind, request_obj, monkeypatch
+    ):
+        monkeypatch.setitem(row_estimates, Model, (float("inf"), 30))
+        result = await Pagination(request_obj, limit=3, sort="first_name").paginate(
+            Model
+        )
+        assert len(result["data"]) == 3
+
+    async def test_cursor_with_mixed_directions(self, bind, request_obj):
+        ids = []
+        cursor = ""
+        while cursor is not None:
+            pagination = Pagination(
+                request_obj, limit=7, sort="-is_active,id", cursor=cursor
+            )
+            result = await pagination.paginate(Model)
+            ids += [x.id for x in result["data"]]
+            cursor = pagination.next_cursor
+
+        assert sorted(ids) == list(range(1, 31))
+
+
+class TestCostGuard:
+    async def test_reject_expensive_filter(self, bind, request_obj):
+        class GuardedPagination(Pagination):
+            plan_budget = PlanBudget(cost=0.001)
+
+        with pytest.raises(HTTPException) as exc:
+            await GuardedPagination(
+                request_obj, limit=5, filter="username:like:%a%"
+            ).paginate(Model)
+
+        assert exc.value.status_code == 422
+        assert "too expensive" in exc.value.detail
+
+    async def test_unfiltered_query_is_not_guarded(self, bind, request_obj):
+        class GuardedPagination(Pagination):
+            plan_budget = PlanBudget(cost=0.001)
+
+        result = await GuardedPagination(request_obj, limit=5).paginate(Model)
+        assert len(result["data"]) == 5
+
+    async def test_throttle_expensive_filter(self, bind, request_obj):
+        class ThrottledPagination(Pagination):
+            plan_budget = PlanBudget(throttle_cost=0.001)
+
+        pagination = ThrottledPagination(request_obj, limit=5, filter="id:gt:0")
+        result = await pagination.paginate(Model)
+
+        assert pagination.throttled is True
+        assert len(result["data"]) == 5
+
+    async def test_filter_is_checked_once(self, bind, request_obj, monkeypatch):
+        class GuardedPagination(Pagination):
+            plan_budget = PlanBudget(cost=1e9)
+
+        planned = []
+
+        async def explain(statement):
+            planned.append(statement)
+            return {"Total Cost": 1.0, "Plan Rows": 1}
+
+        monkeypatch.setattr(guard, "explain", explain)
+        plan_cache.clear()
+        await GuardedPagination(request_obj, limit=5, filter="id:gt:0").respond(
+            Model, serializer=ModelSchema
+        )
+        plan_cache.clear()
+
+        assert len(planned) == 1
+
+
+class TestTelemetry:
+    @pytest.fixture(autouse=True)
+    def clear_telemetry(self):
+        telemetry.clear()
+        yield
+        telemetry.clear()
+
+    async def test_records_filter_and_sort_usage(self, bind, request_obj):
+        await Pagination(
+            request_obj, limit=5, filter="id:gt:0", sort="-username"
+        ).paginate(Model)
+
+        table = Model.__table__.name
+        for key in [UsageKey(table, "id", "gt"), UsageKey(table, "username", "sort")]:
+            assert telemetry.stats[key].uses == 1
+            assert telemetry.stats[key].latency.count == 1
+
+    async def test_tie_breaker_is_not_recorded(self, bind, request_obj):
+        await Pagination(request_obj, limit=5).paginate(Model)
+        assert len(telemetry) == 0
+
+
+class TestKeysetPagination:
+    async def test_follow_cursor_until_exhausted(self):
+        class KeysetPagination(Pagination):
+            keyset = True
+
+        app = FastAPI()
+
+        @app.get("/")
+        async def pager(
+            response: Response, pagination: KeysetPagination = Depends()
+        ):
+            data, headers = await pagination.paginate_links(
+                Model, serializer=ModelSchema
+            )
+            pagination.set_headers(response, headers)
+            return data
+
+        ids = []
+        async with TestClient(app) as client:
+            response = await client.get("/?limit=7&sort=created_at")
+            while True:
+                assert response.status_code == 200
+                assert int(response.headers["x-total-count"]) == 30
+                assert 'rel="prev"' not in response.headers["link"]
+                ids += [x["id"] for x in response.json()]
+
+                url = response.links.get("next", {}).get("url")
+                if not url:
+                    break
+                assert "cursor=" in url and "offset=" not in url
+                url = URL(url)
+                response = await client.get(f"{url.path}?{url.query}")
+
+        assert len(ids) == 30
+        assert len(set(ids)) == 30
+
+    async def test_cursor_pages_match_offset_pages(self, bind, request_obj):
+        by_offset = await Pagination(
+            request_obj, offset=0, limit=-1, sort="id", desc=True, filter="id:gt:5"
+        ).paginate(Model)
+
+        pagination = Pagination(
+            request_obj, limit=10, sort="id", desc=True, filter="id:gt:5", cursor=""
+        )
+        by_cursor = []
+        while True:
+            result = await pagination.paginate(Model)
+            assert result["count"] == 25
+            by_cursor += result["data"]
+            if pagination.next_cursor is None:
+                break
+            pagination = Pagination(
+                request_obj,
+                limit=10,
+                sort="id",
+                desc=True,
+                filter="id:gt:5",
+                cursor=pagination.next_cursor,
+            )
+
+        assert [x.id for x in by_cursor] == [x.id for x in by_offset["data"]]
+
+    @pytest.mark.parametrize("sort,desc", [("id", False), ("created_at", True)])
+    async def test_reject_cursor_for_other_sort(self, bind, request_obj, sort, desc):
+        pagination = Pagination(request_obj, limit=5, sort="id", desc=True, cursor="")
+        await pagination.paginate(Model)
+
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(
+                request_obj,
+                limit=5,
+                sort=sort,
+                desc=desc,
+                cursor=pagination.next_cursor,
+            ).paginate(Model)
+
+        assert exc.value.status_code == 422
+
+    async def test_reject_invalid_cursor(self, bind, request_obj):
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(
+                request_obj, limit=5, sort="id", cursor="not-a-cursor"
+            ).paginate(Model)
+
+        assert exc.value.status_code == 422
+
+
+class TestCountStrategy:
+    @pytest.mark.parametrize("strategy", list(CountStrategy))
+    @pytest.mark.parametrize(
+        "offset,limit,filter,expected_count,expected_len",
+        [(0, 10, "", 30, 10), (10, 10, "id:lte:15", 15, 5), (40, 10, "", 30, 0)],
+    )
+    async def test_strategies_agree(
+        self,
+        bind,
+        request_obj,
+        strategy,
+        offset,
+        limit,
+        filter,
+        expected_count,
+        expected_len,
+    ):
+        class CountingPagination(Pagination):
+            count_strategy = strategy
+
+        pagination = CountingPagination(
+            request_obj, offset=offset, limit=limit, sort="id", filter=filter
+        )
+        assert await pagination.get_count_strategy() == strategy
+
+        result = await pagination.paginate(Model)
+        assert result["count"] == expected_count
+        assert len(result["data"]) == expected_len
+
+    async def test_auto_strategy(self, bind, request_obj, conf, monkeypatch):
+        pagination = Pagination(request_obj, offset=0, limit=10, sort="id")
+        pagination.model = Model
+
+        monkeypatch.setitem(row_estimates, Model, (float("inf"), 30))
+        assert await pagination.get_count_strategy() == CountStrategy.WINDOW
+
+        monkeypatch.setitem(
+            row_estimates, Model, (float("inf"), conf.PAGINATION_WINDOW_MAX_ROWS + 1)
+        )
+        assert await pagination.get_count_strategy() == CountStrategy.CONCURRENT
+
+        pagination.limit = -1
+        assert await pagination.get_count_strategy() == CountStrategy.WINDOW
+
+    @pytest.mark.parametrize("count", ["exact", "estimate"])
+    async def test_concurrent_requests(self, bind, request_obj, monkeypatch, count):
+        # the count (or estimate) and page queries of several requests all run at
+        # once, so each needs its own session
+        class ConcurrentPagination(Pagination):
+            count_strategy = CountStrategy.CONCURRENT
+
+        monkeypatch.delitem(row_estimates, Model, raising=False)
+        results = await asyncio.gather(
+            *[
+                ConcurrentPagination(
+                    request_obj, offset=offset, limit=10, sort="id", count=count
+                ).paginate(Model)
+                for offset in (0, 10, 20, 30)
+            ]
+        )
+
+        assert [len(r["data"]) for r in results] == [10, 10, 10, 0]
+        if count == "exact":
+            assert all(r["count"] == 30 for r in results)
+
+    async def test_estimated_rows_cached(self, bind, request_obj, monkeypatch):
+        monkeypatch.delitem(row_estimates, Model, raising=False)
+        pagination = Pagination(request_obj, offset=0, limit=10)
+        pagination.model = Model
+
+        estimate = await pagination.estimated_rows()
+        assert isinstance(estimate, int)
+        assert row_estimates[Model][1] == estimate
+
+
+class TestCountMode:
+    async def test_follow_next_link_without_count(self):
+        async with TestClient(app) as client:
+            response = await client.get("/test/pagination/links/?limit=7&count=none")
+            pages = [response]
+            while response.links.get("next", {}).get("url"):
+                url = URL(response.links["next"]["url"])
+                response = await client.get(f"{url.path}?{url.query}")
+                pages.append(response)
+
+        assert all(r.status_code == 200 for r in pages)
+        assert all("x-total-count" not in r.headers for r in pages)
+        assert sum(len(r.json()) for r in pages) == 30
+        assert len(pages) == 5
+
+    @pytest.mark.parametrize(
+        "offset,has_next", [(0, True), (19, True), (20, False), (25, False)]
+    )
+    async def test_no_count_detects_next_page(
+        self, bind, request_obj, offset, has_next
+    ):
+        result = await Pagination(
+            request_obj, offset=offset, limit=10, sort="id", count="none"
+        ).paginate(Model)
+
+        assert result["count"] is None
+        assert (result["next"] is not None) is has_next
+        assert len(result["data"]) == min(10, 30 - offset)
+
+    async def test_estimated_count(self, bind, request_obj):
+        result, headers = await Pagination(
+            request_obj, offset=10, limit=10, sort="id", count="estimate"
+        ).paginate_links(Model)
+
+        assert "x-total-count" not in headers
+        # the estimate is never less than the rows known to exist
+        assert headers["x-estimated-count"] >= 21
+        assert len(result) == 10
+        assert len(headers["link"]) == 2
+
+    async def test_reject_unknown_count_mode(self):
+        async with TestClient(app) as client:
+            response = await client.get("/test/pagination/?count=sometimes")
+            assert response.status_code == 422
+
+
+class TestDeferredJoin:
+    @pytest.mark.parametrize("strategy", list(CountStrategy))
+    @pytest.mark.parametrize(
+        "offset,sort,desc,filter",
+        [(5, "id", True, ""), (10, "created_at", False, "id:gt:3"), (28, "", True, "")],
+    )
+    async def test_matches_plain_offset(
+        self, bind, request_obj, strategy, offset, sort, desc, filter
+    ):
+        class DeferredPagination(Pagination):
+            deferred_join_offset = 5
+            count_strategy = strategy
+
+        class PlainPagination(Pagination):
+            deferred_join_offset = None
+            count_strategy = strategy
+
+        kwargs = dict(offset=offset, limit=7, sort=sort or "id", desc=desc)
+        deferred = DeferredPagination(request_obj, filter=filter, **kwargs)
+        plain = PlainPagination(request_obj, filter=filter, **kwargs)
+
+        deferred_result = await deferred.paginate(Model)
+        plain_result = await plain.paginate(Model)
+
+        assert deferred.is_deferred
+        assert not plain.is_deferred
+        assert deferred_result["count"] == plain_result["count"]
+        assert [x.id for x in deferred_result["data"]] == [
+            x.id for x in plain_result["data"]
+        ]
+
+    async def test_not_deferred_below_threshold(self, request_obj):
+        class DeferredPagination(Pagination):
+            deferred_join_offset = 50
+
+        assert not DeferredPagination(request_obj, offset=49, limit=10).is_deferred
+        assert DeferredPagination(request_obj, offset=50, limit=10).is_deferred
+        assert not DeferredPagination(request_obj, offset=50, limit=-1).is_deferred
+
+    async def test_max_offset(self):
+        class CappedPagination(Pagination):
+            max_offset = 20
+
+        app = FastAPI()
+
+        @app.get("/")
+        async def pager(pagination: CappedPagination = Depends()):
+            return await pagination.paginate(Model, serializer=ModelSchema)
+
+        async with TestClient(app) as client:
+            assert (await client.get("/?offset=20")).status_code == 200
+            assert (await client.get("/?offset=21")).status_code == 422
+
+
+class TestSparseFieldsets:
+    @pytest.mark.parametrize("offset", [0, 10])
+    @pytest.mark.parametrize("strategy", list(CountStrategy))
+    async def test_select_fields(self, bind, request_obj, offset, strategy):
+        class SparsePagination(Pagination):
+            count_strategy = strategy
+            deferred_join_offset = 10
+
+        result = await SparsePagination(
+            request_obj,
+            offset=offset,
+            limit=5,
+            sort="created_at",
+            fields="id,email",
+        ).paginate(Model, serializer=ModelSchema)
+
+        assert result["count"] == 30
+        assert len(result["data"]) == 5
+        assert all(set(x.dict()) == {"id", "email"} for x in result["data"])
+
+    async def test_select_fields_by_cursor(self, bind, request_obj):
+        pagination = Pagination(
+            request_obj, limit=20, sort="created_at", fields="username", cursor=""
+        )
+        first = await pagination.paginate(Model, serializer=ModelSchema)
+        second = await Pagination(
+            request_obj,
+            limit=20,
+            sort="created_at",
+            fields="username",
+            cursor=pagination.next_cursor,
+        ).paginate(Model, serializer=ModelSchema)
+
+        assert len(first["data"]) + len(second["data"]) == 30
+        assert set(second["data"][0].dict()) == {"username"}
+
+    @pytest.mark.parametrize(
+        "fields,serializer", [("hashed_password", ModelSchema), ("id", None)]
+    )
+    async def test_reject_fields(self, bind, request_obj, fields, serializer):
+        with pytest.raises(HTTPException) as exc:
+            await Pagination(request_obj, limit=5, fields=fields).paginate(
+                Model, serializer=serializer
+            )
+        assert exc.value.status_code == 422
+
+
+class TestStreaming:
+    @pytest.fixture
+    def stream_app(self):
+        app = FastAPI()
+
+        @app.get("/")
+        async def pager(pagination: Pagination = Depends()):
+            if pagination.is_streaming:
+                return await pagination.stream(Model, serializer=ModelSchema)
+            return await pagination.paginate(Model, serializer=ModelSchema)
+
+        yield app
+
+    @pytest.mark.parametrize(
+        "query,headers",
+        [("&format=ndjson", {}), ("", {"accept": "application/x-ndjson"})],
+    )
+    async def test_stream_ndjson(self, stream_app, conf, monkeypatch, query, headers):
+        monkeypatch.setattr(conf, "PAGINATION_STREAM_CHUNK_SIZE", 7)
+
+        async with TestClient(stream_app) as client:
+            response = await client.get(f"/?limit=-1{query}", headers=headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = response.content.decode().splitlines()
+        assert len(lines) == 30
+        assert len({orjson.loads(x)["id"] for x in lines}) == 30
+
+    async def test_stream_csv_fields(self, stream_app):
+        async with TestClient(stream_app) as client:
+            response = await client.get(
+                "/?format=csv&fields=id,username&sort=id&desc=false&limit=10"
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "attachment" in response.headers["content-disposition"]
+        rows = list(csv.reader(io.StringIO(response.content.decode())))
+        assert rows[0] == ["username", "id"]
+        assert [int(r[1]) for r in rows[1:]] == list(range(1, 11))
+
+    async def test_stream_filtered_empty(self, stream_app):
+        async with TestClient(stream_app) as client:
+            response = await client.get("/?format=csv&filter=id:gt:1000")
+
+        assert response.status_code == 200
+        assert len(response.content.decode().splitlines()) == 1  # header only
+
+    async def test_reject_unknown_format(self, stream_app):
+        async with TestClient(stream_app) as client:
+            response = await client.get("/?format=xml")
+        assert response.status_code == 422
+
+
+class TestRespond:
+    @pytest.fixture
+    def respond_app(self):
+        app = FastAPI()
+
+        @app.get("/")
+        async def pager(pagination: Pagination = Depends()):
+            return await pagination.respond(Model, serializer=ModelSchema)
+
+        yield app
+
+    async def test_fast_path(self, respond_app):
+        async with TestClient(respond_app) as client:
+            response = await client.get("/?limit=10&sort=id&desc=false")
+
+        assert response.status_code == 200
+        assert response.headers["x-total-count"] == "30"
+        assert response.links["next"] is not None
+        data = response.json()
+        assert [x["id"] for x in data] == list(range(1, 11))
+        assert all(set(x) == set(ModelSchema.__fields__) for x in data)
+
+    async def test_fast_path_fields(self, respond_app):
+        async with TestClient(respond_app) as client:
+            response = await client.get("/?limit=3&fields=email,id")
+
+        assert response.status_code == 200
+        assert all(set(x) == {"id", "email"} for x in response.json())
+
+    async def test_fast_path_matches_serializer(self, bind, request_obj):
+        serialized = await Pagination(
+            request_obj, limit=10, sort="id", desc=False
+        ).paginate(Model, serializer=ModelSchema)
+
+        response = await Pagination(
+            request_obj, limit=10, sort="id", desc=False
+        ).respond(Model, serializer=ModelSchema)
+
+        assert orjson.loads(response.body) == [
+            orjson.loads(x.json()) for x in serialized["data"]
+        ]
+
+
+class TestConditionalRequests:
+    @pytest.fixture
+    def respond_app(self):
+        app = FastAPI()
+
+        @app.get("/")
+        async def pager(pagination: Pagination = Depends()):
+            return await pagination.respond(Model, serializer=ModelSchema)
+
+        yield app
+
+    async def test_validators(self, respond_app):
+        async with TestClient(respond_app) as client:
+            response = await client.get("/?limit=10")
+
+        assert response.status_code == 200
+        assert response.headers["etag"].startswith('W/"')
+        assert "last-modified" in response.headers
+
+    async def test_if_none_match(self, respond_app):
+        async with TestClient(respond_app) as client:
+            etag = (await client.get("/?limit=10")).headers["etag"]
+            response = await client.get("/?limit=10", headers={"if-none-match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    async def test_etag_varies_with_query(self, respond_app):
+        async with TestClient(respond_app) as client:
+            etag = (await client.get("/?limit=10")).headers["etag"]
+            response = await client.get("/?limit=5", headers={"if-none-match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    async def test_etag_varies_with_data(self, respond_app):
+        async with TestClient(respond_app) as client:
+            etag = (await client.get("/?limit=10")).headers["etag"]
+            await Model.create(username=rand_str(length=25), email=rand_email())
+            response = await client.get("/?limit=10", headers={"if-none-match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    async def test_if_modified_since(self, respond_app):
+        async with TestClient(respond_app) as client:
+            last_modified = (await client.get("/?limit=10")).headers["last-modified"]
+            response = await client.get(
+                "/?limit=10", headers={"if-modified-since": last_modified}
+            )
+
+        assert response.status_code == 304
+
+    @pytest.mark.parametrize("strategy", ["window", "concurrent"])
+    async def test_validated_while_counting(
+        self, bind, request_obj, monkeypatch, strategy
+    ):
+        monkeypatch.setattr(Pagination, "count_strategy", strategy)
+        pagination = Pagination(request_obj, limit=10)
+        _, headers = await pagination.paginate_links(Model, serializer=ModelSchema)
+
+        latest = await Model.agg.agg([db.func.max(Model.updated_at)])
+        assert headers["x-total-count"] == 30
+        assert pagination.last_modified == latest["max"]
+
+    @pytest.mark.parametrize("offset", [0, 1500])
+    async def test_validated_by_window_query(self, bind, request_obj, offset):
+        pagination = Pagination(request_obj, limit=10, offset=offset)
+        pagination.model = Model
+        stmt = pagination.statement(pagination.sort_columns(), windowed=True)
+        assert "max(test.updated_at) OVER ()" in str(stmt)
+
+    async def test_not_validated_without_exact_count(self, respond_app):
+        async with TestClient(respond_app) as client:
+            response = await client.get("/?limit=10&count=none")
 
-            assert result["count"] == 15
-            assert result["next"] is not None
-            assert result["prev"] is not None
-            assert len(result["data"]) == 3
+        assert response.status_code == 200
+        assert "etag" not in response.headers
 
 
 class TestPaginationWithLinks:
@@ -335,7 +1044,7 @@ class TestPaginationWithLinks:
             limit=limit,
             sort="created_at",
             desc=True,
-            filter=f"id <= {limit}",
+            filter=f"id:lte:{limit}",
         ).paginate_links(Model, serializer=ModelSchema)
 
         links = headers["link"]
@@ -357,7 +1066,7 @@ class TestPaginationWithLinks:
             limit=limit,
             sort="created_at",
             desc=True,
-            filter="id <= 15",
+            filter="id:lte:15",
         ).paginate_links(Model, serializer=ModelSchema)
 
         links = headers["link"]
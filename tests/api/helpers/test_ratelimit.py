@@ -0,0 +1,118 @@
+from urllib.parse import urlencode
+
+import pytest
+from starlette.responses import PlainTextResponse
+
+from api.helpers.ratelimit import RateLimitMiddleware
+from util.ratelimit import MemoryBackend, RateLimiter, parse_rules
+
+pytestmark = pytest.mark.asyncio
+
+
+class App:
+    """ Records the body each request reaches the app with """
+
+    def __init__(self):
+        self.bodies = []
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        self.bodies.append(body)
+        await PlainTextResponse("ok")(scope, receive, send)
+
+
+async def request(app, method="GET", path="/", body=b"", headers=None, ip="10.0.0.1"):
+    headers = [(k.encode(), v.encode()) for k, v in (headers or {}).items()]
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": headers,
+        "client": (ip, 50000),
+    }
+    # the body arrives in two chunks, like a streamed upload
+    chunks = [
+        {"type": "http.request", "body": body[:5], "more_body": True},
+        {"type": "http.request", "body": body[5:], "more_body": False},
+    ]
+
+    async def receive():
+        return chunks.pop(0)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+
+def login(username):
+    return {
+        "method": "POST",
+        "path": "/login",
+        "body": urlencode({"username": username, "password": "x"}).encode(),
+        "headers": {"content-type": "application/x-www-form-urlencoded"},
+    }
+
+
+@pytest.fixture
+def app():
+    return App()
+
+
+@pytest.fixture
+def middleware(app):
+    limiter = RateLimiter(
+        MemoryBackend(),
+        default=parse_rules("ip:3/minute"),
+        routes={"POST /login": parse_rules("username:2/minute")},
+    )
+    return RateLimitMiddleware(app, limiter=limiter)
+
+
+class TestRateLimitMiddleware:
+    async def test_rejects_with_retry_after(self, middleware):
+        for _ in range(3):
+            status, _ = await request(middleware)
+            assert status == 200
+
+        status, headers = await request(middleware)
+        assert status == 429
+        assert headers[b"retry-after"] == b"20"
+
+    async def test_clients_limited_separately(self, middleware):
+        for _ in range(3):
+            await request(middleware, ip="10.0.0.1")
+        status, _ = await request(middleware, ip="10.0.0.2")
+        assert status == 200
+
+    async def test_forwarded_for(self, app):
+        limiter = RateLimiter(MemoryBackend(), default=parse_rules("ip:1/minute"))
+        middleware = RateLimitMiddleware(app, limiter=limiter, trust_forwarded=True)
+
+        def forwarded(client):
+            return {"x-forwarded-for": f"{client}, 192.168.0.1"}
+
+        assert (await request(middleware, headers=forwarded("1.1.1.1")))[0] == 200
+        # spoofed leading addresses don't identify the client
+        assert (await request(middleware, headers=forwarded("2.2.2.2")))[0] == 429
+
+    async def test_login_limited_by_username(self, app, middleware):
+        assert (await request(middleware, ip="10.0.0.1", **login("alice")))[0] == 200
+        assert (await request(middleware, ip="10.0.0.2", **login("Alice")))[0] == 200
+        # from a third address, but for the same username
+        assert (await request(middleware, ip="10.0.0.3", **login("alice")))[0] == 429
+        assert (await request(middleware, ip="10.0.0.3", **login("bob")))[0] == 200
+
+    async def test_login_body_is_replayed(self, app, middleware):
+        params = login("alice")
+        await request(middleware, **params)
+        assert app.bodies == [params["body"]]
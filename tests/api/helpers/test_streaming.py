@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import pytest
+from starlette.requests import Request
+
+from api.helpers.streaming import CSVEncoder, encode_ndjson, negotiate_format
+from const import ResponseFormat
+
+
+def make_request(accept: str) -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+class TestNegotiateFormat:
+    @pytest.mark.parametrize(
+        "accept,expected",
+        [
+            ("", ResponseFormat.JSON),
+            ("*/*", ResponseFormat.JSON),
+            ("application/json", ResponseFormat.JSON),
+            ("application/x-ndjson", ResponseFormat.NDJSON),
+            ("text/html, application/ndjson;q=0.9", ResponseFormat.NDJSON),
+            ("text/csv; charset=utf-8", ResponseFormat.CSV),
+        ],
+    )
+    def test_accept_header(self, accept, expected):
+        assert negotiate_format(make_request(accept)) == expected
+
+    def test_format_overrides_accept(self):
+        request = make_request("text/csv")
+        assert negotiate_format(request, "ndjson") == ResponseFormat.NDJSON
+
+
+class TestEncoders:
+    def test_ndjson(self):
+        ts = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        encoded = encode_ndjson([{"id": 1, "ts": ts}, {"id": 2, "ts": None}])
+        assert encoded == (
+            b'{"id":1,"ts":"2020-01-01T00:00:00+00:00"}\n{"id":2,"ts":null}\n'
+        )
+
+    def test_csv_header_written_once(self):
+        encoder = CSVEncoder(["id", "username"])
+        first = encoder.encode([{"id": 1, "username": "bob"}])
+        second = encoder.encode([{"id": 2, "username": None}])
+        assert first == b"id,username\r\n1,bob\r\n"
+        assert second == b"2,\r\n"
@@ -6,7 +6,7 @@ from httpx import AsyncClient
 from jose import jwt
 
 import config as conf
-from db.models import User
+from db.models import OAuth2Client, User
 from sunstruck.main import app
 from tests.utils import rand_email, rand_str, unpack_fixture
 from util import security
@@ -44,6 +44,22 @@ class TestAccessToken:
         assert "access_token" in token_data.keys()
         assert token_data["access_token"]
 
+    async def test_token_claims(self, client):
+        user_data = {
+            "grant_type": "password",
+            "username": conf.MASTER_USERNAME,
+            "password": conf.MASTER_PASSWORD,
+            "scope": "users:read me",
+        }
+        response = await client.post(f"{v1}/login/access-token", data=user_data)
+        claims = jwt.get_unverified_claims(response.json()["access_token"])
+
+        assert claims["scope"] == "users:read me"
+        assert claims["is_superuser"] is True
+        assert claims["active"] is True
+        assert claims["jti"]
+        assert claims["iat"]
+
     async def test_client_credentials_flow(self, authorized_client):
 
         # Generate a set of client credentials
@@ -66,7 +82,58 @@ class TestAccessToken:
             assert token_data["access_token"]
 
 
+class TestLogout:
+    async def test_logout_revokes_token(self, authorized_client):
+        response = await authorized_client.post(f"{v1}/logout")
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await authorized_client.get(f"{v1}/credentials")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_logout_unauthenticated(self, client):
+        response = await client.post(f"{v1}/logout")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
 class TestClientCredentials:
+    async def test_secret_hashed_with_hmac(self, authorized_client):
+        credentials = (await authorized_client.post(f"{v1}/credentials")).json()
+
+        client = await OAuth2Client.get_by_client_id(credentials["client_id"])
+        assert client.hashed_client_secret.startswith("$hmac-sha256$")
+
+    async def test_legacy_secret_rehashed_on_login(self, bind):
+        owner = await User.get_by_username(conf.MASTER_USERNAME)
+        client_id, client_secret = rand_str(length=32), rand_str(length=64)
+        await OAuth2Client.create(
+            client_id=client_id,
+            hashed_client_secret=security.get_password_hash(client_secret),
+            owner_id=owner.id,
+        )
+
+        user = await OAuth2Client.authenticate(client_id, client_secret)
+        assert user.id == owner.id
+
+        client = await OAuth2Client.get_by_client_id(client_id)
+        assert not security.client_secret_needs_update(client.hashed_client_secret)
+        assert await OAuth2Client.authenticate(client_id, client_secret)
+        assert not await OAuth2Client.authenticate(client_id, "wrong")
+
+    async def test_get_by_client_id_and_owner(self, bind):
+        owner = await User.get_by_username(conf.MASTER_USERNAME)
+        client_ids = [rand_str(length=32) for _ in range(2)]
+        for client_id in client_ids:
+            await OAuth2Client.create(
+                client_id=client_id, client_secret=rand_str(), owner_id=owner.id
+            )
+
+        client = await OAuth2Client.get_by_client_id(client_ids[0])
+        assert client.owner_id == owner.id
+        assert await OAuth2Client.get_by_client_id(rand_str(length=32)) is None
+
+        clients = await OAuth2Client.get_by_owner(owner.id)
+        assert [c.client_id for c in clients] == client_ids
+
     async def test_create(self, authorized_client):
         response = await authorized_client.get(f"{v1}/credentials")
         assert response.json() == []
@@ -150,6 +217,56 @@ class TestUserSignup:
         assert response.status_code == status.HTTP_409_CONFLICT
         assert response.json()["detail"] == "Username taken"
 
+    @pytest.mark.parametrize("field", ["username", "email"])
+    async def test_registration_duplicate_field(
+        self, client, user_data, monkeypatch, field
+    ):
+        monkeypatch.setattr(conf, "USERS_OPEN_REGISTRATION", True, raising=True)
+        await client.post(f"{v1}/signup", json=user_data)
+
+        other = {
+            "username": rand_str(length=7),
+            "email": rand_email(min=5, max=5),
+            "password": rand_str(length=10),
+            field: user_data[field],
+        }
+        response = await client.post(f"{v1}/signup", json=other)
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+
+class TestUserAuthenticate:
+    async def test_username_or_email(self, bind, user_data):
+        user = await User.create(**user_data)
+
+        by_username = await User.authenticate(
+            user_data["username"], user_data["password"]
+        )
+        by_email = await User.authenticate(user_data["email"], user_data["password"])
+        assert by_username.id == by_email.id == user.id
+
+    async def test_get_by_email_and_username(self, bind, user_data):
+        user = await User.create(**user_data)
+
+        assert (await User.get_by_email(user_data["email"])).id == user.id
+        assert (await User.get_by_username(user_data["username"])).id == user.id
+        assert await User.get_by_email(rand_email()) is None
+        assert await User.get_by_username(rand_str(length=7)) is None
+
+    @pytest.mark.parametrize("prefer", ["username", "email"])
+    async def test_preference(self, bind, prefer):
+        # one user's username is another's email
+        value = rand_email(min=5, max=5)
+        by_username = await User.create(
+            username=value, email=rand_email(min=5, max=5), password="x"
+        )
+        by_email = await User.create(
+            username=rand_str(length=7), email=value, password="x"
+        )
+
+        user = await User.get_by_email_or_username(value, prefer=prefer)
+        expected = by_email if prefer == "email" else by_username
+        assert user.id == expected.id
+
 
 class TestRecoverPassword:
     async def test_user_exists(self, client, user_data, monkeypatch):
@@ -184,6 +301,50 @@ class TestResetPassword:
         response = await client.post(f"{v1}/reset-password", json=body)
         assert response.status_code == status.HTTP_200_OK
         assert response.json()["message"] == "Password update successful"
+        assert await User.authenticate(user_data["email"], "new_password")
+
+    async def test_recover_and_reset(self, client, user_data, monkeypatch):
+        monkeypatch.setattr(conf, "USERS_OPEN_REGISTRATION", True, raising=True)
+        response = await client.post(f"{v1}/signup", json=user_data)
+        assert response.status_code == status.HTTP_200_OK
+
+        def login(password):
+            data = {
+                "grant_type": "password",
+                "username": user_data["username"],
+                "password": password,
+            }
+            return client.post(f"{v1}/login/access-token", data=data)
+
+        access_token = (await login(user_data["password"])).json()["access_token"]
+
+        # capture the token the recovery email would have sent
+        sent = {}
+        monkeypatch.setattr(
+            security, "send_reset_password_email", lambda **kwargs: sent.update(kwargs)
+        )
+        response = await client.post(
+            f"{v1}/recover-password", json={"email": user_data["email"]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert sent["email_to"] == user_data["email"]
+
+        body = {"token": sent["token"], "new_password": "new_password"}
+        response = await client.post(f"{v1}/reset-password", json=body)
+        assert response.status_code == status.HTTP_200_OK
+
+        assert (await login("new_password")).status_code == status.HTTP_200_OK
+        response = await login(user_data["password"])
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # the token was signed with the old hash, so it can't be used again
+        response = await client.post(f"{v1}/reset-password", json=body)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # and tokens issued before the reset are revoked
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = await client.get(f"{v1}/users/me", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
     async def test_invalid_token(self, client, user_data, monkeypatch):
         monkeypatch.setattr(conf, "USERS_OPEN_REGISTRATION", True, raising=True)
@@ -11,4 +11,6 @@ pytestmark = pytest.mark.asyncio
 async def test_health_check(client):
     response = await client.get("/api/v1/health")
     assert response.status_code == codes.HTTP_200_OK
-    assert {"status": "ok"} == response.json()
+    data = response.json()
+    assert data["status"] == "ok"
+    assert {"pending", "queued", "rejected"} <= set(data["password_hashing"])
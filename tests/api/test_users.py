@@ -1,5 +1,6 @@
 import logging
 
+import orjson
 import pytest
 from fastapi import status
 
@@ -56,6 +57,63 @@ async def test_list_users(client):
     assert response.links["next"] is not None
 
 
+async def test_stream_users(client):
+    response = await client.get(
+        path, params={"limit": -1}, headers={"accept": "application/x-ndjson"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    rows = [orjson.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 31  # seeded users + master user
+    assert all("hashed_password" not in row for row in rows)
+
+
+async def test_search_users(client):
+    await Model.create(
+        username="jsmith", email="john.smith@example.com", password=rand_str()
+    )
+    await Model.create(
+        username="jsmyth", email="jane.smyth@example.com", password=rand_str()
+    )
+
+    response = await client.get(f"{path}/search", params={"q": "jsmith"})
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert [x["username"] for x in data][:2] == ["jsmith", "jsmyth"]
+    assert data[0]["rank"] > data[1]["rank"]
+    assert all("hashed_password" not in x for x in data)
+
+
+async def test_search_selects_requested_fields(bind):
+    await Model.create(
+        username="jsmith", email="john.smith@example.com", password=rand_str()
+    )
+    rows = await Model.search("jsmith", fields=["id", "username"])
+    assert set(rows[0]._fields) == {"id", "username", "rank"}
+
+    rows = await Model.search("jsmith")
+    assert not {"hashed_password", "search_vector"} & set(rows[0]._fields)
+
+
+async def test_search_vector_is_deferred():
+    assert "search_vector" not in str(Model.select())
+
+
+async def test_search_users_requires_term(client):
+    response = await client.get(f"{path}/search")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_list_users_search_filter(client):
+    await Model.create(
+        username="jsmith", email="john.smith@example.com", password=rand_str()
+    )
+
+    response = await client.get(path, params={"filter": "username:ilike:JSMI%"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [x["username"] for x in response.json()] == ["jsmith"]
+
 async def test_get_user(client):
     id = 20
     response = await client.get(f"{path}/{id}")
@@ -65,6 +123,49 @@ async def test_get_user(client):
     assert data["id"] == 20
 
 
+async def test_list_users_fields(client):
+    response = await client.get(f"{path}?fields=id,username&limit=5")
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert len(data) == 5
+    assert all(set(x) == {"id", "username"} for x in data)
+    assert response.links["next"] is not None
+
+
+async def test_get_user_fields(client):
+    response = await client.get(f"{path}/20?fields=email")
+    assert response.status_code == status.HTTP_200_OK
+    assert set(response.json()) == {"email"}
+
+
+async def test_get_user_reject_private_fields(client):
+    response = await client.get(f"{path}/20?fields=hashed_password")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_get_user_not_modified(client):
+    response = await client.get(f"{path}/20")
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+
+    response = await client.get(f"{path}/20", headers={"if-none-match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+
+async def test_get_user_fields_etag(client):
+    response = await client.get(f"{path}/20")
+    etag = response.headers["etag"]
+
+    response = await client.get(
+        f"{path}/20?fields=email", headers={"if-none-match": etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+    assert set(response.json()) == {"email"}
+
+
 async def test_update_exising_user(client, user):
     id = 10
     response = await client.put(f"{path}/{id}", json=user)
@@ -85,6 +186,20 @@ async def test_partial_update_exising_user(client, user):
     assert data["username"] == user["username"]
 
 
+async def test_update_is_saved(client, user):
+    id = 11
+    response = await client.put(f"{path}/{id}", json=user)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await client.patch(f"{path}/{id}", json={"first_name": "Jane"})
+    assert response.status_code == status.HTTP_200_OK
+
+    updated = await Model.get(id=id)
+    assert updated.username == user["username"]
+    assert updated.first_name == "Jane"
+    assert await Model.authenticate(user["username"], user["password"])
+
+
 async def test_update_user_not_found(client, user):
     id = 99999
     response = await client.put(f"{path}/{id}", json=user)
@@ -100,6 +215,16 @@ async def test_delete_existing_user(client):
     assert data["id"] == id
 
 
+async def test_delete_is_saved(client):
+    id = 21
+    response = await client.delete(f"{path}/{id}")
+    assert response.status_code == status.HTTP_200_OK
+
+    assert await Model.get(id=id) is None
+    response = await client.get(f"{path}/{id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 async def test_delete_user_not_found(client):
     id = 99999
     response = await client.delete(f"{path}/{id}")
@@ -107,3 +232,15 @@ async def test_delete_user_not_found(client):
 
     data = response.json()
     assert data["detail"] == ERROR_404["detail"]
+
+
+async def test_update_unchanged_credentials_keeps_tokens(authorized_client):
+    response = await authorized_client.get(f"{path}/me")
+    me = response.json()
+
+    body = {**me, "first_name": rand_str(), "password": None}
+    response = await authorized_client.put(f"{path}/{me['id']}", json=body)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await authorized_client.get(f"{path}/me")
+    assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,39 @@
+import logging
+
+import pytest
+import starlette.status as codes
+
+from util.keys import keyring
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.asyncio
+
+path: str = "/.well-known/jwks.json"
+
+
+class TestJWKS:
+    async def test_jwks(self, client):
+        kid = keyring.signing_key().kid
+
+        response = await client.get(path)
+        assert response.status_code == codes.HTTP_200_OK
+        assert "max-age" in response.headers["cache-control"]
+
+        kids = [k["kid"] for k in response.json()["keys"]]
+        assert kid in kids
+
+    async def test_not_modified(self, client):
+        etag = (await client.get(path)).headers["etag"]
+
+        response = await client.get(path, headers={"if-none-match": etag})
+        assert response.status_code == codes.HTTP_304_NOT_MODIFIED
+        assert response.headers["etag"] == etag
+
+    async def test_rotation_changes_etag(self, client):
+        etag = (await client.get(path)).headers["etag"]
+        keyring.rotate(force=True)
+
+        response = await client.get(path, headers={"if-none-match": etag})
+        assert response.status_code == codes.HTTP_200_OK
+        assert response.headers["etag"] != etag
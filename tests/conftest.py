@@ -1,11 +1,14 @@
 # flake8: noqa isort:skip_file
 import asyncio
+import tempfile
 from starlette.config import environ
 
 # inject environment variables prior to first import
 environ["TESTING"] = "true"
 environ["DATABASE_NAME"] = "testing"
 environ["DATABASE_ECHO"] = "false"
+environ["JWT_KEYS_DIR"] = tempfile.mkdtemp(prefix="sunstruck-keys-")
+environ["RATE_LIMIT_ENABLED"] = "false"
 
 import os
 
@@ -55,6 +58,7 @@ def sa_engine():
     create_database(url)
 
     rv = sqlalchemy.create_engine(url, echo=config.DATABASE_ECHO)
+    rv.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")  # trigram search indexes
     db.create_all(rv)  # create tables
     yield rv
     db.drop_all(rv)  # undo all that hard work you did
@@ -0,0 +1,152 @@
+import pytest
+
+from db.advise import (
+    BRIN_MIN_ROWS,
+    Advice,
+    IndexProposal,
+    IndexStats,
+    TableStats,
+    UnusedIndex,
+    advise,
+)
+from tests.fixtures.models import TestModel as Model
+from util.telemetry import Telemetry, UsageKey
+
+table = Model.__table__.name
+rows = 50000
+
+
+def usage(*keys: UsageKey, uses: int = 500, latency: float = 0.2):
+    telemetry = Telemetry()
+    for key in keys:
+        for _ in range(uses):
+            telemetry.count([key])
+            telemetry.observe([key], latency)
+    return telemetry.stats
+
+
+def index(
+    name: str, column: str, method: str = "btree", opclass: str = None, **kwargs
+) -> IndexStats:
+    return IndexStats(table, name, method, column, opclass, **kwargs)
+
+
+@pytest.fixture
+def tables():
+    return [TableStats(table, seq_scan=1200, live_rows=rows, inserts=rows)]
+
+
+class TestAdvise:
+    def test_proposes_btree(self, tables):
+        advice = advise(usage(UsageKey(table, "first_name", "eq")), tables, [])
+
+        assert len(advice.proposals) == 1
+        proposal = advice.proposals[0]
+        assert proposal.name == f"ix_{table}_first_name"
+        assert proposal.method == "btree"
+        assert proposal.opclass is None
+        assert proposal.uses == 500
+        assert proposal.p95 == 0.25
+        assert "1,200 sequential scans" in proposal.reason
+
+    def test_proposes_trigram_index(self, tables):
+        advice = advise(usage(UsageKey(table, "last_name", "ilike")), tables, [])
+
+        proposal = advice.proposals[0]
+        assert proposal.method == "gin"
+        assert proposal.opclass == "gin_trgm_ops"
+        assert proposal.name == f"ix_{table}_last_name_trgm"
+
+    def test_proposes_brin_for_append_only_ranges(self):
+        tables = [TableStats(table, live_rows=BRIN_MIN_ROWS, inserts=BRIN_MIN_ROWS)]
+        key = UsageKey(table, "updated_at", "between")
+        assert advise(usage(key), tables, []).proposals[0].method == "brin"
+
+    def test_proposes_btree_for_sorted_timestamps(self):
+        tables = [TableStats(table, live_rows=BRIN_MIN_ROWS, inserts=BRIN_MIN_ROWS)]
+        keys = [UsageKey(table, "updated_at", op) for op in ("between", "sort")]
+        proposal = advise(usage(*keys), tables, []).proposals[0]
+        assert proposal.method == "btree"
+        assert proposal.operators == ("between", "sort")
+        assert proposal.uses == 1000
+
+    def test_skips_covered_fields(self, tables):
+        indexes = [
+            index("ix_first_name", "first_name"),
+            index("ix_last_name_trgm", "last_name", "gin", opclass="gin_trgm_ops"),
+        ]
+        keys = [
+            UsageKey(table, "first_name", "eq"),
+            UsageKey(table, "first_name", "sort"),
+            UsageKey(table, "last_name", "like"),
+        ]
+        assert advise(usage(*keys), tables, indexes).proposals == []
+
+    def test_btree_doesnt_cover_patterns(self, tables):
+        indexes = [index("ix_last_name", "last_name")]
+        advice = advise(usage(UsageKey(table, "last_name", "like")), tables, indexes)
+        assert advice.proposals[0].opclass == "gin_trgm_ops"
+
+    def test_skips_infrequent_fields(self, tables):
+        key = UsageKey(table, "first_name", "eq")
+        assert not advise(usage(key, uses=5), tables, [], min_uses=10).proposals
+
+    def test_skips_small_tables(self, tables):
+        key = UsageKey(table, "first_name", "eq")
+        assert not advise(usage(key), tables, [], min_rows=rows + 1).proposals
+
+    def test_skips_negated_operators(self, tables):
+        key = UsageKey(table, "first_name", "~eq")
+        assert not advise(usage(key), tables, []).proposals
+
+    def test_skips_unknown_fields(self, tables):
+        key = UsageKey(table, "not_a_column", "eq")
+        assert not advise(usage(key), tables, []).proposals
+
+    def test_orders_by_time_spent(self, tables):
+        slow = usage(UsageKey(table, "first_name", "eq"), latency=1)
+        fast = usage(UsageKey(table, "last_name", "eq"), latency=0.01)
+        advice = advise({**fast, **slow}, tables, [])
+        assert [p.column for p in advice.proposals] == ["first_name", "last_name"]
+
+    def test_flags_unused_indexes(self, tables):
+        indexes = [
+            index("ix_unused", "phone_number", scans=0, size=2 ** 20),
+            index("ix_used", "email", scans=10),
+            index("uq_username", "username", scans=0, unique=True),
+            index("pk_users", "id", scans=0, primary=True),
+        ]
+        advice = advise({}, tables, indexes)
+
+        assert [u.index.name for u in advice.unused] == ["ix_unused"]
+        assert "1.0 MB" in advice.unused[0].reason
+        assert "no recorded filters or sorts on phone_number" in advice.unused[0].reason
+
+
+class TestMigration:
+    def test_create_index(self):
+        proposal = IndexProposal(
+            table, "last_name", "gin", "gin_trgm_ops", 500, ("ilike",), 0.25, ""
+        )
+        migration = Advice([proposal], []).migration()
+
+        assert 'op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")' in migration
+        assert f'"ix_{table}_last_name_trgm",' in migration
+        assert 'postgresql_using="gin",' in migration
+        assert 'postgresql_ops={"last_name": "gin_trgm_ops"},' in migration
+        assert (
+            f'op.drop_index("ix_{table}_last_name_trgm", table_name="{table}")'
+            in migration
+        )
+        compile(migration, "migration", "exec")
+
+    def test_drop_unused_index(self):
+        definition = f"CREATE INDEX ix_unused ON public.{table} USING btree (email)"
+        unused = UnusedIndex(index("ix_unused", "email", definition=definition), "")
+        migration = Advice([], [unused]).migration()
+
+        upgrade, downgrade = migration.split("def downgrade():")
+        assert f'op.drop_index("ix_unused", table_name="{table}")' in upgrade
+        assert f'op.execute("{definition}")' in downgrade
+        compile(migration, "migration", "exec")
+
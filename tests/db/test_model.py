@@ -136,7 +136,7 @@ class TestPrimaryKeyProxy:
         assert Model.pk[0].name == "id"
 
     def test_access_pk_names(self, bind):
-        assert Model.pk.names == ["id"]
+        assert Model.pk.names == ("id",)
 
     def test_pk_repr(self, bind):
         assert repr(Model.pk) == '[\n    "id"\n]'
@@ -184,3 +184,12 @@ class TestAggregateProxy:
     async def test_agg_min(self, bind, seed_users, column):
         result = await Model.agg.min(column)
         assert result is not None
+
+    async def test_agg_estimate(self, bind, seed_users):
+        result = await Model.agg.estimate()
+        assert isinstance(result, int)
+
+    async def test_agg_estimate_filtered(self, bind, seed_users):
+        result = await Model.agg.estimate(Model.id > 2)
+        assert isinstance(result, int)
+        assert result >= 0
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import Column
+
+from db.models import User
+from db.registry import ModelMetadata, get_metadata, register, registry
+from tests.fixtures.models import TestModel as Model
+
+
+class TestModelMetadata:
+    def test_registered_on_access(self):
+        assert isinstance(Model.meta, ModelMetadata)
+        assert registry[Model] is Model.meta
+
+    def test_get_metadata_returns_same_instance(self):
+        assert get_metadata(Model) is get_metadata(Model)
+
+    def test_register_replaces_existing(self):
+        previous = Model.meta
+        assert register(Model) is not previous
+        assert Model.meta is registry[Model]
+
+    def test_is_immutable(self):
+        with pytest.raises(AttributeError):
+            Model.meta.pk = None
+
+    def test_column_order_matches_table(self):
+        assert Model.meta.columns.names == tuple(c.name for c in Model.__table__.c)
+
+    def test_index_map(self):
+        meta = Model.meta.columns
+        for idx, name in enumerate(meta.names):
+            assert meta.index[name] == idx
+
+    def test_pk_positions(self):
+        assert Model.meta.pk.names == ("id",)
+        assert Model.meta.pk.positions == (0,)
+
+    def test_updatable_excludes_pk(self):
+        assert "id" not in Model.meta.updatable
+        assert "username" in Model.meta.updatable
+
+    def test_updatable_excludes_generated_columns(self):
+        # postgres rejects writes to generated columns, e.g. in ON CONFLICT DO UPDATE
+        assert "search_vector" in User.meta.columns.names
+        assert "search_vector" not in User.meta.updatable
+        assert "username" in User.meta.updatable
+
+    def test_contains(self):
+        assert "id" in Model.meta.pk
+        assert Model.id in Model.meta.pk
+        assert "username" not in Model.meta.pk
+
+    def test_coercers(self):
+        assert Model.meta.columns.coercers["id"]("5") == 5
+        assert Model.meta.columns.coercers["is_active"]("false") is False
+
+    def test_email_coercer_lowercases(self):
+        assert Model.meta.columns.coercers["email"]("A@B.com") == "a@b.com"
+
+    def test_mapping_is_read_only(self):
+        with pytest.raises(TypeError):
+            Model.meta.columns.mapping["id"] = Column("id")
+
+
+class TestSortable:
+    def test_indexed_columns(self):
+        assert {"id", "username", "email"} <= Model.meta.indexed
+        assert "first_name" not in Model.meta.indexed
+
+    def test_undeclared(self):
+        assert Model.meta.sortable is None
+
+    def test_declared(self, monkeypatch):
+        monkeypatch.setattr(Model, "__sortable__", ("id", "username"), raising=False)
+        assert ModelMetadata(Model).sortable == ("id", "username")
+
+    def test_reject_unindexed(self, monkeypatch):
+        monkeypatch.setattr(Model, "__sortable__", ("first_name",), raising=False)
+        with pytest.raises(ValueError):
+            ModelMetadata(Model)
+
+
+class TestProxiesReadFromMetadata:
+    def test_column_proxy_names(self):
+        assert Model.c.names is Model.meta.columns.names
+
+    def test_column_proxy_dict(self):
+        assert Model.c.dict() is Model.meta.columns.mapping
+
+    def test_pk_proxy_names(self):
+        assert Model.pk.names is Model.meta.pk.names
+
+    def test_pk_proxy_len(self):
+        assert len(Model.pk) == 1
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from db.models import Revocation
+from util.revocation import RevocationList, revocations
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def clear_revocations():
+    revocations.clear()
+    yield
+    revocations.clear()
+
+
+class TestRevocation:
+    async def test_revoke_token(self, bind):
+        now = time.time()
+        row = await Revocation.revoke_token("a1", sub=7, exp=now + 60)
+
+        assert row.jti == "a1"
+        assert row.sub == "7"
+        assert revocations.is_revoked("a1", sub="7", iat=now)
+
+    async def test_revoke_subject(self, bind):
+        now = time.time()
+        row = await Revocation.revoke_subject(7, at=now)
+
+        assert row.jti is None
+        assert row.revoked_at.timestamp() == pytest.approx(now)
+        assert revocations.is_revoked("b1", sub="7", iat=now - 1)
+
+    async def test_sync(self, bind):
+        now = time.time()
+        await Revocation.revoke_token("c1", sub=7, exp=now + 60)
+        await Revocation.revoke_subject(8, at=now)
+
+        # another process's list
+        other = RevocationList(max_token_age=60)
+        assert await Revocation.sync(other) >= 2
+        assert other.is_revoked("c1", sub="7", iat=now)
+        assert other.is_revoked("c2", sub="8", iat=now - 1)
+        assert other.cursor > 0
+
+        # rows already applied are only read again within the overlap
+        assert await Revocation.sync(other, overlap=0) == 0
+
+    async def test_purge(self, bind):
+        now = time.time()
+        await Revocation.revoke_token("d1", sub=7, exp=now - 1)
+        await Revocation.revoke_token("d2", sub=7, exp=now + 60)
+
+        assert await Revocation.purge() >= 1
+
+        other = RevocationList(max_token_age=60)
+        await Revocation.sync(other)
+        assert "d1" not in other.tokens
+        assert "d2" in other.tokens
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from exc import FilterSyntaxError, InvalidCursorError
+from sunstruck.main import configure_exception_handlers
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    configure_exception_handlers(app)
+
+    @app.get("/filter")
+    async def bad_filter():
+        raise FilterSyntaxError("unexpected end of filter", 3)
+
+    @app.get("/cursor")
+    async def bad_cursor():
+        raise InvalidCursorError("malformed cursor")
+
+    yield app
+
+
+class TestExceptionHandlers:
+    @pytest.mark.parametrize(
+        "path,detail",
+        [
+            ("/filter", "Invalid filter: unexpected end of filter (position 3)"),
+            ("/cursor", "Invalid cursor: malformed cursor"),
+        ],
+    )
+    async def test_client_errors(self, app, path, detail):
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            response = await client.get(path)
+
+        assert response.status_code == 422
+        assert response.json() == {"detail": detail}
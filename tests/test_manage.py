@@ -8,7 +8,9 @@ from alembic.script import ScriptDirectory
 
 import manage
 from db import db
+from db.advise import Advice, IndexProposal
 from tests.utils import get_open_port, working_directory
+from util.keys import KeyRing
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +53,33 @@ class TestCLIFast:
         for exp in expected:
             assert exp in captured.out
 
+    def test_advise_indexes(self, capfd, monkeypatch, tmpdir):
+        proposal = IndexProposal(
+            "users", "last_name", "btree", None, 500, ("eq",), 0.25, "500 uses (eq)"
+        )
+
+        async def advise_indexes(directory, min_uses, min_rows):
+            return Advice([proposal], [])
+
+        monkeypatch.setattr(manage.advise, "advise_indexes", advise_indexes)
+        manage.advise_indexes(tmpdir, min_uses=1, min_rows=1)
+        captured = capfd.readouterr()
+
+        assert "ix_users_last_name" in captured.out
+        assert "def upgrade():" in captured.out
+        assert "op.create_index(" in captured.out
+
+    def test_rotate_keys(self, capfd, monkeypatch, tmpdir):
+        monkeypatch.setattr(manage, "keyring", KeyRing(tmpdir, algorithm="ES256"))
+        manage.rotate(force=False)
+        manage.rotate(force=False)
+        manage.list_keys()
+        captured = capfd.readouterr()
+
+        assert "Published signing key" in captured.out
+        assert "No signing key is due" in captured.out
+        assert "signing" in captured.out
+
 
 @pytest.mark.cionly
 class TestCLISlow:
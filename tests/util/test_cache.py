@@ -0,0 +1,45 @@
+from util.cache import LRUCache
+
+
+class TestLRUCache:
+    def test_get_set(self):
+        cache = LRUCache(maxsize=2)
+        cache["a"] = 1
+        assert cache.get("a") == 1
+        assert "a" in cache
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache.get("a")  # "b" is now least recently used
+        cache["c"] = 3
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache(maxsize=2, name="test")
+        cache["a"] = 1
+        cache.get("a")
+        cache.get("b")
+        assert cache.info() == {
+            "name": "test",
+            "hits": 1,
+            "misses": 1,
+            "maxsize": 2,
+            "currsize": 1,
+        }
+
+    def test_clear_resets_counters(self):
+        cache = LRUCache(maxsize=2)
+        cache["a"] = 1
+        cache.get("a")
+        cache.clear()
+        assert cache.info()["hits"] == 0
+        assert len(cache) == 0
+
+    def test_zero_maxsize_disables_cache(self):
+        cache = LRUCache(maxsize=0)
+        cache["a"] = 1
+        assert cache.get("a") is None
@@ -0,0 +1,61 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from util.coercion import get_coercer, to_bool, to_date, to_datetime, to_lower_str
+
+
+class TestToBool:
+    @pytest.mark.parametrize("value", [True, "true", "T", "1", "yes", "on", 1])
+    def test_truthy(self, value):
+        assert to_bool(value) is True
+
+    @pytest.mark.parametrize("value", [False, "false", "F", "0", "no", "off", 0])
+    def test_falsy(self, value):
+        assert to_bool(value) is False
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            to_bool("maybe")
+
+
+class TestToDatetime:
+    def test_iso_string(self):
+        assert to_datetime("2020-01-01T17:22:20.937752") == datetime(
+            2020, 1, 1, 17, 22, 20, 937752
+        )
+
+    def test_zulu_suffix(self):
+        assert to_datetime("2020-01-01T00:00:00Z") == datetime(
+            2020, 1, 1, tzinfo=timezone.utc
+        )
+
+    def test_timestamp_falls_back_to_pydantic(self):
+        assert to_datetime(0) == datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def test_passthrough(self):
+        now = datetime.now()
+        assert to_datetime(now) is now
+
+
+def test_to_date():
+    assert to_date("2020-01-31") == date(2020, 1, 31)
+
+
+def test_to_lower_str():
+    assert to_lower_str("User@Example.com") == "user@example.com"
+
+
+class TestGetCoercer:
+    @pytest.mark.parametrize(
+        "pytype,value,expected",
+        [(int, "5", 5), (float, "1.5", 1.5), (str, 5, "5"), (bool, "false", False)],
+    )
+    def test_fast_coercers(self, pytype, value, expected):
+        assert get_coercer(pytype)(value) == expected
+
+    def test_coercer_is_cached(self):
+        assert get_coercer(int) is get_coercer(int)
+
+    def test_fallback_to_pydantic(self):
+        assert get_coercer(list)(("a", "b")) == ["a", "b"]
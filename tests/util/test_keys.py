@@ -0,0 +1,100 @@
+import time
+
+import pytest
+from jose import jwt
+
+from util.keys import KeyRing, make_kid, parse_kid
+
+DAY = 86400
+
+
+@pytest.fixture
+def keyring(tmp_path):
+    yield KeyRing(
+        tmp_path,
+        algorithm="ES256",
+        rotation_interval=30 * DAY,
+        publish_ahead=3600,
+        token_lifetime=7 * DAY,
+    )
+
+
+class TestKid:
+    def test_round_trip(self):
+        assert parse_kid(make_kid(1600000000.5)) == 1600000000
+        assert make_kid(1600000000).startswith("20200913T122640Z-")
+
+    def test_unique(self):
+        assert make_kid(1600000000) != make_kid(1600000000)
+
+
+class TestKeyRing:
+    def test_unsupported_algorithm(self, tmp_path):
+        with pytest.raises(ValueError):
+            KeyRing(tmp_path, algorithm="HS256")
+
+    def test_sign_and_verify(self, keyring, tmp_path):
+        token = keyring.sign({"sub": "7"})
+
+        key = keyring.signing_key()
+        assert jwt.get_unverified_header(token)["kid"] == key.kid
+        assert keyring.verify(token) == {"sub": "7"}
+        assert (tmp_path / f"{key.kid}.pem").exists()
+
+    def test_unknown_key(self, keyring, tmp_path):
+        other = KeyRing(tmp_path / "other", algorithm="ES256")
+        with pytest.raises(jwt.JWTError):
+            keyring.verify(other.sign({"sub": "7"}))
+
+    def test_rotate_when_due(self, keyring):
+        now = 1600000000
+        first = keyring.rotate(now=now)
+        assert keyring.rotate(now=now + DAY) is None
+
+        # the next key is published ahead of the rotation, but doesn't sign yet
+        rotation = now + 30 * DAY - 3600
+        second = keyring.rotate(now=rotation)
+        assert second.activates == rotation + 3600
+        assert keyring.signing_key(now=rotation).kid == first.kid
+        assert keyring.signing_key(now=rotation + 3600).kid == second.kid
+
+        kids = [k["kid"] for k in keyring.jwks(now=rotation)["keys"]]
+        assert kids == [second.kid, first.kid]
+
+    def test_retired_keys_are_deleted(self, keyring, tmp_path):
+        now = 1600000000
+        first = keyring.rotate(now=now)
+        second = keyring.rotate(now=now, force=True)
+
+        # published until the tokens signed with the first key have expired
+        keyring.rotate(now=second.activates + 7 * DAY - 1)
+        assert first.kid in keyring.keys
+
+        keyring.rotate(now=second.activates + 7 * DAY)
+        assert first.kid not in keyring.keys
+        assert not (tmp_path / f"{first.kid}.pem").exists()
+
+    def test_loads_keys_created_by_other_processes(self, keyring, tmp_path):
+        other = KeyRing(tmp_path, algorithm="ES256")
+        token = other.sign({"sub": "7"})
+
+        keyring.load()
+        assert keyring.verify(token) == {"sub": "7"}
+
+    def test_unknown_kid_reloads(self, keyring, tmp_path):
+        keyring.rotate()
+        key = KeyRing(tmp_path, algorithm="ES256").create(activates=time.time())
+        token = jwt.encode(
+            {"sub": "7"}, key.private, algorithm="ES256", headers={"kid": key.kid}
+        )
+
+        keyring.loaded_at -= 1  # reloads are limited to one per second
+        assert keyring.verify(token) == {"sub": "7"}
+
+    def test_jwks(self, keyring):
+        keyring.rotate()
+        (jwk,) = keyring.jwks()["keys"]
+        assert jwk["kid"] == keyring.signing_key().kid
+        assert jwk["use"] == "sig"
+        assert jwk["alg"] == "ES256"
+        assert "d" not in jwk  # no private material
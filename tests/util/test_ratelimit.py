@@ -0,0 +1,127 @@
+import pytest
+
+from util.ratelimit import (
+    MemoryBackend,
+    RateLimiter,
+    Rule,
+    load_backend,
+    parse_rules,
+    retry_after,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestParseRules:
+    def test_parse(self):
+        rules = parse_rules("ip:20/minute, username:50/hour:window")
+        assert rules == [
+            Rule("ip", 20, 60),
+            Rule("username", 50, 3600, window=True),
+        ]
+        assert [str(r) for r in rules] == ["ip:20/minute", "username:50/hour:window"]
+
+    def test_empty(self):
+        assert parse_rules("") == []
+
+    @pytest.mark.parametrize(
+        "spec",
+        ["ip:20", "ip:x/minute", "ip:20/fortnight", "email:20/minute", "ip:0/minute"],
+    )
+    def test_invalid(self, spec):
+        with pytest.raises(ValueError):
+            parse_rules(spec)
+
+
+class TestMemoryBackend:
+    async def test_bucket_allows_burst_then_refills(self):
+        backend, limit = MemoryBackend(), [("k", Rule("ip", 3, 3))]
+        for _ in range(3):
+            assert await backend.acquire(limit, now=100) == 0
+        assert await backend.acquire(limit, now=100) == pytest.approx(1)
+        assert await backend.acquire(limit, now=100.5) == pytest.approx(0.5)
+        assert await backend.acquire(limit, now=101) == 0
+
+    async def test_bucket_keys_are_independent(self):
+        backend, rule = MemoryBackend(), Rule("ip", 1, 1)
+        assert await backend.acquire([("a", rule)], now=100) == 0
+        assert await backend.acquire([("b", rule)], now=100) == 0
+        assert await backend.acquire([("a", rule)], now=100) > 0
+
+    async def test_window_limits_requests_per_period(self):
+        backend, limit = MemoryBackend(), [("k", Rule("ip", 5, 60, window=True))]
+        for _ in range(5):
+            assert await backend.acquire(limit, now=120) == 0
+        assert await backend.acquire(limit, now=150) == pytest.approx(30)
+
+    async def test_window_weights_previous_window(self):
+        backend, limit = MemoryBackend(), [("k", Rule("ip", 4, 60, window=True))]
+        for _ in range(4):
+            await backend.acquire(limit, now=170)
+        # a quarter into the next window, three quarters of those still count
+        assert await backend.acquire(limit, now=195) == 0
+        assert await backend.acquire(limit, now=195) > 0
+        # once the previous window has slid out, the full limit is available again
+        assert await backend.acquire(limit, now=240) == 0
+
+    async def test_rejection_takes_nothing(self):
+        backend = MemoryBackend()
+        loose, strict = ("a", Rule("ip", 10, 60)), ("b", Rule("ip", 1, 60))
+        assert await backend.acquire([loose, strict], now=100) == 0
+        for _ in range(5):
+            assert await backend.acquire([loose, strict], now=100) > 0
+
+        # the rejected requests didn't use up the looser limit
+        tokens, _ = backend.buckets.get("a")
+        assert tokens == pytest.approx(9)
+
+    async def test_wait_is_longest_of_rejecting_limits(self):
+        backend = MemoryBackend()
+        limits = [("a", Rule("ip", 1, 10)), ("b", Rule("ip", 1, 60))]
+        await backend.acquire(limits, now=100)
+        assert await backend.acquire(limits, now=100) == pytest.approx(60)
+
+    async def test_bounded(self):
+        backend, rule = MemoryBackend(maxsize=10), Rule("ip", 1, 1)
+        for i in range(100):
+            await backend.acquire([(f"k{i}", rule)], now=100)
+        assert len(backend.buckets) == 10
+
+    def test_load_backend(self):
+        assert isinstance(load_backend("util.ratelimit.MemoryBackend"), MemoryBackend)
+
+
+class TestRateLimiter:
+    @pytest.fixture
+    def limiter(self):
+        return RateLimiter(
+            MemoryBackend(),
+            default=parse_rules("ip:5/minute"),
+            routes={"POST /login": parse_rules("username:2/minute")},
+        )
+
+    async def test_route_rules_add_to_default(self, limiter):
+        ids = {"ip": "10.0.0.1", "username": "alice"}
+        assert await limiter.check("POST", "/login", ids, now=100) == 0
+        assert await limiter.check("POST", "/login", ids, now=100) == 0
+        assert await limiter.check("POST", "/login", ids, now=100) > 0
+        assert limiter.rejected == 1
+
+        # other routes only share the default rules. The rejected login didn't
+        # take from the ip limit: 2 of its 5 requests are used.
+        for _ in range(3):
+            assert await limiter.check("GET", "/users", ids, now=100) == 0
+        assert await limiter.check("GET", "/users", ids, now=100) > 0
+
+    async def test_missing_identities_are_skipped(self, limiter):
+        for _ in range(10):
+            assert await limiter.check("POST", "/login", {"ip": None}, now=100) == 0
+
+    def test_identities(self, limiter):
+        assert limiter.identities("POST", "/login") == {"ip", "username"}
+        assert limiter.identities("GET", "/users") == {"ip"}
+
+
+def test_retry_after():
+    assert retry_after(0.2) == "1"
+    assert retry_after(2.5) == "3"
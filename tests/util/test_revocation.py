@@ -0,0 +1,95 @@
+import time
+
+from util.revocation import BloomFilter, RevocationList
+
+
+class TestBloomFilter:
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"t:{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        assert all(key in bloom for key in keys)
+        assert len(bloom) == 1000
+        assert not bloom.saturated
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"t:{i}")
+        false_positives = sum(f"s:{i}" in bloom for i in range(10000))
+        assert false_positives < 300  # 1% expected, with plenty of slack
+
+    def test_saturated(self):
+        bloom = BloomFilter(capacity=2)
+        for key in "abc":
+            bloom.add(key)
+        assert bloom.saturated
+
+
+class TestRevocationList:
+    def test_revoke_token(self):
+        revocations = RevocationList(max_token_age=60)
+        now = time.time()
+        revocations.revoke_token("a", exp=now + 60)
+        assert revocations.is_revoked("a", sub="7", iat=now)
+        assert not revocations.is_revoked("b", sub="7", iat=now)
+
+    def test_revoke_subject(self):
+        revocations = RevocationList(max_token_age=60)
+        now = time.time()
+        revocations.revoke_subject(7, at=now)
+        assert revocations.is_revoked("a", sub="7", iat=now - 1)
+        assert revocations.is_revoked("a", sub=7, iat=now)
+        assert not revocations.is_revoked("a", sub="7", iat=now + 1)
+        assert not revocations.is_revoked("a", sub="8", iat=now - 1)
+
+    def test_tokens_without_issue_time_are_revoked_with_subject(self):
+        revocations = RevocationList(max_token_age=60)
+        revocations.revoke_subject("7")
+        assert revocations.is_revoked(None, sub="7", iat=None)
+
+    def test_revoke_subject_keeps_latest(self):
+        revocations = RevocationList(max_token_age=60)
+        now = time.time()
+        revocations.revoke_subject("7", at=now)
+        revocations.revoke_subject("7", at=now - 10)
+        assert revocations.is_revoked("a", sub="7", iat=now - 5)
+
+    def test_prune(self):
+        revocations = RevocationList(max_token_age=60)
+        revocations.tokens = {"a": 100.0, "b": 200.0}
+        revocations.subjects = {"7": 30.0, "8": 150.0}
+        revocations.prune(now=150)
+        assert revocations.tokens == {"b": 200.0}
+        assert revocations.subjects == {"8": 150.0}
+        assert len(revocations) == 2
+
+    def test_prune_rebuilds_filter(self):
+        revocations = RevocationList(max_token_age=60)
+        now = time.time()
+        revocations.revoke_token("a", exp=now - 1)
+        revocations.revoke_token("b", exp=now + 60)
+        revocations.prune(now=now)
+
+        assert "t:a" not in revocations.bloom
+        assert "t:b" in revocations.bloom
+        assert revocations.is_revoked("b", sub="7", iat=now)
+
+    def test_filter_grows(self):
+        revocations = RevocationList(max_token_age=60, capacity=2)
+        exp = time.time() + 60
+        for jti in "abcde":
+            revocations.revoke_token(jti, exp=exp)
+
+        assert not revocations.bloom.saturated
+        assert all(revocations.is_revoked(jti, "7", None) for jti in "abcde")
+
+    def test_clear(self):
+        revocations = RevocationList(max_token_age=60)
+        revocations.revoke_subject("7")
+        revocations.cursor = 10
+        revocations.clear()
+
+        assert not revocations.is_revoked(None, sub="7", iat=None)
+        assert revocations.cursor == 0
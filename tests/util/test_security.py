@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import threading
 from datetime import timedelta
 from typing import Dict
 
@@ -7,6 +9,7 @@ from jose import jwt
 
 import config as conf
 import util.security as security
+from exc import PasswordHashQueueFull
 from util.dt import utcnow
 
 logger = logging.getLogger(__name__)
@@ -43,6 +46,38 @@ class TestCreateAccessToken:
         assert before.timestamp() < contents["exp"]
         assert after.timestamp() > contents["exp"]
 
+    async def test_with_claims(self):
+        token = security.create_access_token(
+            subject="name", claims={"scope": "users:read", "is_superuser": True}
+        )
+
+        contents: Dict = security.decode_token(token)
+
+        assert contents["scope"] == "users:read"
+        assert contents["is_superuser"] is True
+        assert contents["iat"] <= utcnow().timestamp()
+
+    async def test_tokens_have_unique_ids(self):
+        first = security.decode_token(security.create_access_token(subject="name"))
+        second = security.decode_token(security.create_access_token(subject="name"))
+        assert first["jti"] != second["jti"]
+
+    async def test_signed_with_current_key(self):
+        token = security.create_access_token(subject="name")
+        kid = jwt.get_unverified_header(token)["kid"]
+        assert kid == security.keyring.signing_key().kid
+
+    async def test_legacy_tokens_are_rejected(self):
+        # issued with the secret key before signing keys were introduced
+        token = jwt.encode({"sub": "name"}, str(conf.SECRET_KEY), algorithm="HS256")
+        with pytest.raises(jwt.JWTError):
+            security.decode_token(token)
+
+    async def test_legacy_tokens_are_verified_if_accepted(self, monkeypatch):
+        monkeypatch.setattr(conf, "JWT_ACCEPT_LEGACY_TOKENS", True)
+        token = jwt.encode({"sub": "name"}, str(conf.SECRET_KEY), algorithm="HS256")
+        assert security.decode_token(token) == {"sub": "name"}
+
 
 class TestVerifyPassword:
     def test_valid(self):
@@ -56,10 +91,116 @@ class TestVerifyPassword:
         assert not security.verify_password(password, hashed_password)
 
 
+class TestAsyncPasswordHashing:
+    async def test_hash_and_verify(self):
+        hashed_password = await security.get_password_hash_async("password")
+        assert await security.verify_password_async("password", hashed_password)
+        assert not await security.verify_password_async("nope", hashed_password)
+
+    async def test_runs_off_the_event_loop(self):
+        executor = security.HashExecutor(workers=1)
+        thread = await executor.run(threading.current_thread)
+        assert thread is not threading.current_thread()
+        assert thread.name.startswith("password-hash")
+        executor.shutdown()
+
+    async def test_queue_depth(self):
+        executor = security.HashExecutor(workers=1)
+        release = threading.Event()
+
+        tasks = [asyncio.create_task(executor.run(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        info = executor.info()
+        assert info["pending"] == 3
+        assert info["queued"] == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        info = executor.info()
+        assert info["pending"] == 0
+        assert info["peak"] == 3
+        assert info["completed"] == 3
+        executor.shutdown()
+
+    async def test_cancelled_job_stays_pending_until_done(self):
+        executor = security.HashExecutor(workers=1, max_pending=1)
+        release = threading.Event()
+
+        task = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # the thread is still busy with the job, so it still counts to the bound
+        assert executor.info()["pending"] == 1
+        with pytest.raises(PasswordHashQueueFull):
+            await executor.run(release.wait)
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert executor.info()["pending"] == 0
+        assert executor.info()["completed"] == 1
+        executor.shutdown()
+
+    async def test_rejects_when_full(self):
+        executor = security.HashExecutor(workers=1, max_pending=1)
+        release = threading.Event()
+
+        task = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHashQueueFull):
+            await executor.run(release.wait)
+
+        release.set()
+        await task
+        assert executor.info()["rejected"] == 1
+        executor.shutdown()
+
+
+class TestClientSecret:
+    async def test_hash_and_verify(self):
+        hashed = security.hash_client_secret("secret")
+        assert hashed.startswith("$hmac-sha256$1$")
+        assert await security.verify_client_secret("secret", hashed)
+        assert not await security.verify_client_secret("not secret", hashed)
+
+    def test_hash_is_keyed(self, monkeypatch):
+        hashed = security.hash_client_secret("secret")
+        monkeypatch.setattr(conf, "SECRET_KEY", "another key")
+        assert security.hash_client_secret("secret") != hashed
+
+    async def test_verify_legacy_bcrypt_hash(self):
+        hashed = security.get_password_hash("secret")
+        assert security.client_secret_needs_update(hashed)
+        assert await security.verify_client_secret("secret", hashed)
+        assert not await security.verify_client_secret("not secret", hashed)
+
+    def test_current_hash_needs_no_update(self):
+        hashed = security.hash_client_secret("secret")
+        assert not security.client_secret_needs_update(hashed)
+
+    @pytest.mark.parametrize(
+        "hashed,expected",
+        [
+            ("$hmac-sha256$1$abc", 1),
+            ("$hmac-sha256$7$abc", 7),
+            ("$hmac-sha256$x$abc", None),
+            ("$2b$12$abcdefghijklmnopqrstuv", None),
+            ("", None),
+        ],
+    )
+    def test_parse_hash(self, hashed, expected):
+        assert security.parse_client_secret_hash(hashed) == expected
+
+    async def test_unknown_version_fails_verification(self):
+        assert not await security.verify_client_secret("secret", "$hmac-sha256$9$abc")
+
+
 def test_generate_password_reset_token():
     now = int(utcnow().timestamp())
     token = security.generate_password_reset_token("user@example.com")
-    content = security.decode_token(token)
+    content = security.decode_secret_token(token)
 
     assert (content["exp"] - now) // 60 == conf.EMAIL_RESET_TOKEN_EXPIRE_MINUTES
     assert content["nbf"] - now == 0
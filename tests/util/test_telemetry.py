@@ -0,0 +1,103 @@
+import json
+import time
+
+import pytest
+
+from util.telemetry import BUCKETS, Histogram, Telemetry, UsageKey, load
+
+key = UsageKey("users", "email", "eq")
+
+
+class TestHistogram:
+    def test_observe(self):
+        h = Histogram()
+        h.observe(0.003)
+        h.observe(0.02)
+        assert h.count == 2
+        assert h.total == pytest.approx(0.023)
+        assert h.counts[1] == 1  # <= 5ms
+        assert h.counts[3] == 1  # <= 25ms
+
+    def test_quantile_is_bucket_bound(self):
+        h = Histogram()
+        for _ in range(95):
+            h.observe(0.002)
+        for _ in range(5):
+            h.observe(0.3)
+        assert h.quantile(0.5) == 0.005
+        assert h.quantile(0.99) == 0.5
+
+    def test_quantile_of_overflow(self):
+        h = Histogram()
+        h.observe(30)
+        assert h.quantile(0.95) == 30
+        assert h.counts[-1] == 1
+
+    def test_quantile_of_empty_histogram(self):
+        assert Histogram().quantile(0.95) == 0
+
+    def test_round_trip(self):
+        h = Histogram()
+        h.observe(0.1)
+        restored = Histogram.from_dict(json.loads(json.dumps(h.to_dict())))
+        assert restored.counts == h.counts
+        assert restored.total == h.total
+
+    def test_from_dict_with_other_buckets(self):
+        restored = Histogram.from_dict({"counts": [1, 2], "count": 3, "total": 0.3})
+        assert restored.count == 3
+        assert restored.counts[-1] == 3
+        assert len(restored.counts) == len(BUCKETS) + 1
+
+
+class TestTelemetry:
+    def test_count(self):
+        telemetry = Telemetry()
+        telemetry.count([key, key])
+        assert telemetry.stats[key].uses == 2
+
+    def test_timed(self):
+        telemetry = Telemetry()
+        with telemetry.timed([key]):
+            time.sleep(0.002)
+        assert telemetry.stats[key].latency.count == 1
+        assert telemetry.stats[key].latency.total >= 0.002
+
+    def test_timed_skips_failures(self):
+        telemetry = Telemetry()
+        with pytest.raises(ValueError):
+            with telemetry.timed([key]):
+                raise ValueError
+        assert key not in telemetry.stats
+
+    def test_disabled(self):
+        telemetry = Telemetry(enabled=False)
+        telemetry.count([key])
+        with telemetry.timed([key]):
+            pass
+        assert len(telemetry) == 0
+
+    def test_flush_and_load(self, tmpdir):
+        first = Telemetry(directory=tmpdir)
+        first.count([key])
+        first.observe([key], 0.01)
+        first.flush()
+
+        # a snapshot written by another worker
+        second = Telemetry()
+        second.count([key, UsageKey("users", "id", "sort")])
+        (tmpdir / "telemetry-1.json").write(json.dumps(second.snapshot()))
+
+        merged = load(tmpdir)
+        assert merged[key].uses == 2
+        assert merged[key].latency.count == 1
+        assert merged[UsageKey("users", "id", "sort")].uses == 1
+
+    def test_flushes_on_interval(self, tmpdir):
+        telemetry = Telemetry(directory=tmpdir, flush_interval=0)
+        telemetry.observe([key], 0.01)
+        assert telemetry.path.exists()
+
+    def test_load_skips_unreadable_snapshots(self, tmpdir):
+        (tmpdir / "telemetry-1.json").write("{")
+        assert load(tmpdir) == {}